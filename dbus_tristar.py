@@ -14,13 +14,23 @@ import signal
 import os
 import dbus
 import dbus.mainloop.glib
+import dbus.service
 from gi.repository import GLib
 from time import time, sleep
 import time as time_module
 from datetime import datetime, time as dt_time, timezone, timedelta
+import copy
 import json
+import mmap
+import math
+import struct
 from pathlib import Path
 import threading
+import queue
+from contextlib import contextmanager
+from collections import namedtuple, deque
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # pymodbus v2.x (Venus OS) vs v3.x compatibility
 try:
@@ -28,13 +38,26 @@ try:
 except ImportError:
     from pymodbus.client.sync import ModbusTcpClient
 
+# Optional: in-process MQTT publisher (paho-mqtt, not part of stock Venus OS)
+try:
+    import paho.mqtt.client as paho_mqtt
+except ImportError:
+    paho_mqtt = None
+
 # Import Victron packages
 sys.path.insert(1, '/opt/victronenergy/dbus-systemcalc-py/ext/velib_python')
 from vedbus import VeDbusService
 from settingsdevice import SettingsDevice
 
+from tristar_storage import StateStore, StateWriter, fresh_state, migrate_state
+import tristar_history
+from tristar_archive import RegisterArchive
+from tristar_backups import EepromBackupArchive
+from tristar_schema import (DBUS_PATHS, DIP_SWITCH_BITS, FAULT_BITS, FLAGS_DAILY_BITS, HISTORY_DAY_FIELDS,
+                            ROLLUP_FIELDS, ROLLUP_PERIODS, ROLLUP_PUBLISHED, VALIDATED_FIELDS,
+                            history_day_paths, register_dbus_paths)
+
 VERSION = "2.36"  # Feat: HA integration — 16 seasonal profiles, PlannedVisitSOC, balance tracking
-PRODUCT_ID = 0xABCD  # Placeholder - can be registered with Victron
 
 # ============================================================================
 # CONFIGURATION - Edit these values to customize driver behavior
@@ -49,8 +72,10 @@ CONFIG = {
     'default_poll_interval_ms': 5000,  # Update interval (milliseconds)
 
     # Timing
-    'state_save_interval_sec': 300,    # Save state.json every 5 minutes
+    'state_save_interval_sec': 300,    # Compact state into state.bin every 5 minutes
     'watchdog_timeout_sec': 180,       # Mark disconnected after 3 min without Modbus
+    'state_fsync_interval_sec': 30,    # Max age of unsynced journal records (0 = fsync every save)
+    'state_journal_max_bytes': 65536,  # Compact journal into state.bin when it grows past this
     'nightly_reset_hour': 3,           # TriStar comm reset at 03:00 local time
 
     # Voltage override settings
@@ -60,12 +85,103 @@ CONFIG = {
     'battery_full_current': 2.0,            # Amps - tail current threshold for full detection
     'tail_current_time': 300,               # Seconds - sustained tail current time (5 min)
 
+    # Production profile
+    'hourly_profile_days': 14,              # Days averaged per hour of day (max 30 = history length)
+
     # Device identification
     'custom_name': 'TriStar MPPT 60',
+
+    # D-Bus signalling
+    'dbus_per_path_signals': True,     # Also emit per-path PropertiesChanged after each cycle's ItemsChanged
+                                       # (consumers without ItemsChanged support; False = ItemsChanged only)
+
+    # Diagnostics
+    'snapshot_buffer_size': 720,       # Raw register snapshots kept in RAM (720 × 5s = 1 hour)
+    'sample_ring_hours': 24,           # Decoded samples kept in samples.ring (0 = disabled)
+    'http_port': 0,                    # Local JSON/Prometheus endpoint (0 = disabled, e.g. 9480)
+    'http_bind': '127.0.0.1',          # Listen address for the HTTP endpoint
+    'sse_replay_size': 20,             # Snapshots replayed to a new /events client
+    'sse_client_queue': 30,            # Events buffered per /events client before it is dropped
+
+    # Time-series history (SQLite: raw 48 h, 1-min 30 days, 15-min 1 year, daily forever)
+    'history_db_max_mb': 32,           # Disk budget for history.db (0 = disabled)
+    'history_db_flush_sec': 60,        # Samples are inserted in one transaction per interval
+    'register_archive_days': 90,       # Daily files of raw 24-79 snapshots kept (0 = archive disabled)
+    'register_archive_block': 720,     # Max snapshots per compressed block (720 × 5s = 1 hour)
+    'register_archive_block_sec': 300, # Write a block at least this often (bounds loss on power failure)
+
+    # Backfill of missed days from the controller's daily log (read at night)
+    'controller_log_base': 0,          # Modbus address of daily record 0 (0 = disabled, not in the public spec)
+    'controller_log_days': 30,         # Daily records held by the controller
+    'controller_log_read_gap_sec': 2.0,  # Pause between block reads
+
+    # EEPROM backups (taken before every profile apply)
+    'eeprom_backup_keep': 50,          # Backups kept (0 = all)
+    'eeprom_backup_max_days': 0,       # Drop backups older than this (0 = no age limit; newest always kept)
+    'eeprom_shadow_check_delay_sec': 300,  # First background revalidation of the EEPROM shadow after start
+    'eeprom_shadow_max_age_sec': 86400,    # Revalidate when older; younger shadows also pre-compute profile diffs
+
+    # MQTT publisher (requires paho-mqtt; replaces dbus-mqtt for this driver's values)
+    'mqtt_host': '',                   # Broker host ('' = disabled)
+    'mqtt_port': 1883,
+    'mqtt_topic_prefix': 'tristar',    # <prefix>/state (JSON per cycle), <prefix>/<field>, <prefix>/set/<command>
+    'mqtt_queue_size': 1000,           # Messages buffered while the broker is unreachable (oldest dropped)
+    'mqtt_deadbands': {                # Per-field topic only republished when change >= deadband
+        'v_bat': 0.02, 'v_pv': 0.5, 'i_cc': 0.1, 'i_pv': 0.1, 'p_out': 5.0,
+        'v_target': 0.02, 'sweep_pmax': 5.0, 't_bat': 1, 't_hs': 1,
+    },
 }
 
-# Persistent state file for yield tracking and 30-day history
-STATE_FILE = Path("/data/dbus-tristar/state.json")
+# Persistent state file for yield tracking and 30-day history (binary snapshot + journal).
+# A state.json next to it (older releases, or "tristar_storage.py dump" output edited by
+# hand) is imported at startup when it is newer than state.bin.
+STATE_FILE = Path("/data/dbus-tristar/state.bin")
+STATE_IMPORT_FILE = Path("/data/dbus-tristar/state.json")
+
+# Time-series history database (see tristar_history.py)
+HISTORY_DB_FILE = Path("/data/dbus-tristar/history.db")
+
+# D-Bus object with query methods over the on-disk daily history (outside the velib path tree)
+HISTORY_QUERY_PATH = '/HistoryQuery'
+HISTORY_QUERY_INTERFACE = 'com.victronenergy.tristar.History'
+HISTORY_QUERY_MAX_DAYS = 366  # Rows per GetHistory call; page by asking again from the next date
+
+# Lossless raw register archive, one file per local day (see tristar_archive.py)
+REGISTER_ARCHIVE_DIR = Path("/data/dbus-tristar/archive")
+
+# EEPROM backups taken before each profile apply (see tristar_backups.py); the
+# directory holds backup_*.json files of older releases, imported at startup
+EEPROM_BACKUP_FILE = Path("/data/dbus-tristar/eeprom_backups.log")
+EEPROM_BACKUP_LEGACY_DIR = Path("/data/dbus-tristar/eeprom_backups")
+EEPROM_BACKUP_PATH = '/EepromBackups'
+EEPROM_BACKUP_INTERFACE = 'com.victronenergy.tristar.EepromBackups'
+
+# Last known EEPROM charge settings and kWh counters per controller serial number,
+# served at startup instead of reading EEPROM (revalidated in the background)
+EEPROM_SHADOW_FILE = Path("/data/dbus-tristar/eeprom_shadow.json")
+
+# State keys that don't make the state dirty on their own (persisted with the next real change)
+STATE_VOLATILE_KEYS = (
+    ('last_update',),
+    ('storage_wear', 'date'),
+    ('storage_wear', 'writes'),
+    ('storage_wear', 'bytes'),
+)
+
+# Large state subtrees that only change on events (rollover, backfill, fault transitions).
+# Their copies for the state writer are reused until _mark_state_dirty(); the store
+# trusts an unchanged copy (same object) and skips flattening/diffing it.
+STATE_SHARED_KEYS = ('history', 'rollups', 'fault_events')
+
+# Fixed-length lists journaled per element: only the hourly bins that moved this cycle
+# are written, not all 24 of them.
+STATE_VECTOR_KEYS = (('today', 'hourly_wh'),)
+
+# Shared-memory live snapshot for local consumers (tmpfs, recreated at every start)
+SNAPSHOT_FILE = Path("/run/dbus-tristar/snapshot.bin")
+
+# Memory-mapped ring of recent per-cycle samples (on /data, survives restarts)
+SAMPLE_RING_FILE = Path("/data/dbus-tristar/samples.ring")
 
 # Modbus register addresses (input registers)
 REG_V_PU = 0           # Voltage scaling
@@ -134,6 +250,23 @@ REG_EEPROM_ET_ABSORP = 0xE002            # Absorption time (seconds)
 REG_EEPROM_EV_FLOAT_CANCEL = 0xE005     # Float cancel voltage (legacy, not used in profiles)
 REG_EEPROM_ET_FLOAT_EXIT_CUM = 0xE006   # Float exit timer (cumulative seconds below float voltage)
 
+# Charge parameters written by profiles: name -> EEPROM register (voltages stored 12V-equivalent).
+# All lie in 0xE000-0xE006, read as one block by profile apply and verification.
+EEPROM_PROFILE_REGISTERS = {
+    'EV_absorp': REG_EEPROM_EV_ABSORP,
+    'EV_float': REG_EEPROM_EV_FLOAT,
+    'Et_absorp': REG_EEPROM_ET_ABSORP,
+    'Et_float_exit_cum': REG_EEPROM_ET_FLOAT_EXIT_CUM,
+}
+EEPROM_SECONDS_PARAMS = ('Et_absorp', 'Et_float_exit_cum')  # Seconds, no scaling
+EEPROM_PROFILE_BLOCK_COUNT = REG_EEPROM_ET_FLOAT_EXIT_CUM - REG_EEPROM_EV_ABSORP + 1
+EEPROM_SETTINGS_COUNT = 18        # 0xE000 (EV_absorp) through 0xE011, published under /Custom/EEPROM
+REG_EEPROM_KWHC_R = 0xE086        # kWh charge resettable (0xE087 = total)
+
+# Controller daily log: each record is the logger block 64-79 as it stood at the end of the day
+LOG_RECORD_WORDS = REG_T_FLOAT - REG_V_BAT_MIN + 1
+LOG_BLOCK_RECORDS = 7  # 112 registers per read (Modbus limit is 125)
+
 # Charge profile sets
 REST_PROFILES = {'summerrest', 'autumnrest', 'winterrest', 'springrest'}
 
@@ -200,36 +333,946 @@ CHARGE_STATE_TEXT = {
     9: "SLAVE"
 }
 
-# Fault bitfield definitions (REG_FAULTS = 44, REG_FAULTS_DAILY = 73)
-FAULT_BITS = {
-    0: "Overcurrent",
-    1: "FETsShorted",
-    2: "SoftwareBug",
-    3: "BatteryHVD",
-    4: "ArrayHVD",
-    5: "SettingsSwitchChanged",
-    6: "CustomSettingsEdit",
-    7: "RTsShorted",
-    8: "RTsDisconnected",
-    9: "EEPROMRetryLimit",
-    10: "Reserved",
-    11: "SlaveControlTimeout",
-    12: "Fault12",
-    13: "Fault13",
-    14: "Fault14",
-    15: "Fault15"
+# Fault event log: bounded transition log of the diagnostic bitfields (persisted in state.json)
+FAULT_EVENT_LOG_SIZE = 100
+
+# Decoded live measurements: (name, register, scaling, signed)
+# scaling: 'v' = × V_PU / 2^15, 'i' = × I_PU / 2^15, 'p' = × V_PU × I_PU / 2^17, '1' = raw
+# This table is also the schema of the shared-memory snapshot (SNAPSHOT_FILE)
+DecodedField = namedtuple('DecodedField', 'name register scaling signed')
+DECODED_FIELDS = (
+    DecodedField('v_bat', REG_V_BAT, 'v', False),
+    DecodedField('i_cc', REG_I_CC_1M, 'i', True),
+    DecodedField('v_pv', REG_V_PV, 'v', False),
+    DecodedField('i_pv', REG_I_PV, 'i', False),
+    DecodedField('p_out', REG_POUT, 'p', False),
+    DecodedField('v_target', REG_V_TARGET, 'v', False),
+    DecodedField('sweep_pmax', REG_SWEEP_PMAX, 'p', False),
+    DecodedField('t_bat', REG_T_BAT, '1', True),
+    DecodedField('t_hs', REG_T_HS, '1', True),
+    DecodedField('charge_state', REG_CHARGE_STATE, '1', False),
+    DecodedField('whc_daily', REG_WHC_DAILY, '1', False),
+    DecodedField('faults', REG_FAULTS, '1', False),
+)
+
+# Model ratings used for plausibility limits: (max charge current A, max PV input V)
+MODEL_RATINGS = {
+    "TriStar MPPT 30": (30.0, 150.0),
+    "TriStar MPPT 45": (45.0, 150.0),
+    "TriStar MPPT 60": (60.0, 150.0),
 }
+DEFAULT_MODEL_RATING = (60.0, 150.0)
+
+# Plausibility limits per 12V of nominal system voltage (scaled by system_voltage_scale)
+BATTERY_VOLTAGE_RANGE_12V = (9.0, 17.5)     # 24V system: 18-35V (LiFePO4 7S 21-29.4V + margin)
+BATTERY_VOLTAGE_RATE_12V = 0.5              # Max plausible change in V/s (per 12V)
+CURRENT_MARGIN = 10.0                       # Amps above model rating before a reading is rejected
+PV_VOLTAGE_MARGIN = 10.0                    # Volts above model PV rating
+RATE_REJECT_LIMIT = 3                       # Consecutive rate rejections before accepting as new baseline
+
+
+def fold_day_into_rollup(rollup, day):
+    """Add one finished day (state history entry) to a month/year accumulator in place"""
+    for name, key, unit, how in ROLLUP_FIELDS:
+        if how == 'count':
+            rollup[key] = rollup.get(key, 0) + 1
+            continue
+        value = day.get(key)
+        if value is None or (how == 'min' and not value):  # 0.0 min voltage = no reading that day
+            continue
+        current = rollup.get(key)
+        if current is None:
+            rollup[key] = value
+        elif how == 'sum':
+            rollup[key] = round(current + value, 3)
+        else:
+            rollup[key] = max(current, value) if how == 'max' else min(current, value)
+
+
+class BitfieldPublisher:
+    """
+    Publishes a raw status word and its decoded bits, touching only changed bits
+
+    Keeps the previous raw word and XORs it against the new one, so an unchanged
+    word costs zero D-Bus writes. update() returns the transition as
+    (changed, set, cleared) bitmasks for the fault event log.
+    """
+
+    def __init__(self, name, raw_path, bit_paths, last_raw=None):
+        self.name = name
+        self.raw_path = raw_path
+        self.bit_paths = bit_paths      # {bit: D-Bus path}
+        self.last_raw = last_raw        # Previous word (seeded from state.json across restarts)
+        self._published = False         # First update writes all paths
+
+    def update(self, dbus, raw):
+        previous = self.last_raw
+        changed = raw ^ previous if self._published else 0xFFFF
+
+        if changed:
+            dbus[self.raw_path] = raw
+            for bit, path in self.bit_paths.items():
+                if changed & (1 << bit):
+                    dbus[path] = bool(raw & (1 << bit))
+
+        self._published = True
+        self.last_raw = raw
+
+        if previous is None or previous == raw:
+            return 0, 0, 0
+        diff = raw ^ previous
+        return diff, diff & raw, diff & previous
+
+
+def decode_fields(regs, base, v_pu, i_pu):
+    """Decode DECODED_FIELDS from a raw register block starting at address base"""
+    scale = {'v': v_pu / 32768.0, 'i': i_pu / 32768.0, 'p': v_pu * i_pu / 131072.0, '1': 1}
+    decoded = {}
+    for field in DECODED_FIELDS:
+        raw = regs[field.register - base]
+        if field.signed and raw >= 0x8000:
+            raw -= 0x10000
+        decoded[field.name] = raw * scale[field.scaling]
+    return decoded
+
+
+def decode_log_record(words, v_pu, i_pu):
+    """Controller daily log record (LOG_RECORD_WORDS registers) -> history entry fields, None if empty"""
+    if all(word == 0 for word in words) or all(word == 0xFFFF for word in words):
+        return None
+
+    def reg(addr):
+        return words[addr - REG_V_BAT_MIN]
+
+    return {
+        "yield": reg(REG_WHC_DAILY) / 1000.0,
+        "max_power": round(reg(REG_POUT_MAX_DAILY) * v_pu * i_pu / 131072.0, 0),
+        "max_pv_voltage": round(reg(REG_V_PV_MAX) * v_pu / 32768.0, 2),
+        "max_battery_voltage": round(reg(REG_V_BAT_MAX) * v_pu / 32768.0, 2),
+        "min_battery_voltage": round(reg(REG_V_BAT_MIN) * v_pu / 32768.0, 2),
+        "max_battery_current": 0.0,  # Not logged by the controller
+        "time_bulk": 0,              # Not logged by the controller
+        "time_absorption": reg(REG_T_ABS) // 60,
+        "time_float": reg(REG_T_FLOAT) // 60,
+        "time_equalize": reg(REG_T_EQ_DAILY) // 60,
+        "source": "controller_log",
+    }
+
+
+def decode_eeprom_params(regs, base, v_pu, voltage_scale):
+    """Profile parameters from an EEPROM register block starting at base (voltages as actual system voltage)"""
+    values = {}
+    for param, addr in EEPROM_PROFILE_REGISTERS.items():
+        raw = regs[addr - base]
+        if param in EEPROM_SECONDS_PARAMS:
+            values[param] = raw
+        else:
+            # EEPROM stores 12V-equivalent, convert to actual voltage
+            values[param] = round(raw * v_pu * (2**-15) * voltage_scale, 2)
+    return values
+
+
+class FieldValidator:
+    """
+    Per-field plausibility checks on a decoded snapshot
+
+    Each VALIDATED_FIELDS entry is checked against a range derived from the
+    detected model and system voltage, plus a rate-of-change limit where one
+    applies. A failing field is set to None (published as invalid) and counted;
+    the rest of the snapshot is still used. A step change that is rejected
+    RATE_REJECT_LIMIT cycles in a row is accepted as the new baseline, so a
+    genuine jump can never lock a field out.
+    """
+
+    def __init__(self):
+        self.limits = {}        # name -> (min, max, max rate per second or None)
+        self.last_good = {}     # name -> (value, timestamp)
+        self.rate_rejects = {}  # name -> consecutive rate rejections
+        self.rejected = dict.fromkeys(VALIDATED_FIELDS, 0)
+        self.configure(2, DEFAULT_MODEL_RATING)
+
+    def configure(self, system_voltage_scale, rating):
+        """Derive limits from system voltage scale (1/2/4) and model (max A, max PV V)"""
+        max_current, max_pv = rating
+        v_min, v_max = (v * system_voltage_scale for v in BATTERY_VOLTAGE_RANGE_12V)
+        i_max = max_current + CURRENT_MARGIN
+        self.limits = {
+            'v_bat': (v_min, v_max, BATTERY_VOLTAGE_RATE_12V * system_voltage_scale),
+            'v_pv': (0.0, max_pv + PV_VOLTAGE_MARGIN, None),
+            'i_cc': (0.0, i_max, max_current / 10.0),  # 1-min average, can't swing full scale in seconds
+            'p_out': (0.0, i_max * v_max, None),
+        }
+        logging.info("Plausibility limits: " + ", ".join(
+            f"{name} {lo:.1f}..{hi:.1f}" for name, (lo, hi, rate) in self.limits.items()))
+
+    def validate(self, decoded, now):
+        """Check decoded fields in place; invalid fields become None. Returns list of rejected names."""
+        rejected = []
+        for name, (lo, hi, max_rate) in self.limits.items():
+            value = decoded[name]
+            reason = None
+            if not (lo <= value <= hi):
+                reason = f"out of range {lo:.1f}..{hi:.1f}"
+            elif max_rate is not None and name in self.last_good:
+                last_value, last_time = self.last_good[name]
+                allowed = max_rate * max(now - last_time, 1.0)
+                if abs(value - last_value) > allowed:
+                    count = self.rate_rejects.get(name, 0) + 1
+                    if count < RATE_REJECT_LIMIT:
+                        self.rate_rejects[name] = count
+                        reason = f"step {last_value:.2f} -> {value:.2f} exceeds {allowed:.2f}"
+                    else:
+                        logging.info(f"{name}: accepting {value:.2f} as new baseline after {count} rate rejections")
+
+            if reason is None:
+                self.last_good[name] = (value, now)
+                self.rate_rejects.pop(name, None)
+            else:
+                logging.warning(f"Rejected {name}={value:.2f} ({reason}) - possible Modbus corruption")
+                decoded[name] = None
+                self.rejected[name] += 1
+                rejected.append(name)
+        return rejected
+
+
+class RegisterRingBuffer:
+    """
+    Fixed-capacity ring buffer of raw register snapshots
+
+    Rows are stored as array('H') with a monotonic timestamp (array('d')) and the
+    raw charge state (array('B')) per row. Every row is written twice, at slot i
+    and i + capacity, so the newest N rows are always one contiguous block and
+    last() can hand out memoryviews without copying. Memory is fixed at
+    2 × capacity × width × 2 bytes regardless of uptime.
+    """
+
+    def __init__(self, capacity, width, base):
+        self.capacity = capacity
+        self.width = width
+        self.base = base  # Register address of column 0
+        self._rows = array('H', bytes(2 * 2 * capacity * width))
+        self._times = array('d', bytes(8 * 2 * capacity))
+        self._states = array('B', bytes(2 * capacity))
+        self._next = 0
+        self.count = 0
+
+    def append(self, regs, charge_state, timestamp=None):
+        if timestamp is None:
+            timestamp = time_module.monotonic()
+        row = array('H', regs)
+        if len(row) != self.width:
+            raise ValueError(f"Snapshot has {len(row)} registers, expected {self.width}")
+        i = self._next
+        for slot in (i, i + self.capacity):
+            self._rows[slot * self.width:(slot + 1) * self.width] = row
+            self._times[slot] = timestamp
+            self._states[slot] = charge_state & 0xFF
+        self._next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _window(self, n):
+        n = min(n, self.count)
+        end = self._next + self.capacity  # Slot after the newest row in the mirrored half
+        return n, end - n, end
+
+    def last(self, n):
+        """Newest n rows (oldest first) as zero-copy memoryviews: (rows[n][width], times[n], states[n])"""
+        n, start, end = self._window(n)
+        rows = memoryview(self._rows)[start * self.width:end * self.width]
+        rows = rows.cast('B').cast('H', [n, self.width]) if n else rows
+        return rows, memoryview(self._times)[start:end], memoryview(self._states)[start:end]
+
+    def column(self, address, n):
+        """Newest n values of one register (oldest first) as a strided zero-copy memoryview"""
+        n, start, end = self._window(n)
+        offset = address - self.base
+        return memoryview(self._rows)[start * self.width + offset:end * self.width:self.width]
+
+
+# Snapshot file layout (little endian, all offsets fixed for the life of the file):
+#   header   magic 'TSMP', u16 layout version, u16 field count, u32 data offset, u32 reserved, u64 seq
+#   schema   field count × 16-byte ASCII names (NUL padded), from DECODED_FIELDS
+#   data     f64 wall-clock timestamp, then one f64 per field (NaN = invalid this cycle)
+# seq is a seqlock: odd while the writer is updating. Readers copy the data and retry
+# if seq was odd or changed in between.
+SNAPSHOT_MAGIC = b'TSMP'
+SNAPSHOT_LAYOUT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sHHIIQ')
+SNAPSHOT_SEQ_OFFSET = 16
+SNAPSHOT_NAME_SIZE = 16
+
+
+class SnapshotWriter:
+    """
+    Publishes each decoded snapshot into a memory-mapped file for local consumers
+
+    Readers get a consistent, lock-free view of the latest values (see
+    read_snapshot()) without any D-Bus round-trips. A publish is one pack_into
+    of the data block between two seqlock increments.
+    """
+
+    def __init__(self, path, names):
+        self.path = Path(path)
+        self.names = tuple(names)
+        data_offset = SNAPSHOT_HEADER.size + SNAPSHOT_NAME_SIZE * len(self.names)
+        data_offset = (data_offset + 7) & ~7
+        self._data = struct.Struct(f'<{1 + len(self.names)}d')
+        self._data_offset = data_offset
+        self._seq = 0
+
+        # Build the file aside and rename, so readers never see a half-written header
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.path.with_suffix('.tmp')
+        with open(temp_file, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_LAYOUT_VERSION, len(self.names),
+                                         data_offset, 0, 0))
+            for name in self.names:
+                f.write(name.encode('ascii')[:SNAPSHOT_NAME_SIZE].ljust(SNAPSHOT_NAME_SIZE, b'\0'))
+            f.write(bytes(data_offset + self._data.size - f.tell()))
+        temp_file.replace(self.path)
+
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._data.pack_into(self._map, data_offset, 0.0, *([math.nan] * len(self.names)))
+
+    def publish(self, timestamp, values):
+        """Write one snapshot; values maps field name -> number (None = invalid)"""
+        row = [math.nan if values.get(name) is None else float(values[name]) for name in self.names]
+        self._seq += 1  # Odd: update in progress
+        struct.pack_into('<Q', self._map, SNAPSHOT_SEQ_OFFSET, self._seq)
+        self._data.pack_into(self._map, self._data_offset, timestamp, *row)
+        self._seq += 1  # Even: consistent
+        struct.pack_into('<Q', self._map, SNAPSHOT_SEQ_OFFSET, self._seq)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def read_snapshot(path=SNAPSHOT_FILE, retries=100):
+    """
+    Read the latest snapshot published by SnapshotWriter
+
+    Returns {'timestamp': float, 'seq': int, <field>: float or None}, or None if
+    the file is missing/invalid or no consistent copy was obtained.
+    """
+    try:
+        with open(path, 'rb') as f:
+            snapshot_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magic, version, count, data_offset, _, _ = SNAPSHOT_HEADER.unpack_from(snapshot_map, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_LAYOUT_VERSION:
+            return None
+        names = [snapshot_map[SNAPSHOT_HEADER.size + i * SNAPSHOT_NAME_SIZE:
+                              SNAPSHOT_HEADER.size + (i + 1) * SNAPSHOT_NAME_SIZE].rstrip(b'\0').decode('ascii')
+                 for i in range(count)]
+        data = struct.Struct(f'<{1 + count}d')
+
+        for _ in range(retries):
+            seq_before, = struct.unpack_from('<Q', snapshot_map, SNAPSHOT_SEQ_OFFSET)
+            if seq_before & 1:
+                continue
+            row = data.unpack_from(snapshot_map, data_offset)
+            seq_after, = struct.unpack_from('<Q', snapshot_map, SNAPSHOT_SEQ_OFFSET)
+            if seq_before == seq_after:
+                snapshot = {'timestamp': row[0], 'seq': seq_before}
+                snapshot.update((name, None if math.isnan(value) else value)
+                                for name, value in zip(names, row[1:]))
+                return snapshot
+        return None
+    finally:
+        snapshot_map.close()
+
+
+# Sample ring file layout: header, field names (SNAPSHOT_NAME_SIZE bytes each),
+# then capacity records of f64 timestamp + one f32 per field (NaN = invalid)
+SAMPLE_RING_MAGIC = b'TSRG'
+SAMPLE_RING_LAYOUT_VERSION = 1
+SAMPLE_RING_HEADER = struct.Struct('<4sHHIIII')  # magic, version, field count, capacity, record size, data offset, reserved
+SAMPLE_RING_COUNT = struct.Struct('<Q')         # Records ever written, follows the header
+SAMPLE_RING_FIELDS = ('v_pv', 'i_pv', 'v_bat', 'i_cc', 'p_out', 'v_target', 'charge_state', 't_bat', 't_hs')
+
+
+def _sample_ring_records(ring_map, since):
+    """Decode the records of a mapped sample ring newer than since: [(timestamp, {field: value})]"""
+    magic, version, count, capacity, record_size, data_offset, _ = SAMPLE_RING_HEADER.unpack_from(ring_map, 0)
+    if magic != SAMPLE_RING_MAGIC or version != SAMPLE_RING_LAYOUT_VERSION:
+        raise ValueError("Not a sample ring file")
+    names = [ring_map[SAMPLE_RING_HEADER.size + SAMPLE_RING_COUNT.size + i * SNAPSHOT_NAME_SIZE:
+                      SAMPLE_RING_HEADER.size + SAMPLE_RING_COUNT.size + (i + 1) * SNAPSHOT_NAME_SIZE]
+             .rstrip(b'\0').decode('ascii') for i in range(count)]
+    record = struct.Struct(f'<d{count}f')
+
+    written, = SAMPLE_RING_COUNT.unpack_from(ring_map, SAMPLE_RING_HEADER.size)
+    first = max(0, written - capacity)
+    rows = [record.unpack_from(ring_map, data_offset + (index % capacity) * record_size)
+            for index in range(first, written)]
+    # A concurrent writer may have overwritten the oldest slots while they were copied
+    written_after, = SAMPLE_RING_COUNT.unpack_from(ring_map, SAMPLE_RING_HEADER.size)
+    skip = max(0, written_after - capacity + 1 - first)
+    return [(row[0], {name: None if math.isnan(value) else value for name, value in zip(names, row[1:])})
+            for row in rows[skip:] if row[0] > since]
+
+
+class SampleRing:
+    """
+    Fixed-size ring of decoded per-cycle samples in a memory-mapped file
+
+    The file lives on persistent storage and is reopened as-is after a restart
+    (no load step). Appending is one pack_into plus a counter update; the
+    kernel writes dirty pages back in the background. External tools can map
+    the file read-only (see read_sample_ring()). A file with a different
+    layout, field list or capacity is recreated empty.
+    """
+
+    def __init__(self, path, names, capacity):
+        self.path = Path(path)
+        self.names = tuple(names)
+        self.capacity = capacity
+        self._record = struct.Struct(f'<d{len(self.names)}f')
+        data_offset = SAMPLE_RING_HEADER.size + SAMPLE_RING_COUNT.size + SNAPSHOT_NAME_SIZE * len(self.names)
+        self._data_offset = (data_offset + 7) & ~7
+        header = SAMPLE_RING_HEADER.pack(SAMPLE_RING_MAGIC, SAMPLE_RING_LAYOUT_VERSION, len(self.names),
+                                         capacity, self._record.size, self._data_offset, 0)
+        header += bytes(SAMPLE_RING_COUNT.size)
+        header += b''.join(name.encode('ascii')[:SNAPSHOT_NAME_SIZE].ljust(SNAPSHOT_NAME_SIZE, b'\0')
+                           for name in self.names)
+        size = self._data_offset + capacity * self._record.size
+
+        if not self._matches(header, size):
+            if self.path.exists():
+                logging.info(f"Sample ring {self.path} has a different layout - recreating it")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self.path.with_suffix('.tmp')
+            with open(temp_file, 'wb') as f:
+                f.write(header)
+                f.truncate(size)
+            temp_file.replace(self.path)
+
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self.count, = SAMPLE_RING_COUNT.unpack_from(self._map, SAMPLE_RING_HEADER.size)
+
+    def _matches(self, header, size):
+        """True if the existing file has exactly this layout (header apart from the record counter)"""
+        try:
+            with open(self.path, 'rb') as f:
+                existing = f.read(len(header))
+                f.seek(0, os.SEEK_END)
+                existing_size = f.tell()
+        except OSError:
+            return False
+        count_at = SAMPLE_RING_HEADER.size
+        count_end = count_at + SAMPLE_RING_COUNT.size
+        return (existing_size == size and existing[:count_at] == header[:count_at]
+                and existing[count_end:] == header[count_end:])
+
+    def append(self, timestamp, values):
+        """Store one sample; values maps field name -> number (None = invalid)"""
+        row = [math.nan if values.get(name) is None else float(values[name]) for name in self.names]
+        slot = self.count % self.capacity
+        self._record.pack_into(self._map, self._data_offset + slot * self._record.size, timestamp, *row)
+        self.count += 1
+        SAMPLE_RING_COUNT.pack_into(self._map, SAMPLE_RING_HEADER.size, self.count)
+
+    def records(self, since=0.0):
+        """Samples newer than since, oldest first: [(timestamp, {field: value or None})]"""
+        return _sample_ring_records(self._map, since)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def read_sample_ring(path=SAMPLE_RING_FILE, since=0.0):
+    """Read a sample ring written by a running (or stopped) driver; None if missing/invalid"""
+    try:
+        with open(path, 'rb') as f:
+            ring_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        return _sample_ring_records(ring_map, since)
+    except (ValueError, struct.error):
+        return None
+    finally:
+        ring_map.close()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense (not thread-safe, see DriverMetrics)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
 
-# Daily flags bitfield definitions (REG_FLAGS_DAILY = 69)
-FLAGS_DAILY_BITS = {
-    0: "ResetDetected",
-    1: "EqualizeTriggered",
-    2: "EnteredFloat",
-    3: "AlarmOccurred",
-    4: "FaultOccurred"
+    def render(self, name, help_text):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        lines += [f'{name}_bucket{{le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+        lines += [f'{name}_bucket{{le="+Inf"}} {self.count}', f"{name}_sum {self.sum:.6f}", f"{name}_count {self.count}"]
+        return lines
+
+
+class DriverMetrics:
+    """
+    In-memory metrics and the latest JSON snapshot for the HTTP endpoint
+
+    Updated from the poll cycle (and Modbus calls from worker threads), read by
+    HTTP handler threads - everything goes through one lock. Scrapes only render
+    what is already here; they never cause Modbus traffic.
+    """
+
+    LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.read_latency = Histogram(self.LATENCY_BUCKETS)
+        self.cycle_time = Histogram(self.LATENCY_BUCKETS)
+        self.counters = dict.fromkeys(('modbus_reads', 'modbus_read_failures', 'modbus_retries',
+                                       'modbus_bytes_read', 'poll_cycles'), 0)
+        self.gauges = {}
+        self.snapshot_json = b'{}'
+
+    def observe_read(self, seconds, attempts, registers):
+        """Successful Modbus read after `attempts` tries"""
+        with self._lock:
+            self.read_latency.observe(seconds)
+            self.counters['modbus_reads'] += 1
+            self.counters['modbus_retries'] += attempts - 1
+            self.counters['modbus_bytes_read'] += registers * 2
+
+    def read_failed(self, attempts):
+        with self._lock:
+            self.counters['modbus_read_failures'] += 1
+            self.counters['modbus_retries'] += attempts - 1
+
+    def observe_cycle(self, seconds, gauges, snapshot_json):
+        """End of a poll cycle: cycle time, state gauges and the (encoded) JSON snapshot to serve"""
+        with self._lock:
+            self.cycle_time.observe(seconds)
+            self.counters['poll_cycles'] += 1
+            self.gauges = gauges
+            self.snapshot_json = snapshot_json
+
+    def render_prometheus(self):
+        with self._lock:
+            lines = self.read_latency.render('tristar_modbus_read_seconds', 'Modbus read latency (successful reads)')
+            lines += self.cycle_time.render('tristar_poll_cycle_seconds', 'Duration of one poll cycle')
+            for name, value in self.counters.items():
+                lines += [f"# TYPE tristar_{name}_total counter", f"tristar_{name}_total {value}"]
+            for name, value in self.gauges.items():
+                lines.append(f"# TYPE tristar_{name} gauge")
+                if isinstance(value, dict):  # Per-field gauge
+                    lines += [f'tristar_{name}{{field="{key}"}} {number}' for key, number in value.items()]
+                else:
+                    lines.append(f"tristar_{name} {value}")
+        return ("\n".join(lines) + "\n").encode()
+
+
+class EventBroadcaster:
+    """
+    Fan-out of per-cycle snapshots to Server-Sent Events clients
+
+    Each cycle is encoded once per stream kind ('snapshot' = full document,
+    'changes' = only fields that changed since the previous cycle), however
+    many clients are connected. Every client has a bounded queue; a client that
+    falls so far behind that its queue is full is disconnected (it can resume
+    with Last-Event-ID). The last replay_size full snapshots are kept and
+    replayed to new clients.
+    """
+
+    def __init__(self, replay_size=20, client_queue=30):
+        self.client_queue = client_queue
+        self.replay = deque(maxlen=replay_size)  # (event id, encoded 'snapshot' event)
+        self.clients = {}                        # queue -> wants changes only
+        self.event_id = 0
+        self.previous_values = {}
+        self.dropped_clients = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(event_id, kind, data):
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, kind.encode(), data)
+
+    def publish(self, snapshot, snapshot_json):
+        """Queue one cycle for all clients (main loop; never blocks on slow clients)"""
+        values = snapshot['values']
+        changes = {name: value for name, value in values.items()
+                   if self.previous_values.get(name, ()) != value}
+        self.previous_values = dict(values)
+
+        with self._lock:
+            self.event_id += 1
+            full_event = self._encode(self.event_id, 'snapshot', snapshot_json)
+            self.replay.append((self.event_id, full_event))
+            if not self.clients:
+                return
+            change_event = None
+            if changes and any(self.clients.values()):
+                change_event = self._encode(self.event_id, 'changes', json.dumps(
+                    {'timestamp': snapshot['timestamp'], 'values': changes}, separators=(',', ':')).encode())
+
+            for client, changes_only in list(self.clients.items()):
+                event = change_event if changes_only else full_event
+                if event is None:
+                    continue
+                try:
+                    client.put_nowait(event)
+                except queue.Full:
+                    # Slow consumer: drop it instead of buffering without bound
+                    del self.clients[client]
+                    with client.mutex:
+                        client.queue.clear()
+                    client.put_nowait(None)  # Tells the handler thread to close the stream
+                    self.dropped_clients += 1
+                    logging.info("SSE client dropped (too slow)")
+
+    def subscribe(self, changes_only=False, last_event_id=None):
+        """Register a client; returns (queue, replay events). None in the queue = disconnect."""
+        client = queue.Queue(maxsize=self.client_queue)
+        with self._lock:
+            replay = [event for event_id, event in self.replay
+                      if last_event_id is None or event_id > last_event_id]
+            if changes_only:
+                replay = replay[-1:]  # Full snapshot as the starting point, then changes
+            self.clients[client] = changes_only
+        return client, replay
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self.clients.pop(client, None)
+
+
+class TelemetryRequestHandler(BaseHTTPRequestHandler):
+    """GET /snapshot.json, /metrics (Prometheus text format) and /events (Server-Sent Events)"""
+
+    SSE_KEEPALIVE = 15  # Seconds between comment lines on an idle stream
+
+    def do_GET(self):
+        metrics = self.server.metrics
+        path, _, query = self.path.partition('?')
+        if path in ('/', '/snapshot.json'):
+            body, content_type = metrics.snapshot_json, 'application/json'
+        elif path == '/metrics':
+            body, content_type = metrics.render_prometheus(), 'text/plain; version=0.0.4'
+        elif path == '/events':
+            self._stream_events('changes=1' in query.split('&'))
+            return
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, changes_only):
+        """Server-Sent Events: replay, then one event per poll cycle until the client goes away"""
+        try:
+            last_event_id = int(self.headers.get('Last-Event-ID'))
+        except (TypeError, ValueError):
+            last_event_id = None
+        events = self.server.events
+        client, replay = events.subscribe(changes_only, last_event_id)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            for event in replay:
+                self.wfile.write(event)
+            self.wfile.flush()
+            while True:
+                try:
+                    event = client.get(timeout=self.SSE_KEEPALIVE)
+                except queue.Empty:
+                    event = b": keepalive\n\n"
+                if event is None:
+                    break
+                self.wfile.write(event)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            events.unsubscribe(client)
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        logging.debug("HTTP %s - %s", self.address_string(), format % args)
+
+
+def start_http_server(metrics, events, bind, port):
+    """Serve metrics/events from a daemon thread (returns the server, or None if it could not bind)"""
+    try:
+        server = ThreadingHTTPServer((bind, port), TelemetryRequestHandler)
+    except OSError as e:
+        logging.warning(f"HTTP endpoint disabled - cannot listen on {bind}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    server.metrics = metrics
+    server.events = events
+    threading.Thread(target=server.serve_forever, name='http', daemon=True).start()
+    logging.info(f"HTTP endpoint on http://{bind}:{port}/ (snapshot.json, metrics, events)")
+    return server
+
+
+# MQTT command topics (<prefix>/set/<name>) -> writeable D-Bus path they act on
+MQTT_COMMANDS = {
+    'ApplyChargeProfile': '/Control/ApplyChargeProfile',
+    'VoltageOverride': '/Control/VoltageOverride',
+    'CurrentOverride': '/Control/CurrentOverride',
 }
 
 
+class MqttPublisher:
+    """
+    Publishes each cycle's snapshot to MQTT and accepts control commands
+
+    One compact JSON document per cycle goes to <prefix>/state; per-field topics
+    (<prefix>/<field>, retained) are only republished when the value moved by
+    at least the field's deadband. The connection is persistent (paho's network
+    thread reconnects on its own); while the broker is unreachable messages are
+    kept in a bounded deque and flushed on reconnect. Commands on
+    <prefix>/set/<name> are handed to on_command(path, value) on the GLib main
+    loop, i.e. the same callbacks as D-Bus writes.
+
+    client is a paho-mqtt Client or any object with the same methods (tests can
+    pass a broker stand-in).
+    """
+
+    def __init__(self, client, prefix, on_command, deadbands=None, queue_size=1000):
+        self.client = client
+        self.prefix = prefix.rstrip('/')
+        self.on_command = on_command
+        self.deadbands = deadbands or {}
+        self.queue = deque(maxlen=queue_size)
+        self.dropped = 0
+        self.connected = False
+        self.last_published = {}  # field -> last value sent on its own topic
+        self._lock = threading.Lock()
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.will_set(f"{self.prefix}/status", 'offline', qos=1, retain=True)
+
+    @classmethod
+    def create(cls, host, port, prefix, on_command, **kwargs):
+        """Connect to a broker with paho-mqtt (returns None if paho-mqtt is not installed)"""
+        if paho_mqtt is None:
+            logging.warning("MQTT publisher disabled - paho-mqtt is not installed")
+            return None
+        client_id = f"dbus-tristar-{os.getpid()}"
+        try:
+            client = paho_mqtt.Client(paho_mqtt.CallbackAPIVersion.VERSION1, client_id)  # paho-mqtt 2.x
+        except AttributeError:
+            client = paho_mqtt.Client(client_id)  # paho-mqtt 1.x
+        publisher = cls(client, prefix, on_command, **kwargs)
+        client.reconnect_delay_set(min_delay=1, max_delay=60)
+        client.connect_async(host, port, keepalive=60)
+        client.loop_start()
+        logging.info(f"MQTT publisher: {host}:{port}, topic prefix '{publisher.prefix}'")
+        return publisher
+
+    def _on_connect(self, client, userdata, flags, rc, *args):
+        if rc != 0:
+            logging.warning(f"MQTT connect refused (rc={rc})")
+            return
+        client.subscribe(f"{self.prefix}/set/+", qos=1)
+        with self._lock:
+            self.connected = True
+            pending = list(self.queue)
+            self.queue.clear()
+        client.publish(f"{self.prefix}/status", 'online', qos=1, retain=True)
+        for topic, payload, retain in pending:
+            client.publish(topic, payload, qos=0, retain=retain)
+        logging.info(f"MQTT connected ({len(pending)} queued messages flushed, {self.dropped} dropped)")
+
+    def _on_disconnect(self, client, userdata, rc, *args):
+        with self._lock:
+            self.connected = False
+        if rc != 0:
+            logging.warning(f"MQTT connection lost (rc={rc}) - queueing up to {self.queue.maxlen} messages")
+
+    def _on_message(self, client, userdata, message):
+        name = message.topic.rsplit('/', 1)[-1]
+        path = MQTT_COMMANDS.get(name)
+        if path is None:
+            logging.warning(f"MQTT: unknown command topic {message.topic}")
+            return
+        value = message.payload.decode('utf-8', 'replace').strip()
+        logging.info(f"MQTT command: {name} = {value!r}")
+        # Runs on paho's network thread - hand over to the main loop like a D-Bus write
+        GLib.idle_add(self.on_command, path, value)
+
+    def _send(self, topic, payload, retain=False):
+        with self._lock:
+            if not self.connected:
+                if len(self.queue) == self.queue.maxlen:
+                    self.dropped += 1
+                self.queue.append((topic, payload, retain))
+                return
+        self.client.publish(topic, payload, qos=0, retain=retain)
+
+    def publish_cycle(self, snapshot, snapshot_json):
+        """One JSON document for the cycle plus per-field topics that moved beyond their deadband"""
+        self._send(f"{self.prefix}/state", snapshot_json)
+        for field, value in snapshot['values'].items():
+            if self._moved(field, value):
+                self.last_published[field] = value
+                self._send(f"{self.prefix}/{field}", '' if value is None else json.dumps(value), retain=True)
+
+    def _moved(self, field, value):
+        """True if value differs from the last published one by at least the field's deadband"""
+        if field not in self.last_published:
+            return True
+        previous = self.last_published[field]
+        if value is None or previous is None:
+            return value is not previous
+        return value != previous and abs(value - previous) >= self.deadbands.get(field, 0)
+
+    def stop(self):
+        self.client.publish(f"{self.prefix}/status", 'offline', qos=1, retain=True)
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class BatchedDbusService:
+    """
+    Wrapper around VeDbusService that batches all writes of one update cycle
+
+    Inside batch(), writes from the owning thread are staged in velib's
+    ServiceContext and go out as ONE ItemsChanged signal on the service root
+    when the batch closes (consumers can bulk-read everything via GetItems on /).
+    With per_path_signals the staged changes are also emitted as the classic
+    per-path PropertiesChanged signals, for consumers that only subscribe to
+    those. Older velib versions without ItemsChanged support always publish
+    per path. Writes from other threads (profile apply, controller reset) are
+    never staged - they are published immediately.
+    """
+
+    def __init__(self, servicename, per_path_signals=True):
+        self._service = VeDbusService(servicename, register=False)
+        self._context = None
+        self._batch_thread = None
+        self.per_path_signals = per_path_signals
+        # velib exposes batching via the context manager protocol (ServiceContext)
+        self.supports_items_changed = hasattr(self._service, '__enter__')
+
+    def add_path(self, path, value, **kwargs):
+        return self._service.add_path(path, value, **kwargs)
+
+    def register(self):
+        self._service.register()
+
+    def __contains__(self, path):
+        return path in self._service
+
+    def __getitem__(self, path):
+        return self._service[path]
+
+    def __setitem__(self, path, value):
+        if self._context is not None and threading.get_ident() == self._batch_thread:
+            self._context[path] = value
+        else:
+            self._service[path] = value
+
+    @property
+    def connection(self):
+        """Bus connection of the service (for exporting additional objects)"""
+        return self._service._dbusconn
+
+    @contextmanager
+    def batch(self):
+        """Stage all writes in this block and emit them as one ItemsChanged signal (plus per-path signals)"""
+        if not self.supports_items_changed or self._context is not None:
+            # Per-path fallback (old velib) or nested batch (outer batch flushes)
+            yield self
+            return
+
+        changes = {}
+        with self._service as context:
+            self._context = context
+            self._batch_thread = threading.get_ident()
+            try:
+                yield self
+            finally:
+                self._context = None
+                self._batch_thread = None
+                if self.per_path_signals:
+                    changes = dict(context.changes)  # Cleared when the context flushes ItemsChanged
+        for path, change in changes.items():
+            self._service._dbusobjects[path].PropertiesChanged(change)
+
+
+class HistoryQueryService(dbus.service.Object):
+    """
+    /HistoryQuery on the driver's service: daily history beyond /History/Daily/1-30
+
+    GetHistory(from_date, to_date, fields) -> (fields, [(date, [values])])
+    Dates are ISO 'YYYY-MM-DD' ('' = open end), fields are state history keys
+    ('yield', 'max_power', ...; empty = all). At most HISTORY_QUERY_MAX_DAYS
+    rows per call, oldest first; missing values are NaN.
+    """
+
+    def __init__(self, connection, query):
+        super().__init__(connection, HISTORY_QUERY_PATH)
+        self._query = query
+
+    @dbus.service.method(HISTORY_QUERY_INTERFACE, in_signature='ssas', out_signature='asa(sad)')
+    def GetHistory(self, from_date, to_date, fields):
+        try:
+            names, rows = self._query(str(from_date), str(to_date), [str(name) for name in fields])
+        except ValueError as e:
+            raise dbus.exceptions.DBusException(str(e), name=f'{HISTORY_QUERY_INTERFACE}.InvalidArgs')
+        return (dbus.Array(names, signature='s'),
+                dbus.Array([dbus.Struct((date, dbus.Array([math.nan if value is None else float(value)
+                                                           for value in values], signature='d')),
+                                        signature='sad')
+                            for date, values in rows], signature='(sad)'))
+
+
+class EepromBackupService(dbus.service.Object):
+    """
+    /EepromBackups on the driver's service: list and restore EEPROM backups
+
+    List() -> [(id, time, reason, profile, image hash)], newest first
+    Restore(id) -> status text; writes the backup's parameters with the same
+    procedure as a profile apply (disconnect, write, verify, reset controller).
+    """
+
+    def __init__(self, connection, archive, restore):
+        super().__init__(connection, EEPROM_BACKUP_PATH)
+        self._archive = archive
+        self._restore = restore
+
+    @dbus.service.method(EEPROM_BACKUP_INTERFACE, in_signature='', out_signature='a(issss)')
+    def List(self):
+        return dbus.Array([dbus.Struct((entry['id'], entry['t'], entry['reason'], entry['profile'], entry['image']),
+                                       signature='issss')
+                           for entry in self._archive.entries()], signature='(issss)')
+
+    @dbus.service.method(EEPROM_BACKUP_INTERFACE, in_signature='i', out_signature='s')
+    def Restore(self, backup_id):
+        try:
+            return self._restore(int(backup_id))
+        except ValueError as e:
+            raise dbus.exceptions.DBusException(str(e), name=f'{EEPROM_BACKUP_INTERFACE}.InvalidArgs')
+
+
 class TriStarDriver:
     """Main driver class for TriStar MPPT"""
 
@@ -355,6 +1398,25 @@ class TriStarDriver:
         self.serial_number = ""
         self.product_name = ""
 
+        # In-memory metrics / JSON snapshot (served by the optional HTTP endpoint)
+        self.metrics = DriverMetrics()
+        self.last_decoded = {}
+        self.utc_offset = 0  # Seconds east of UTC, refreshed by _get_local_date (D-Bus timezone setting)
+
+        # Per-field plausibility checks (limits refined in initialize())
+        self.validator = FieldValidator()
+
+        # Shared-memory live snapshot for local consumers (optional - driver works without it)
+        try:
+            self.snapshot_writer = SnapshotWriter(SNAPSHOT_FILE, [field.name for field in DECODED_FIELDS])
+        except OSError as e:
+            logging.warning(f"Shared-memory snapshot disabled ({SNAPSHOT_FILE}): {e}")
+            self.snapshot_writer = None
+
+        # Short-term history of raw register snapshots (post-mortem / smoothing / rate checks)
+        self.snapshots = RegisterRingBuffer(CONFIG['snapshot_buffer_size'],
+                                            REG_T_FLOAT - REG_V_BAT + 1, REG_V_BAT)
+
         # Bulk charge timing
         self.t_bulk_ms = 0
         self.last_update = time()
@@ -376,9 +1438,11 @@ class TriStarDriver:
         self.backoff_factor = 1  # Multiplier for poll interval (1x, 2x, 4x)
 
         # EEPROM read optimization (avoid reading every poll per Morningstar recommendation)
-        self.eeprom_refresh_needed = True   # Flag to refresh charge settings (read at startup)
         self.eeprom_kwh_counter = 0         # Counter for lifetime kWh reads
         self.eeprom_kwh_interval = 360      # Read every 30 min (360 × 5s = 1800s)
+        self.eeprom_shadow = self._load_eeprom_shadow()  # serial -> {regs, kwh, read_at}
+        self.eeprom_revalidate_at = None    # Next background check of the shadow (time())
+        self.eeprom_revalidate_thread = None
 
         # Voltage override control
         self.pending_voltage_override = None       # Register value to write (None = disabled)
@@ -401,27 +1465,21 @@ class TriStarDriver:
         self.last_current_override_write = 0       # Timestamp of last write
         self.current_override_active = False       # Is current override active?
 
-        # Load persistent state (total yield and 30-day history)
+        # Load persistent state (total yield and 30-day history): state.bin snapshot + journal,
+        # migrated to the current state version
+        self.state_store = StateStore(STATE_FILE,
+                                      fsync_interval=CONFIG['state_fsync_interval_sec'],
+                                      max_journal_bytes=CONFIG['state_journal_max_bytes'],
+                                      volatile=STATE_VOLATILE_KEYS,
+                                      shared=STATE_SHARED_KEYS,
+                                      vectors=STATE_VECTOR_KEYS,
+                                      import_path=STATE_IMPORT_FILE)
+        self.state_copies = {}  # STATE_SHARED_KEYS -> (live object, length, copy handed to the writer)
         self.state = self._load_state()
+        self.save_requests = []  # Reasons for a pending compaction (coalesced, handled in poll cycle)
 
-        # Ensure lifetime tracking exists in state (for backwards compatibility)
-        if 'lifetime' not in self.state:
-            self.state['lifetime'] = {
-                "max_pv_voltage": 0.0,
-                "max_battery_voltage": 0.0,
-                "min_battery_voltage": 999.0
-            }
-
-        # Ensure today tracking exists in state (for backwards compatibility)
-        if 'today' not in self.state:
-            self.state['today'] = {
-                "max_battery_current": 0.0,
-                "max_power": 0.0,
-                "max_pv_voltage": 0.0,
-                "max_battery_voltage": 0.0,
-                "min_battery_voltage": 999.0,
-                "time_bulk": 0
-            }
+        # All state writes happen on one background thread (never blocks the main loop)
+        self.state_writer = StateWriter(self.state_store, on_written=self._on_state_written)
 
         # Daily value trackers (reset at midnight) - load from state to preserve across restarts
         self.daily_max_battery_current = self.state['today'].get('max_battery_current', 0.0)
@@ -434,6 +1492,18 @@ class TriStarDriver:
         time_bulk_minutes = self.state['today'].get('time_bulk', 0)
         self.t_bulk_ms = time_bulk_minutes * 60 * 1000  # Convert minutes to milliseconds
 
+        # Last 24 h of decoded samples, memory-mapped on /data (optional - driver works without it).
+        # The state may be up to one save interval old after a crash: catch up today's extremes.
+        self.sample_ring = None
+        if CONFIG['sample_ring_hours']:
+            capacity = CONFIG['sample_ring_hours'] * 3600 * 1000 // int(self.settings['poll_interval'])
+            try:
+                self.sample_ring = SampleRing(SAMPLE_RING_FILE, SAMPLE_RING_FIELDS, capacity)
+                self._recompute_daily_extremes()
+            except (OSError, ValueError) as e:
+                logging.warning(f"Sample ring disabled ({SAMPLE_RING_FILE}): {e}")
+                self.sample_ring = None
+
         # Nightly reset tracking
         self.last_reset_date = self.state.get('current_date')
         self.season_check_done_today = False  # Reset daily at midnight
@@ -454,14 +1524,6 @@ class TriStarDriver:
         self.time_float_offset = self.state.get('time_float_offset', 0)
         self.time_eq_offset = self.state.get('time_eq_offset', 0)
 
-        # Load voltage override state (for backwards compatibility)
-        if 'voltage_override' not in self.state:
-            self.state['voltage_override'] = {
-                "time_used_today": 0,
-                "current_date": self.state.get('current_date'),
-                "stop_reason": ""
-            }
-
         # Load voltage override time tracking from state
         self.time_at_override_today = self.state['voltage_override'].get('time_used_today', 0)
         self.stop_reason = self.state['voltage_override'].get('stop_reason', "")
@@ -469,6 +1531,31 @@ class TriStarDriver:
         # Track which history days have D-Bus paths created (for dynamic path creation)
         self.history_days_created = set()  # Set of day indices (1-29) that have paths
 
+        # History days 1-30 only change on rollover, state load or explicit edits -
+        # publish them only when marked dirty (not every poll)
+        self.history_dirty = True
+
+        # Diagnostic bitfields: XOR-diff publishers + persisted transition log
+        last_words = self.state['bitfields']
+        self.bitfield_publishers = [
+            (REG_FAULTS, BitfieldPublisher(
+                'faults', '/Custom/Faults/Bitfield',
+                {bit: f'/Custom/Faults/{name}' for bit, name in FAULT_BITS.items()},
+                last_words.get('faults'))),
+            (REG_DIP_SWITCHES, BitfieldPublisher(
+                'dip_switches', '/Custom/DipSwitches/Bitfield',
+                {bit: f'/Custom/DipSwitches/{name}' for bit, name in DIP_SWITCH_BITS.items()},
+                last_words.get('dip_switches'))),
+            (REG_FLAGS_DAILY, BitfieldPublisher(
+                'flags_daily', '/Custom/Daily/FlagsBitfield',
+                {bit: f'/Custom/Daily/Flags/{name}' for bit, name in FLAGS_DAILY_BITS.items()},
+                last_words.get('flags_daily'))),
+            (REG_FAULTS_DAILY, BitfieldPublisher(
+                'faults_daily', '/Custom/Daily/FaultsBitfield',
+                {bit: f'/Custom/Daily/Faults/{name}' for bit, name in FAULT_BITS.items()},
+                last_words.get('faults_daily'))),
+        ]
+
         # Charge profile management (EEPROM-based permanent settings)
         self.charge_profiles = self._load_charge_profiles()
         self.profile_apply_status = "idle"
@@ -486,9 +1573,24 @@ class TriStarDriver:
         # D-Bus service (use configurable device instance)
         instance = int(self.settings['device_instance'])
         service_name = f'com.victronenergy.solarcharger.tristar_{instance}'
-        self.dbus = VeDbusService(service_name, register=False)
+        self.dbus = BatchedDbusService(service_name, per_path_signals=CONFIG['dbus_per_path_signals'])
         self._setup_dbus_paths()
         self.dbus.register()
+        if not self.dbus.supports_items_changed:
+            logging.info("velib without ItemsChanged support - publishing per-path PropertiesChanged")
+        elif self.dbus.per_path_signals:
+            logging.info("Publishing ItemsChanged per cycle plus per-path PropertiesChanged")
+
+        # Publish history loaded from state file (days 1-30)
+        self._update_historical_days()
+
+        # Month/year accumulators; state from before rollups existed is seeded from its 30 days
+        if not self.state['rollups']['monthly'] and self.state['history']:
+            for day in reversed(self.state['history']):
+                self._fold_into_rollups(day, publish=False)
+            logging.info(f"Seeded month/year rollups from {len(self.state['history'])} history days")
+        self._publish_rollups()
+        self._publish_hourly_profile()
 
         # Populate season/profile display paths from state
         self.dbus['/Custom/Season/CurrentSeason'] = self._get_current_season()
@@ -497,6 +1599,68 @@ class TriStarDriver:
         self.dbus['/Custom/VoltageOverride/LastBalanceTimestamp'] = \
             self.state['voltage_override'].get('last_balance_timestamp', '')
         self.dbus['/Custom/VoltageOverride/BalanceComplete'] = False
+        self._publish_fault_event_summary()
+
+        # Optional MQTT publisher (snapshot per cycle + control commands)
+        self.mqtt = None
+        if CONFIG['mqtt_host']:
+            self.mqtt = MqttPublisher.create(
+                CONFIG['mqtt_host'], CONFIG['mqtt_port'], CONFIG['mqtt_topic_prefix'],
+                self._on_mqtt_command, deadbands=CONFIG['mqtt_deadbands'],
+                queue_size=CONFIG['mqtt_queue_size'])
+
+        # Optional local HTTP endpoint (JSON snapshot + Prometheus metrics)
+        self.http_server = None
+        self.events = None
+        if CONFIG['http_port']:
+            self.events = EventBroadcaster(CONFIG['sse_replay_size'], CONFIG['sse_client_queue'])
+            self.http_server = start_http_server(self.metrics, self.events, CONFIG['http_bind'], CONFIG['http_port'])
+
+        # Local time-series history (optional - needs the sqlite3 module)
+        self.timeseries = None
+        if CONFIG['history_db_max_mb']:
+            if tristar_history.sqlite3 is None:
+                logging.warning("sqlite3 module not available - time-series history disabled")
+            else:
+                self.timeseries = tristar_history.TimeSeriesStore(
+                    HISTORY_DB_FILE, flush_interval=CONFIG['history_db_flush_sec'],
+                    max_bytes=CONFIG['history_db_max_mb'] * 1024 * 1024)
+                # Days recorded before the database existed (existing rows win)
+                for entry in self.state['history']:
+                    self.timeseries.add_day(entry, replace=False)
+        self.history_db = None  # Read-only connection for GetHistory (main loop only)
+        try:
+            self.history_query = HistoryQueryService(self.dbus.connection, self._query_history)
+        except Exception as e:
+            logging.warning(f"History query object not exported: {e}")
+            self.history_query = None
+
+        # Raw register archive (every 24-79 snapshot, for post-mortem analysis)
+        self.archive = None
+        if CONFIG['register_archive_days']:
+            self.archive = RegisterArchive(REGISTER_ARCHIVE_DIR, self.state['current_date'] or self._get_local_date(),
+                                           REG_V_BAT, REG_T_FLOAT - REG_V_BAT + 1,
+                                           block_size=CONFIG['register_archive_block'],
+                                           keep_days=CONFIG['register_archive_days'],
+                                           block_seconds=CONFIG['register_archive_block_sec'])
+
+        # EEPROM backups (one indexed archive; per-file backups of older releases are imported)
+        self.eeprom_backups = EepromBackupArchive(EEPROM_BACKUP_FILE, keep=CONFIG['eeprom_backup_keep'],
+                                                  max_age_days=CONFIG['eeprom_backup_max_days'])
+        if EEPROM_BACKUP_LEGACY_DIR.is_dir():
+            self.eeprom_backups.import_legacy(EEPROM_BACKUP_LEGACY_DIR)
+        try:
+            self.eeprom_backup_service = EepromBackupService(self.dbus.connection, self.eeprom_backups,
+                                                             self._restore_eeprom_backup)
+        except Exception as e:
+            logging.warning(f"EEPROM backup object not exported: {e}")
+            self.eeprom_backup_service = None
+
+        # Days missed while the driver was down are read back from the controller's daily log
+        # (at startup and after a lost connection, at night only)
+        self.log_backfill_pending = bool(CONFIG['controller_log_base'])
+        self.log_backfill_thread = None
+        self.log_backfill_retry_at = 0.0
 
         # Start periodic updates
         self._start_timer()
@@ -505,16 +1669,13 @@ class TriStarDriver:
         logging.info(f"Settings: {self.settings['ip_address']}:{self.settings['modbus_port']}")
 
     def _load_state(self):
-        """Load persistent state from JSON file"""
+        """Load persistent state (snapshot with the journal replayed on top), migrated to the current version"""
         try:
-            if STATE_FILE.exists():
-                with open(STATE_FILE, 'r') as f:
-                    state = json.load(f)
-
-                # Validate version
-                if state.get('version') != 1:
-                    logging.warning(f"State file version mismatch, starting fresh")
-                    return self._create_fresh_state()
+            state = self.state_store.load()
+            if state is not None:
+                loaded_version = migrate_state(state)
+                if loaded_version != state['version']:
+                    logging.info(f"Migrated state from version {loaded_version} to {state['version']}")
 
                 logging.info(f"Loaded state: {len(state.get('history', []))} days of history")
                 return state
@@ -523,48 +1684,52 @@ class TriStarDriver:
                 return self._create_fresh_state()
 
         except Exception as e:
+            # Keep the unreadable files for manual recovery - never overwrite lifetime totals
             logging.error(f"Error loading state file: {e}, starting fresh")
+            self.state_store.set_aside()
             return self._create_fresh_state()
 
     def _create_fresh_state(self):
         """Create fresh state structure"""
-        return {
-            "version": 1,
-            "total_yield_kwh": 0.0,
-            "last_update": datetime.utcnow().isoformat() + "Z",
-            "current_date": self._get_local_date(),
-            "daily_register_has_reset": True,  # Assume Modbus valid initially
-            "daily_wh_offset": 0.0,  # Offset for controller resets before midnight
-            "time_abs_offset": 0,    # Absorption time before last controller reset
-            "time_float_offset": 0,  # Float time before last controller reset
-            "time_eq_offset": 0,     # Equalize time before last controller reset
-            "today": {
-                "yield": 0.0,
-                "max_battery_current": 0.0,
-                "max_power": 0.0,
-                "max_pv_voltage": 0.0,
-                "max_battery_voltage": 0.0,
-                "min_battery_voltage": 999.0,
-                "time_bulk": 0,
-                "time_absorption": 0,
-                "time_float": 0,
-                "time_equalize": 0
-            },
-            "history": [],  # Will grow to 30 days (Day 1-30)
-            "lifetime": {
-                "max_pv_voltage": 0.0,
-                "max_battery_voltage": 0.0,
-                "min_battery_voltage": 999.0  # High initial value so first real value will be lower
-            },
-            "voltage_override": {
-                "time_used_today": 0,         # Seconds at override voltage today
-                "current_date": self._get_local_date(),  # Date for midnight reset
-                "stop_reason": "",            # Last stop reason
-                "last_balance_timestamp": ""  # ISO timestamp of last BatteryFull stop
-            },
-            "active_profile": "",       # Last successfully applied charge profile
-            "last_known_season": ""     # Season at last profile auto-switch check
-        }
+        state = fresh_state(self._get_local_date())
+        state['last_update'] = datetime.utcnow().isoformat() + "Z"
+        return state
+
+    def _recompute_daily_extremes(self):
+        """Fold the sample ring's records of the state's current day into the daily max/min trackers"""
+        current_date = self.state.get('current_date')
+        if not current_date:
+            return
+        self._get_local_date()  # Refreshes self.utc_offset
+        day_start = datetime.strptime(current_date, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() \
+            - self.utc_offset
+        samples = [values for timestamp, values in self.sample_ring.records(since=day_start)
+                   if timestamp < day_start + 86400]
+        if not samples:
+            return
+
+        def extreme(pick, field, condition):
+            values = [sample[field] for sample in samples if sample[field] is not None and condition(sample[field])]
+            return pick(values) if values else None
+
+        before = (self.daily_max_power, self.daily_max_battery_current, self.daily_max_battery_voltage,
+                  self.daily_min_battery_voltage, self.daily_max_pv_voltage)
+        for attr, pick, field, condition in (
+                ('daily_max_power', max, 'p_out', lambda value: True),
+                ('daily_max_battery_current', max, 'i_cc', lambda value: True),
+                ('daily_max_battery_voltage', max, 'v_bat', lambda value: True),
+                ('daily_min_battery_voltage', min, 'v_bat', lambda value: value > 0),
+                ('daily_max_pv_voltage', max, 'v_pv', lambda value: True)):
+            value = extreme(pick, field, condition)
+            if value is not None:
+                setattr(self, attr, pick(getattr(self, attr), value))
+        after = (self.daily_max_power, self.daily_max_battery_current, self.daily_max_battery_voltage,
+                 self.daily_min_battery_voltage, self.daily_max_pv_voltage)
+        if after != before:
+            logging.info(f"Daily extremes recomputed from {len(samples)} ring samples: "
+                         f"max_power={self.daily_max_power:.0f}W, max_current={self.daily_max_battery_current:.1f}A, "
+                         f"V_bat {self.daily_min_battery_voltage:.2f}-{self.daily_max_battery_voltage:.2f}V, "
+                         f"max_pv={self.daily_max_pv_voltage:.1f}V")
 
     def _flush_today_to_state(self):
         """
@@ -594,25 +1759,87 @@ class TriStarDriver:
             f"time_bulk={self.state['today']['time_bulk']}min"
         )
 
-    def _save_state(self):
-        """Save state to JSON file atomically"""
-        try:
-            # Create directory if needed
-            STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    def _save_state(self, compact=False, wait=False, force=True):
+        """
+        Persist state: append changed fields to the journal (cheap, every cycle),
+        or with compact=True rewrite the state.bin snapshot atomically and start a new journal
 
+        force=False (timed compaction) skips the rewrite when nothing meaningful
+        changed and the journal is empty. The write itself happens on the state writer thread from a deep copy of
+        the state; wait=True blocks until it is on disk (before controller resets).
+        """
+        try:
             # Update timestamp
             self.state['last_update'] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+            self.state_writer.submit(self._state_snapshot(), compact, force)
+        except Exception as e:
+            logging.error(f"Error saving state: {e}")
+            return
 
-            # Write atomically (temp file + rename)
-            temp_file = STATE_FILE.with_suffix('.tmp')
-            with open(temp_file, 'w') as f:
-                json.dump(self.state, f, indent=2)
-            temp_file.replace(STATE_FILE)
+        if wait and not self.state_writer.flush(timeout=10):
+            logging.error("State save did not complete within 10s")
 
-            logging.debug("State saved successfully")
+    def _state_snapshot(self):
+        """
+        Copy of the state for the writer thread (main loop, every cycle)
 
-        except Exception as e:
-            logging.error(f"Error saving state: {e}")
+        Small subtrees are deep-copied each time. STATE_SHARED_KEYS reuse the copy
+        made after their last change: call _mark_state_dirty(key) after editing
+        one in place (replacing the object or changing its length is detected).
+        """
+        snapshot = {}
+        for key, value in self.state.items():
+            if key not in STATE_SHARED_KEYS:
+                snapshot[key] = copy.deepcopy(value)
+                continue
+            cached = self.state_copies.get(key)
+            if cached is None or cached[0] is not value or cached[1] != len(value):
+                cached = self.state_copies[key] = (value, len(value), copy.deepcopy(value))
+            snapshot[key] = cached[2]
+        return snapshot
+
+    def _mark_state_dirty(self, key):
+        """A STATE_SHARED_KEYS subtree was changed in place: copy it again on the next save"""
+        self.state_copies.pop(key, None)
+
+    def _flush_register_archive(self):
+        """Put the buffered raw snapshots on disk (before a controller reset; any thread)"""
+        if self.archive is not None and not self.archive.flush(timeout=10):
+            logging.error("Register archive flush did not complete within 10s")
+
+    def _on_state_written(self, written, compact):
+        """State writer thread: hand the accounting over to the main loop"""
+        if written:
+            logging.debug(f"State saved successfully ({written} bytes{', compacted' if compact else ''})")
+        GLib.idle_add(self._account_storage_write, written)
+
+    def _request_save(self, reason):
+        """
+        Ask for a full state save (compaction) at the end of the next poll cycle
+
+        Bursts of requests (rollover, season switch, profile apply finishing close
+        together) are coalesced into one write. Saves that must be on flash before
+        something destructive (controller reset) call _save_state(compact=True) directly.
+        """
+        self.save_requests.append(reason)
+
+    def _account_storage_write(self, written):
+        """Per-day flash wear counters (day = state['current_date'], reset on date change)"""
+        wear = self.state['storage_wear']
+        if wear['date'] != self.state.get('current_date', ''):
+            wear.update(date=self.state.get('current_date', ''), writes=0, bytes=0)
+        if written:
+            wear['writes'] += 1
+            wear['bytes'] += written
+        self._publish_storage_stats()
+        return False  # One-shot GLib idle callback
+
+    def _publish_storage_stats(self):
+        wear = self.state['storage_wear']
+        self.dbus['/Custom/Stats/Storage/WritesToday'] = wear['writes']
+        self.dbus['/Custom/Stats/Storage/BytesWrittenToday'] = wear['bytes']
+        self.dbus['/Custom/Stats/Storage/SkippedSaves'] = self.state_store.skipped
+        self.dbus['/Custom/Stats/Storage/Compactions'] = self.state_store.compactions
 
     def _get_local_date(self):
         """Get current date in local timezone from D-Bus timezone setting"""
@@ -628,7 +1855,9 @@ class TriStarDriver:
             time_module.tzset()
 
             # Get local date in the configured timezone
-            local_date = time_module.strftime('%Y-%m-%d', time_module.localtime())
+            local_now = time_module.localtime()
+            local_date = time_module.strftime('%Y-%m-%d', local_now)
+            self.utc_offset = local_now.tm_gmtoff  # Local-time buckets of the time-series history
 
             # Restore original TZ setting
             if old_tz:
@@ -645,8 +1874,180 @@ class TriStarDriver:
             # Fallback to UTC date
             return datetime.now().date().isoformat()
 
+    def _fold_into_rollups(self, day, publish=True):
+        """Fold a finished day into its month and year accumulators (newest period first)"""
+        if not day.get('date'):
+            return
+        for _, key, prefix_length, keep in ROLLUP_PERIODS:
+            period = day['date'][:prefix_length]
+            periods = self.state['rollups'][key]
+            rollup = next((entry for entry in periods if entry['period'] == period), None)
+            if rollup is None:
+                rollup = {'period': period}
+                periods.append(rollup)
+                periods.sort(key=lambda entry: entry['period'], reverse=True)
+            fold_day_into_rollup(rollup, day)
+            if keep is not None:
+                del periods[keep:]
+        self._mark_state_dirty('rollups')
+        if publish:
+            self._publish_rollups()
+
+    def _publish_rollups(self):
+        for segment, key, _, _ in ROLLUP_PERIODS:
+            periods = self.state['rollups'][key]
+            for index in range(ROLLUP_PUBLISHED):
+                rollup = periods[index] if index < len(periods) else {}
+                self.dbus[f'/Custom/History/{segment}/{index}/Period'] = rollup.get('period')
+                for name, field, _, _ in ROLLUP_FIELDS:
+                    self.dbus[f'/Custom/History/{segment}/{index}/{name}'] = rollup.get(field)
+
+    def _update_hourly_yield(self, daily_kwh, now):
+        """
+        Attribute this cycle's yield increase to the current local hour
+
+        The bins always sum to the energy already attributed, so the increase is
+        today's yield (offset-corrected daily_kwh) minus that sum. Drops (midnight,
+        uncompensated controller reset) are not attributed; counting resumes once
+        the yield passes the previous total again.
+        """
+        bins = self.state['today']['hourly_wh']
+        delta = daily_kwh * 1000 - sum(bins)
+        if delta > 0:
+            hour = int((now + self.utc_offset) % 86400 // 3600)
+            bins[hour] += delta
+            self.dbus[f'/Custom/Hourly/Today/{hour}'] = round(bins[hour], 1)
+
+    def _publish_hourly_profile(self):
+        """Publish today's bins and the per-hour average over the last hourly_profile_days days"""
+        for hour, wh in enumerate(self.state['today']['hourly_wh']):
+            self.dbus[f'/Custom/Hourly/Today/{hour}'] = round(wh, 1)
+        days = [day['hourly_wh'] for day in self.state['history'][:CONFIG['hourly_profile_days']]
+                if len(day.get('hourly_wh') or ()) == 24]
+        for hour in range(24):
+            self.dbus[f'/Custom/Hourly/Average/{hour}'] = \
+                round(sum(day[hour] for day in days) / len(days), 1) if days else None
+        self.dbus['/Custom/Hourly/AverageDays'] = len(days)
+
+    def _missing_log_days(self, live_day):
+        """
+        Controller log index -> date for days the history lacks
+
+        Record 0 is the day before live_day (the day the logger block 64-79 still
+        describes). Once the history is full, only days newer than its oldest entry
+        are missing; older ones were folded into the rollups and dropped already.
+        """
+        history = self.state['history']
+        known = {day.get('date') for day in history}
+        oldest = history[-1].get('date', '') if len(history) >= 30 else ''
+        missing = {}
+        for index in range(CONFIG['controller_log_days']):
+            date = (live_day - timedelta(days=index + 1)).isoformat()
+            if date not in known and date > oldest:
+                missing[index] = date
+        return missing
+
+    def _start_log_backfill(self):
+        """Read the log blocks holding missing days on a background thread (main loop, at night)"""
+        live_day = datetime.strptime(self.state['current_date'], '%Y-%m-%d').date()
+        if not self.daily_register_has_reset:
+            live_day -= timedelta(days=1)  # Post-midnight, pre-sunrise: block 64-79 still holds yesterday
+        missing = self._missing_log_days(live_day)
+        if not missing:
+            self.log_backfill_pending = False
+            return
+        blocks = sorted({index // LOG_BLOCK_RECORDS for index in missing})
+        logging.info(f"Controller log backfill: {len(missing)} missing days, reading {len(blocks)} blocks")
+        self.log_backfill_thread = threading.Thread(target=self._read_controller_log, args=(blocks, live_day),
+                                                    name='log-backfill', daemon=True)
+        self.log_backfill_thread.start()
+
+    def _read_controller_log(self, blocks, live_day):
+        """Backfill thread: one block read per LOG_BLOCK_RECORDS days, paced so live polling is not disturbed"""
+        records = {}
+        for n, block in enumerate(blocks):
+            if n:
+                sleep(CONFIG['controller_log_read_gap_sec'])
+            if self.profile_apply_in_progress:
+                records = None  # Profile apply needs the controller to itself
+                break
+            first = block * LOG_BLOCK_RECORDS
+            count = min(LOG_BLOCK_RECORDS, CONFIG['controller_log_days'] - first)
+            words = self.read_holding_registers(CONFIG['controller_log_base'] + first * LOG_RECORD_WORDS,
+                                                count * LOG_RECORD_WORDS)
+            if words is None or len(words) != count * LOG_RECORD_WORDS:
+                records = None
+                break
+            for k in range(count):
+                records[first + k] = words[k * LOG_RECORD_WORDS:(k + 1) * LOG_RECORD_WORDS]
+        GLib.idle_add(self._apply_controller_log, records, live_day)
+
+    def _apply_controller_log(self, records, live_day):
+        """
+        Main loop: fill missing history days from the controller log records
+
+        Records for days the history already has are used as anchors: if their
+        yield does not match what the driver recorded, the log does not line up
+        (wrong controller_log_base or record layout) and nothing is filled.
+        The lifetime total is left alone.
+        """
+        self.log_backfill_thread = None
+        if records is None:
+            logging.warning("Controller log backfill interrupted - retrying in an hour")
+            self.log_backfill_retry_at = time() + 3600
+            return False
+        self.log_backfill_pending = False
+
+        missing = self._missing_log_days(live_day)
+        known = {day.get('date'): day for day in self.state['history']}
+        entries = []
+        compared = matched = 0
+        for index, words in sorted(records.items()):
+            entry = decode_log_record(words, self.v_pu, self.i_pu)
+            if entry is None:
+                continue
+            date = (live_day - timedelta(days=index + 1)).isoformat()
+            recorded = known.get(date)
+            if recorded is not None and recorded.get('yield', 0.0) >= 0.1:
+                compared += 1
+                matched += abs(entry['yield'] - recorded['yield']) <= max(0.05, 0.1 * recorded['yield'])
+            elif index in missing:
+                entries.append(dict(entry, date=date))
+
+        if matched * 2 < compared:
+            logging.warning(f"Controller log does not line up with the history ({matched}/{compared} days match) "
+                            f"- check controller_log_base, nothing backfilled")
+            return False
+        if not entries:
+            logging.info("Controller log backfill: no records for the missing days")
+            return False
+
+        history = self.state['history']
+        for entry in entries:
+            history.append(entry)
+            self._fold_into_rollups(entry, publish=False)
+            if self.timeseries is not None:
+                self.timeseries.add_day(entry, replace=False)
+        history.sort(key=lambda day: day.get('date', ''), reverse=True)
+        del history[30:]
+        self._publish_rollups()
+        self._publish_hourly_profile()
+        self._mark_history_dirty()
+        self._request_save("controller log backfill")
+        logging.info(f"Backfilled {len(entries)} days from the controller log: "
+                     f"{', '.join(sorted(entry['date'] for entry in entries))}")
+        return False
+
+    def _mark_history_dirty(self):
+        """Request republishing of history days 1-30 (after rollover or an edit of state['history'])"""
+        self.history_dirty = True
+        self._mark_state_dirty('history')
+
     def _update_historical_days(self):
-        """Update D-Bus paths for days 1-29 from state file (create paths dynamically)"""
+        """
+        Publish D-Bus paths for days 1-30 from state file (create paths dynamically)
+        Event-driven: called at startup and when history_dirty is set, never on ordinary polls
+        """
         try:
             history = self.state.get('history', [])
 
@@ -665,31 +2066,16 @@ class TriStarDriver:
                 # Create D-Bus paths for this day if not already created
                 if day_index not in self.history_days_created:
                     logging.info(f"Creating D-Bus paths for history day {day_index}")
-                    self.dbus.add_path(f'/History/Daily/{day_index}/Yield', None, gettextcallback=lambda p, v: f"{v}kWh")
-                    self.dbus.add_path(f'/History/Daily/{day_index}/MaxPower', None, gettextcallback=lambda p, v: f"{v}W")
-                    self.dbus.add_path(f'/History/Daily/{day_index}/MaxPvVoltage', None, gettextcallback=lambda p, v: f"{v}V")
-                    self.dbus.add_path(f'/History/Daily/{day_index}/MaxBatteryVoltage', None, gettextcallback=lambda p, v: f"{v}V")
-                    self.dbus.add_path(f'/History/Daily/{day_index}/MinBatteryVoltage', None, gettextcallback=lambda p, v: f"{v}V")
-                    self.dbus.add_path(f'/History/Daily/{day_index}/MaxBatteryCurrent', None, gettextcallback=lambda p, v: f"{v}A")
-                    self.dbus.add_path(f'/History/Daily/{day_index}/TimeInBulk', None)
-                    self.dbus.add_path(f'/History/Daily/{day_index}/TimeInAbsorption', None)
-                    self.dbus.add_path(f'/History/Daily/{day_index}/TimeInFloat', None)
-                    self.dbus.add_path(f'/History/Daily/{day_index}/TimeInEqualize', None)
+                    register_dbus_paths(self.dbus, history_day_paths(day_index))
                     self.history_days_created.add(day_index)
 
                 # Update values from history data
                 day_data = history[history_index]
+                for name, key, unit, default in HISTORY_DAY_FIELDS:
+                    self.dbus[f'/History/Daily/{day_index}/{name}'] = day_data.get(key, default)
 
-                self.dbus[f'/History/Daily/{day_index}/Yield'] = day_data.get('yield', 0.0)
-                self.dbus[f'/History/Daily/{day_index}/MaxPower'] = day_data.get('max_power', 0)
-                self.dbus[f'/History/Daily/{day_index}/MaxPvVoltage'] = day_data.get('max_pv_voltage', 0.0)
-                self.dbus[f'/History/Daily/{day_index}/MaxBatteryVoltage'] = day_data.get('max_battery_voltage', 0.0)
-                self.dbus[f'/History/Daily/{day_index}/MinBatteryVoltage'] = day_data.get('min_battery_voltage', 0.0)
-                self.dbus[f'/History/Daily/{day_index}/MaxBatteryCurrent'] = day_data.get('max_battery_current', 0.0)
-                self.dbus[f'/History/Daily/{day_index}/TimeInBulk'] = day_data.get('time_bulk', 0)
-                self.dbus[f'/History/Daily/{day_index}/TimeInAbsorption'] = day_data.get('time_absorption', 0)
-                self.dbus[f'/History/Daily/{day_index}/TimeInFloat'] = day_data.get('time_float', 0)
-                self.dbus[f'/History/Daily/{day_index}/TimeInEqualize'] = day_data.get('time_equalize', 0)
+            self.history_dirty = False
+            logging.debug(f"Published {min(len(history), 30)} history days to D-Bus")
 
         except Exception as e:
             logging.error(f"Error updating historical days: {e}", exc_info=True)
@@ -722,7 +2108,10 @@ class TriStarDriver:
                     "time_bulk": int(self.t_bulk_ms / (1000 * 60)),
                     "time_absorption": self.state['today']['time_absorption'],
                     "time_float": self.state['today']['time_float'],
-                    "time_equalize": self.state['today']['time_equalize']
+                    "time_equalize": self.state['today']['time_equalize'],
+                    "override_seconds": round(self.state['today']['override_seconds'], 1),
+                    "fault_count": self.state['today']['fault_count'],
+                    "hourly_wh": [round(wh, 1) for wh in self.state['today']['hourly_wh']]
                 }
 
                 # Add yesterday's production to total
@@ -731,6 +2120,9 @@ class TriStarDriver:
 
                 # Insert yesterday at position 0, shifting everything
                 self.state['history'].insert(0, yesterday_snapshot)
+                if self.timeseries is not None:
+                    self.timeseries.add_day(yesterday_snapshot)  # Kept beyond 30 days on disk
+                self._fold_into_rollups(yesterday_snapshot)
 
                 # Keep only 30 days of history (day 0 = today, days 1-30 = history)
                 if len(self.state['history']) > 30:
@@ -740,6 +2132,8 @@ class TriStarDriver:
                 # Update current date
                 self.last_reset_date = current_date
                 self.state['current_date'] = current_date
+                if self.archive is not None:
+                    self.archive.rotate(current_date)
 
                 # Reset daily trackers for new day (both memory and state)
                 self.daily_max_battery_current = 0.0
@@ -760,8 +2154,12 @@ class TriStarDriver:
                     "time_bulk": 0,
                     "time_absorption": 0,
                     "time_float": 0,
-                    "time_equalize": 0
+                    "time_equalize": 0,
+                    "override_seconds": 0.0,
+                    "fault_count": 0,
+                    "hourly_wh": [0.0] * 24
                 }
+                self._publish_hourly_profile()
 
                 # Reset register flag (expect register to reset when sun comes up)
                 self.daily_register_has_reset = False
@@ -789,11 +2187,11 @@ class TriStarDriver:
                 self.state['time_float_offset'] = 0
                 self.state['time_eq_offset'] = 0
 
-                # Save state to file
-                self._save_state()
+                # Save state to file (full snapshot - history rotated, written at end of this cycle)
+                self._request_save("midnight rollover")
 
-                # Update D-Bus paths immediately for days 1-29 (show rotated history in UI)
-                self._update_historical_days()
+                # Republish days 1-30 (rotated history) in this update cycle
+                self._mark_history_dirty()
 
                 logging.info(f"History rotated. Now have {len(self.state['history'])} days of history")
 
@@ -801,197 +2199,12 @@ class TriStarDriver:
             logging.error(f"Error in midnight rollover: {e}")
 
     def _setup_dbus_paths(self):
-        """Setup all D-Bus paths"""
-        s = self.dbus
-
-        # Management
-        s.add_path('/Mgmt/ProcessName', __file__)
-        s.add_path('/Mgmt/ProcessVersion', VERSION)
-        s.add_path('/Mgmt/Connection', 'Modbus TCP')
-
-        # Device info
-        s.add_path('/ProductId', PRODUCT_ID)
-        s.add_path('/ProductName', '')
-        s.add_path('/FirmwareVersion', 0)
-        s.add_path('/HardwareVersion', '')
-        s.add_path('/Serial', '')
-        s.add_path('/DeviceInstance', int(self.settings['device_instance']))
-        s.add_path('/Connected', 0)
-        s.add_path('/Mode', 1, writeable=True, onchangecallback=self._on_mode_change)  # 1=On, 4=Off
-        s.add_path('/ErrorCode', 0)
-
-        # Number of trackers (TriStar MPPT 60 is single-tracker)
-        s.add_path('/NrOfTrackers', 1)
-
-        # PV array
-        s.add_path('/Pv/V', 0.0, gettextcallback=lambda p, v: f"{v}V")
-        # Note: /Pv/I is deprecated since v2.80 - GUI calculates current from /Yield/Power / /Pv/V
-
-        # Battery
-        s.add_path('/Dc/0/Voltage', 0.0, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Dc/0/Current', 0.0, gettextcallback=lambda p, v: f"{v}A")
-        s.add_path('/Dc/0/Temperature', 0.0)
-
-        # Power and state
-        s.add_path('/Yield/Power', 0, gettextcallback=lambda p, v: f"{v}W")
-        s.add_path('/State', 0)
-        s.add_path('/MppOperationMode', 0)  # 0=Off, 1=Voltage/Current limited, 2=MPPT active
-
-        # History
-        s.add_path('/History/Overall/DaysAvailable', 1)
-
-        # History - Overall (lifetime) - Values updated from state in update loop
-        s.add_path('/History/Overall/MaxPvVoltage', 0.0, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Overall/MaxBatteryVoltage', 0.0, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Overall/MinBatteryVoltage', 0.0, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Overall/LastError1', 0)  # Error history not yet implemented
-        s.add_path('/History/Overall/LastError2', 0)
-        s.add_path('/History/Overall/LastError3', 0)
-        s.add_path('/History/Overall/LastError4', 0)
-
-        # History - Day 0 (today, live values) - always created
-        s.add_path('/History/Daily/0/Yield', 0.0, gettextcallback=lambda p, v: f"{v}kWh")
-        s.add_path('/History/Daily/0/MaxPower', 0, gettextcallback=lambda p, v: f"{v}W")
-        s.add_path('/History/Daily/0/MaxPvVoltage', 0.0, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Daily/0/MaxBatteryVoltage', 0.0, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Daily/0/MinBatteryVoltage', 0.0, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Daily/0/MaxBatteryCurrent', 0.0, gettextcallback=lambda p, v: f"{v}A")
-        s.add_path('/History/Daily/0/TimeInBulk', 0)
-        s.add_path('/History/Daily/0/TimeInAbsorption', 0)
-        s.add_path('/History/Daily/0/TimeInFloat', 0)
-        s.add_path('/History/Daily/0/TimeInEqualize', 0)
-
-        # History - Days 1-29 will be created dynamically as history accumulates
-        # This prevents Venus OS from thinking we have 31 days of data when we don't
-
-        # Total yield
-        s.add_path('/Yield/User', 0.0, gettextcallback=lambda p, v: f"{v}kWh")
-        s.add_path('/Yield/System', 0.0, gettextcallback=lambda p, v: f"{v}kWh")
-
-        # Control (coils) - writable
-        s.add_path('/Control/EqualizeTriggered', 0, writeable=True, onchangecallback=self._on_coil_write)
-        s.add_path('/Control/ChargerDisconnect', 0, writeable=True, onchangecallback=self._on_coil_write)
-        s.add_path('/Control/ResetController', 0, writeable=True, onchangecallback=self._on_coil_write)
-        s.add_path('/Control/ResetCommServer', 0, writeable=True, onchangecallback=self._on_coil_write)
-
-        # Voltage override control - writable (non-persistent, starts at 0)
-        s.add_path('/Control/VoltageOverride', 0.0, writeable=True, onchangecallback=self._on_voltage_override_write, gettextcallback=lambda p, v: f"{v}V")
-
-        # Statistics for diagnostics and health monitoring
-        s.add_path('/Custom/Stats/SuccessfulReads', 0, writeable=False)
-        s.add_path('/Custom/Stats/FailedReads', 0, writeable=False)
-        s.add_path('/Custom/Stats/ConsecutiveFailures', 0, writeable=False)
-        s.add_path('/Custom/Stats/LastSuccessTime', 0, writeable=False)  # Unix timestamp
-        s.add_path('/Custom/Stats/BackoffFactor', 1, writeable=False)  # Poll interval multiplier
-
-        # TriStar-specific charge state (raw values from TriStar)
-        s.add_path('/Custom/ChargeState', None, writeable=False)  # Raw TriStar charge state (0-9)
-        s.add_path('/Custom/ChargeStateText', None, writeable=False)  # Text representation
-        s.add_path('/Custom/TargetRegulationVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")  # Target regulation voltage
-
-        # Voltage override monitoring
-        s.add_path('/Custom/VoltageOverride/ExcessPower', 0, writeable=False, gettextcallback=lambda p, v: f"{v}W")
-        s.add_path('/Custom/VoltageOverride/Active', False, writeable=False)
-        s.add_path('/Custom/VoltageOverride/TimeAtTargetVoltage', 0, writeable=False)  # Seconds at target voltage
-        s.add_path('/Custom/VoltageOverride/TailCurrentTimer', 0, writeable=False)  # Seconds
-        s.add_path('/Custom/VoltageOverride/StopReason', "", writeable=False)  # Text: TimeLimit/BatteryFull/UserDisabled
-        s.add_path('/Custom/VoltageOverride/BalanceComplete', False, writeable=False)
-        s.add_path('/Custom/VoltageOverride/LastBalanceTimestamp', '', writeable=False)
-        s.add_path('/Custom/VoltageOverride/CurrentVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/VoltageOverride/RegisterReadback', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")  # Actual value read from PDU register 89 (vb_ref_slave)
-
-        # Current override control and monitoring (PDU register 88 - Ib_ref_slave, Logical 89)
-        s.add_path('/Control/CurrentOverride', 0.0, writeable=True, onchangecallback=self._on_current_override_write, gettextcallback=lambda p, v: f"{v}A")
-        s.add_path('/Custom/CurrentOverride/Active', False, writeable=False)
-        s.add_path('/Custom/CurrentOverride/CurrentValue', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}A")
-        s.add_path('/Custom/CurrentOverride/RegisterReadback', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}A")  # Actual value read from PDU register 88 (Ib_ref_slave)
-
-        # Manual control register monitoring (registers that might interfere with slave mode)
-        s.add_path('/Custom/ManualControl/VaRefFixed', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")  # Register 91 - Array voltage fixed target
-        s.add_path('/Custom/ManualControl/VaRefFixedPct', 0, writeable=False, gettextcallback=lambda p, v: f"{v}%")  # Register 92 - Array voltage % of Voc
-
-        # Battery diagnostics
-        s.add_path('/Custom/Battery/TerminalVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/Battery/SenseVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/Battery/CurrentFast', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}A")
-        s.add_path('/Custom/Battery/VoltageSlow', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-
-        # EEPROM charge settings (configured absorption/equalize voltages and limits)
-        s.add_path('/Custom/EEPROM/AbsorptionVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/EEPROM/FloatVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/EEPROM/AbsorptionTime', 0, writeable=False, gettextcallback=lambda p, v: f"{v}s")
-        s.add_path('/Custom/EEPROM/FloatExitTime', 0, writeable=False, gettextcallback=lambda p, v: f"{v}s")
-        s.add_path('/Custom/EEPROM/EqualizeVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/EEPROM/TempCompensation', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V/C")
-        s.add_path('/Custom/EEPROM/MaxRegulationLimit', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-
-        # Charge profile management (EEPROM profile apply control and status)
-        s.add_path('/Control/ApplyChargeProfile', '', writeable=True, onchangecallback=self._on_apply_profile_requested)
-        s.add_path('/Custom/ChargeProfile/ApplyStatus', 'idle', writeable=False)
-        s.add_path('/Custom/ChargeProfile/LastApplied', '', writeable=False)
-        s.add_path('/Custom/ChargeProfile/StatusDetail', '', writeable=False)
-        s.add_path('/Custom/ChargeProfile/ProgressPercent', 0, writeable=False)
-        s.add_path('/Custom/ChargeProfile/PlannedVisitSOC', 0, writeable=False,
-                   gettextcallback=lambda _, v: f"{v}%")
-
-        # Season tracking (read-only display)
-        s.add_path('/Custom/Season/CurrentSeason', '', writeable=False)
-        s.add_path('/Custom/Season/ActiveProfile', '', writeable=False)
-
-        # EEPROM lifetime charge counters (TriStar's internal counters)
-        s.add_path('/Custom/EEPROM/ChargeKwhResetable', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}kWh")
-        s.add_path('/Custom/EEPROM/ChargeKwhTotal', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}kWh")
-
-        # Internal power supply monitoring
-        s.add_path('/Custom/InternalSupply/Rail12V', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/InternalSupply/Rail3V', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/InternalSupply/MeterBusV', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/InternalSupply/Rail1V8', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/InternalSupply/Vref', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-
-        # Temperature sensors
-        s.add_path('/Custom/Temperature/Heatsink', 0.0, writeable=False)
-        s.add_path('/Custom/Temperature/RTS', 0.0, writeable=False)
-
-        # Min/Max tracking
-        s.add_path('/Custom/MinMax/MinBatteryVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/MinMax/MaxBatteryVoltage', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-
-        # Diagnostic bitfields (raw)
-        s.add_path('/Custom/Faults/Bitfield', None, writeable=False)
-        s.add_path('/Custom/DipSwitches/Bitfield', None, writeable=False)
-        s.add_path('/Custom/Led/State', None, writeable=False)
-
-        # Fault bitfield decoded paths
-        for bit, name in FAULT_BITS.items():
-            s.add_path(f'/Custom/Faults/{name}', None, writeable=False)
-
-        # DIP switch bitfield decoded paths (8 switches)
-        for i in range(8):
-            s.add_path(f'/Custom/DipSwitches/Switch{i+1}', None, writeable=False)
-
-        # PV/MPPT data
-        s.add_path('/Custom/Pv/PowerInputShadow', 0, writeable=False, gettextcallback=lambda p, v: f"{v}W")
-        s.add_path('/Custom/MPPT/LastSweep/Pmax', 0, writeable=False, gettextcallback=lambda p, v: f"{v}W")
-        s.add_path('/Custom/MPPT/LastSweep/Vmp', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Custom/MPPT/LastSweep/Voc', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}V")
-
-        # Daily history
-        s.add_path('/Custom/Daily/ChargeAh', 0.0, writeable=False, gettextcallback=lambda p, v: f"{v}Ah")
-        s.add_path('/Custom/Daily/ChargeWh', 0, writeable=False, gettextcallback=lambda p, v: f"{v}Wh")  # Raw Modbus REG_WHC_DAILY
-        s.add_path('/Custom/Daily/FlagsBitfield', None, writeable=False)
-        s.add_path('/Custom/Daily/MinBatteryTemperature', 0.0, writeable=False)
-        s.add_path('/Custom/Daily/MaxBatteryTemperature', 0.0, writeable=False)
-        s.add_path('/Custom/Daily/FaultsBitfield', None, writeable=False)
-        s.add_path('/Custom/Daily/TimeInEqualize', 0, writeable=False, gettextcallback=lambda p, v: f"{v}min")
-
-        # Daily flags bitfield decoded paths
-        for bit, name in FLAGS_DAILY_BITS.items():
-            s.add_path(f'/Custom/Daily/Flags/{name}', None, writeable=False)
-
-        # Daily faults bitfield decoded paths (same as FAULT_BITS)
-        for bit, name in FAULT_BITS.items():
-            s.add_path(f'/Custom/Daily/Faults/{name}', None, writeable=False)
+        """Register all D-Bus paths from the DBUS_PATHS schema table (tristar_schema.py)"""
+        register_dbus_paths(self.dbus, DBUS_PATHS, owner=self, initial={
+            '/Mgmt/ProcessName': __file__,
+            '/Mgmt/ProcessVersion': VERSION,
+            '/DeviceInstance': int(self.settings['device_instance']),
+        })
 
     def _start_timer(self):
         """Start or restart the periodic update timer (with exponential backoff support)"""
@@ -1260,6 +2473,7 @@ class TriStarDriver:
         ip = self.settings['ip_address']
         port = self.settings['modbus_port']
         slave_id = self.settings['slave_id']
+        started = time_module.monotonic()
 
         for attempt in range(5):
             # Create new client for each attempt (like C++)
@@ -1279,6 +2493,7 @@ class TriStarDriver:
                         continue
                     else:
                         logging.error(f"Failed to connect to {ip}:{port} after 5 retries")
+                        self.metrics.read_failed(attempt + 1)
                         return None
 
                 # Read
@@ -1297,11 +2512,13 @@ class TriStarDriver:
                     else:
                         logging.error("Modbus error after 5 retries")
                         client.close()
+                        self.metrics.read_failed(attempt + 1)
                         return None
 
                 # Success - close and return
                 registers = result.registers
                 client.close()
+                self.metrics.observe_read(time_module.monotonic() - started, attempt + 1, count)
                 return registers
 
             except Exception as e:
@@ -1316,6 +2533,7 @@ class TriStarDriver:
                     pass
 
                 if attempt == 4:
+                    self.metrics.read_failed(attempt + 1)
                     return None
 
         return None
@@ -1696,6 +2914,10 @@ class TriStarDriver:
         }
         self.product_name = model_map.get(regs[0], "TriStar MPPT")
 
+        # Plausibility limits follow the detected system voltage and model rating
+        self.validator.configure(self.system_voltage_scale,
+                                 MODEL_RATINGS.get(self.product_name, DEFAULT_MODEL_RATING))
+
         # Serial number
         regs = self.read_input_registers(REG_ESERIAL, 4)
         if regs is None:
@@ -1718,15 +2940,108 @@ class TriStarDriver:
         logging.info(f"  Serial: {self.serial_number}")
         logging.info(f"  HW: v{self.hardware_version}, FW: {self.firmware_version}")
 
-        # Read EEPROM values at startup (charge settings + lifetime kWh)
-        self._read_eeprom_charge_settings()
-        self._read_eeprom_lifetime_kwh()
+        # EEPROM values at startup (charge settings + lifetime kWh): from the shadow of this
+        # controller if there is one (checked in the background later), otherwise read now
+        shadow = self.eeprom_shadow.get(self.serial_number)
+        if shadow and len(shadow.get('regs', ())) == EEPROM_SETTINGS_COUNT:
+            self._publish_eeprom_charge_settings(shadow['regs'])
+            if len(shadow.get('kwh', ())) == 2:
+                self._publish_eeprom_kwh(shadow['kwh'])
+            logging.info(f"EEPROM values from shadow (read {int(time() - shadow['read_at'])}s ago)")
+            self.eeprom_revalidate_at = time() + CONFIG['eeprom_shadow_check_delay_sec']
+        else:
+            if not self._read_eeprom_charge_settings():
+                # Retried by the background revalidation (no shadow to fall back on)
+                self.eeprom_revalidate_at = time() + 600
+            self._read_eeprom_lifetime_kwh()
 
         self.initialized = True
         return True
 
     def update(self):
-        """Periodic update - read values and publish to D-Bus"""
+        """Periodic update - one poll cycle, all D-Bus changes emitted as one batch"""
+        started = time_module.monotonic()
+        with self.dbus.batch():
+            result = self._poll_cycle()
+        self._publish_telemetry(time_module.monotonic() - started)
+        return result
+
+    def _publish_telemetry(self, cycle_seconds):
+        """Hand cycle time, state gauges and the latest snapshot to metrics, MQTT and SSE clients"""
+        gauges = {
+            'connected': self.dbus['/Connected'] or 0,
+            'consecutive_failures': self.consecutive_failures,
+            'backoff_factor': self.backoff_factor,
+            'voltage_override_active': int(self.voltage_override_active),
+            'current_override_active': int(self.current_override_active),
+            'voltage_override_time_at_target_seconds': int(self.time_above_target_accumulated),
+            'profile_apply_in_progress': int(self.profile_apply_in_progress),
+            'rejected_readings': dict(self.validator.rejected),
+        }
+        if self.timeseries is not None:
+            gauges['history_db_bytes'] = self.timeseries.db_bytes
+        snapshot = {
+            'timestamp': self.last_successful_read,
+            'connected': bool(gauges['connected']),
+            'product': self.product_name,
+            'serial': self.serial_number,
+            'values': self.last_decoded,
+            'voltage_override': {'active': self.voltage_override_active, 'stop_reason': self.stop_reason},
+            'current_override': {'active': self.current_override_active},
+        }
+        snapshot_json = json.dumps(snapshot, separators=(',', ':')).encode()  # Encoded once for all consumers
+        self.metrics.observe_cycle(cycle_seconds, gauges, snapshot_json)
+        if self.mqtt is not None:
+            self.mqtt.publish_cycle(snapshot, snapshot_json)
+        if self.events is not None:
+            self.events.publish(snapshot, snapshot_json)
+
+    def _query_history(self, from_date, to_date, fields):
+        """GetHistory backend: days table of history.db, completed by state history not yet on disk"""
+        fields = tuple(fields) or tristar_history.DAY_FIELDS
+        rows = {}
+        if self.timeseries is not None:
+            try:
+                if self.history_db is None:
+                    self.history_db = tristar_history.connect(HISTORY_DB_FILE, readonly=True)
+                fields, found = tristar_history.query_days(self.history_db, from_date, to_date, fields,
+                                                           limit=HISTORY_QUERY_MAX_DAYS)
+                rows.update(found)
+            except tristar_history.sqlite3.Error as e:
+                logging.warning(f"History query failed, using state history only: {e}")
+                self.history_db = None
+        unknown = [name for name in fields if name not in tristar_history.DAY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown history fields: {', '.join(unknown)}")
+        for entry in self.state['history']:
+            date = entry.get('date') or ''
+            if date not in rows and (from_date or '') <= date <= (to_date or '9999-99-99'):
+                rows[date] = [entry.get(name) for name in fields]
+        dates = sorted(rows)[:HISTORY_QUERY_MAX_DAYS]
+        return fields, [(date, rows[date]) for date in dates]
+
+    def _on_mqtt_command(self, path, value):
+        """
+        MQTT control command (main loop) - same callback and semantics as a D-Bus write
+
+        The payload text is converted to the type of the path's initial value
+        first (float for the overrides, str for ApplyChargeProfile), so the
+        D-Bus path keeps its type; unparseable payloads are rejected.
+        """
+        entry = next(entry for entry in DBUS_PATHS if entry.path == path)
+        try:
+            value = type(entry.initial)(value)
+            if isinstance(value, float) and not math.isfinite(value):
+                raise ValueError("not a finite number")
+        except ValueError as e:
+            logging.warning(f"MQTT command for {path} rejected: {value!r} ({e})")
+            return False
+        if getattr(self, entry.onchange)(path, value):
+            self.dbus[path] = value
+        return False  # One-shot GLib idle callback
+
+    def _poll_cycle(self):
+        """Read values and publish to D-Bus"""
         # Only log if update is delayed (> 10 sec since last update)
         current_time = time_module.time()
         if hasattr(self, 'last_update_time'):
@@ -1792,6 +3107,7 @@ class TriStarDriver:
             # Reset consecutive failures and backoff if recovered
             if self.consecutive_failures > 0:
                 logging.info(f"Connection recovered after {self.consecutive_failures} failures")
+                self.log_backfill_pending = bool(CONFIG['controller_log_base'])
                 self.consecutive_failures = 0
                 self.dbus['/Custom/Stats/ConsecutiveFailures'] = 0
 
@@ -1805,8 +3121,12 @@ class TriStarDriver:
             def reg(addr):
                 return regs[addr - REG_V_BAT]
 
+            self.snapshots.append(regs, reg(REG_CHARGE_STATE))
+
             # Calculate time delta for bulk charge tracking
             now = time()
+            if self.archive is not None:
+                self.archive.append(now, regs)
             dt_ms = (now - self.last_update) * 1000
             self.last_update = now
 
@@ -1814,34 +3134,30 @@ class TriStarDriver:
             # TriStar uses 16-bit signed registers with per-unit scaling:
             #   - Voltage/Current: register_value × PU / 2^15 (32768)
             #   - Power: (V × I) uses 2^17 scaling (131072)
-            v_bat = reg(REG_V_BAT) * self.v_pu / 32768.0
-            i_cc = max(0.0, self._to_signed(reg(REG_I_CC_1M)) * self.i_pu / 32768.0)
-            v_pv = reg(REG_V_PV) * self.v_pu / 32768.0
-            i_pv = reg(REG_I_PV) * self.i_pu / 32768.0
-            p_out = reg(REG_POUT) * self.i_pu * self.v_pu / 131072.0  # 2^17 for power (V×I product)
-            v_target = reg(REG_V_TARGET) * self.v_pu / 32768.0
-
-            # Sanity checks on critical values (protect against Modbus corruption over WAN)
-            # LiFePO4 7S nominal: 21V-29.4V, allow margin for system voltage variations
-            if not (18.0 <= v_bat <= 35.0):
-                logging.warning(f"Unrealistic battery voltage: {v_bat:.2f}V - possible Modbus corruption, skipping update")
-                # Don't update statistics on corrupt data
-                return True
-
-            # TriStar MPPT 60: max PV input 150V
-            if not (0 <= v_pv <= 160.0):
-                logging.warning(f"Unrealistic PV voltage: {v_pv:.2f}V - possible Modbus corruption, skipping update")
-                return True
-
-            # TriStar MPPT 60: max charge current 60A
-            if not (0 <= i_cc <= 70.0):
-                logging.warning(f"Unrealistic charge current: {i_cc:.2f}A - possible Modbus corruption, skipping update")
-                return True
-
-            # Max output power sanity check (60A × 35V = 2100W, allow margin)
-            if not (0 <= p_out <= 2500.0):
-                logging.warning(f"Unrealistic output power: {p_out:.0f}W - possible Modbus corruption, skipping update")
-                return True
+            decoded = decode_fields(regs, REG_V_BAT, self.v_pu, self.i_pu)
+            decoded['i_cc'] = max(0.0, decoded['i_cc'])
+
+            # Per-field sanity checks (protect against Modbus corruption over WAN)
+            # Invalid fields are published as None; the rest of the snapshot is still used
+            for name in self.validator.validate(decoded, now):
+                self.dbus[f'/Custom/Stats/Rejected/{VALIDATED_FIELDS[name]}'] = self.validator.rejected[name]
+
+            if self.snapshot_writer is not None:
+                self.snapshot_writer.publish(now, decoded)
+            if self.sample_ring is not None:
+                self.sample_ring.append(now, decoded)
+            if self.timeseries is not None:
+                # Override bits describe the conditions this sample was measured under
+                override = (tristar_history.OVERRIDE_VOLTAGE * self.voltage_override_active
+                            | tristar_history.OVERRIDE_CURRENT * self.current_override_active)
+                self.timeseries.add(now, self.utc_offset, decoded, decoded['charge_state'], override)
+            self.last_decoded = decoded
+
+            v_bat = decoded['v_bat']
+            i_cc = decoded['i_cc']
+            v_pv = decoded['v_pv']
+            p_out = decoded['p_out']
+            v_target = decoded['v_target']
 
             # Charge state
             cs_raw = reg(REG_CHARGE_STATE)
@@ -1851,13 +3167,17 @@ class TriStarDriver:
             if cs_raw == CS_BULK:
                 self.t_bulk_ms += dt_ms
 
+            # Override activity of the day (folded into the month/year rollups at midnight)
+            if self.voltage_override_active or self.current_override_active:
+                self.state['today']['override_seconds'] += dt_ms / 1000
+
             # Update D-Bus
-            self.dbus['/Pv/V'] = round(v_pv, 2)
+            self.dbus['/Pv/V'] = round(v_pv, 2) if v_pv is not None else None
             # /Pv/I removed - deprecated since v2.80, GUI calculates from Power/Voltage
-            self.dbus['/Dc/0/Voltage'] = round(v_bat, 2)
-            self.dbus['/Dc/0/Current'] = round(i_cc, 2)
+            self.dbus['/Dc/0/Voltage'] = round(v_bat, 2) if v_bat is not None else None
+            self.dbus['/Dc/0/Current'] = round(i_cc, 2) if i_cc is not None else None
             self.dbus['/Dc/0/Temperature'] = round(self._to_signed(reg(REG_T_BAT)), 1)
-            self.dbus['/Yield/Power'] = round(p_out, 0)
+            self.dbus['/Yield/Power'] = round(p_out, 0) if p_out is not None else None
             self.dbus['/State'] = cs
             # MppOperationMode: 0=Off, 1=V/I limited, 2=MPPT active
             if cs == 0 or cs == 2:
@@ -1901,21 +3221,15 @@ class TriStarDriver:
             self.dbus['/Custom/MinMax/MinBatteryVoltage'] = round(reg(REG_V_BAT_MIN_ALL) * self.v_pu / 32768.0, 2)
             self.dbus['/Custom/MinMax/MaxBatteryVoltage'] = round(reg(REG_V_BAT_MAX_ALL) * self.v_pu / 32768.0, 2)
 
-            # Diagnostic bitfields (raw)
-            faults = reg(REG_FAULTS)
-            dip_switches = reg(REG_DIP_SWITCHES)
-            led_state = reg(REG_LED_STATE)
-            self.dbus['/Custom/Faults/Bitfield'] = faults
-            self.dbus['/Custom/DipSwitches/Bitfield'] = dip_switches
-            self.dbus['/Custom/Led/State'] = led_state
-
-            # Decode fault bitfield
-            for bit, name in FAULT_BITS.items():
-                self.dbus[f'/Custom/Faults/{name}'] = bool(faults & (1 << bit))
-
-            # Decode DIP switches bitfield (8 switches)
-            for i in range(8):
-                self.dbus[f'/Custom/DipSwitches/Switch{i+1}'] = bool(dip_switches & (1 << i))
+            # Diagnostic bitfields: faults, DIP switches, daily flags, daily faults
+            # (raw word + decoded bits, only changed bits are written; transitions are logged)
+            self.dbus['/Custom/Led/State'] = reg(REG_LED_STATE)
+            for address, publisher in self.bitfield_publishers:
+                raw = reg(address)
+                changed, set_bits, cleared_bits = publisher.update(self.dbus, raw)
+                self.state['bitfields'][publisher.name] = raw  # Baseline for transitions across restarts
+                if changed:
+                    self._record_fault_event(publisher.name, changed, set_bits, cleared_bits)
 
             # PV/MPPT data
             self.dbus['/Custom/Pv/PowerInputShadow'] = round(reg(REG_P_IN_SHADOW) * self.i_pu * self.v_pu / 131072.0, 0)
@@ -1925,35 +3239,30 @@ class TriStarDriver:
 
             # Daily history
             self.dbus['/Custom/Daily/ChargeAh'] = round(reg(REG_AHC_DAILY) * 0.1, 2)  # Spec: units of 0.1 Ah
-            flags_daily = reg(REG_FLAGS_DAILY)
-            faults_daily = reg(REG_FAULTS_DAILY)
-            self.dbus['/Custom/Daily/FlagsBitfield'] = flags_daily
             self.dbus['/Custom/Daily/MinBatteryTemperature'] = round(self._to_signed(reg(REG_T_BAT_MIN_DAILY)), 1)
             self.dbus['/Custom/Daily/MaxBatteryTemperature'] = round(self._to_signed(reg(REG_T_BAT_MAX_DAILY)), 1)
-            self.dbus['/Custom/Daily/FaultsBitfield'] = faults_daily
             self.dbus['/Custom/Daily/TimeInEqualize'] = reg(REG_T_EQ_DAILY) // 60  # Convert seconds to minutes
 
-            # Decode daily flags bitfield
-            for bit, name in FLAGS_DAILY_BITS.items():
-                self.dbus[f'/Custom/Daily/Flags/{name}'] = bool(flags_daily & (1 << bit))
-
-            # Decode daily faults bitfield (same as FAULT_BITS)
-            for bit, name in FAULT_BITS.items():
-                self.dbus[f'/Custom/Daily/Faults/{name}'] = bool(faults_daily & (1 << bit))
-
             # Track daily max/min values (for our own tracking, not from Modbus)
-            self.daily_max_battery_current = max(self.daily_max_battery_current, i_cc)
-            self.daily_max_power = max(self.daily_max_power, p_out)
-            self.daily_max_battery_voltage = max(self.daily_max_battery_voltage, v_bat)
-            if v_bat > 0:  # Only update min if we have a valid reading
-                self.daily_min_battery_voltage = min(self.daily_min_battery_voltage, v_bat)
-            self.daily_max_pv_voltage = max(self.daily_max_pv_voltage, v_pv)
+            # Fields rejected by the validator this cycle are skipped
+            if i_cc is not None:
+                self.daily_max_battery_current = max(self.daily_max_battery_current, i_cc)
+            if p_out is not None:
+                self.daily_max_power = max(self.daily_max_power, p_out)
+            if v_bat is not None:
+                self.daily_max_battery_voltage = max(self.daily_max_battery_voltage, v_bat)
+                if v_bat > 0:  # Only update min if we have a valid reading
+                    self.daily_min_battery_voltage = min(self.daily_min_battery_voltage, v_bat)
+            if v_pv is not None:
+                self.daily_max_pv_voltage = max(self.daily_max_pv_voltage, v_pv)
 
             # Update lifetime max/min from current values (saved once per day at midnight)
-            self.state['lifetime']['max_pv_voltage'] = max(self.state['lifetime']['max_pv_voltage'], v_pv)
-            self.state['lifetime']['max_battery_voltage'] = max(self.state['lifetime']['max_battery_voltage'], v_bat)
-            if v_bat > 0:
-                self.state['lifetime']['min_battery_voltage'] = min(self.state['lifetime']['min_battery_voltage'], v_bat)
+            if v_pv is not None:
+                self.state['lifetime']['max_pv_voltage'] = max(self.state['lifetime']['max_pv_voltage'], v_pv)
+            if v_bat is not None:
+                self.state['lifetime']['max_battery_voltage'] = max(self.state['lifetime']['max_battery_voltage'], v_bat)
+                if v_bat > 0:
+                    self.state['lifetime']['min_battery_voltage'] = min(self.state['lifetime']['min_battery_voltage'], v_bat)
 
             # Also update lifetime AND today based on TriStar's min/max (when data is valid)
             # TriStar tracks continuously, so it may have seen values we missed
@@ -2103,6 +3412,10 @@ class TriStarDriver:
                 self.state['today']['time_float'] = self.time_float_offset + reg(REG_T_FLOAT) // 60
                 self.state['today']['time_equalize'] = self.time_eq_offset + reg(REG_T_EQ_DAILY) // 60
             self.state['today']['time_bulk'] = int(self.t_bulk_ms / (1000 * 60))  # Convert ms to minutes
+            self._update_hourly_yield(daily_kwh, now)
+            if (self.log_backfill_pending and cs_raw == CS_NIGHT and self.log_backfill_thread is None
+                    and now >= self.log_backfill_retry_at and not self.profile_apply_in_progress):
+                self._start_log_backfill()
 
             # History - Day 0 (today, live values)
             self.dbus['/History/Daily/0/Yield'] = round(daily_kwh, 2)
@@ -2150,8 +3463,9 @@ class TriStarDriver:
             self.dbus['/History/Daily/0/MaxBatteryCurrent'] = round(self.daily_max_battery_current, 2)
             self.dbus['/History/Daily/0/TimeInBulk'] = int(self.t_bulk_ms / (1000 * 60))
 
-            # Update historical days 1-29 from state file
-            self._update_historical_days()
+            # Republish historical days 1-30 only if history changed (rollover/edit)
+            if self.history_dirty:
+                self._update_historical_days()
 
             # Update Overall (lifetime) values
             self.dbus['/History/Overall/MaxPvVoltage'] = round(self.state['lifetime']['max_pv_voltage'], 2)
@@ -2159,39 +3473,50 @@ class TriStarDriver:
             min_batt = self.state['lifetime']['min_battery_voltage']
             self.dbus['/History/Overall/MinBatteryVoltage'] = round(min_batt, 2) if min_batt < 999 else 0.0
 
-            # Periodic state save (every 5 minutes to preserve today's values across restarts)
+            # State save every cycle (journal delta of changed fields only - nothing is written
+            # if nothing meaningful changed), compacted into a full state.bin snapshot every
+            # state_save_interval (5 minutes, only if something changed) or when requested
+            # (coalesced requests, always written)
+            self.state['voltage_override']['stop_reason'] = self.stop_reason
             current_time = time()
-            if current_time - self.last_state_save_time >= self.state_save_interval:
-                logging.info(f"Periodic state save (5 min interval) - preserving today's values")
-                # Update voltage override state before saving
-                self.state['voltage_override']['stop_reason'] = self.stop_reason
-                self._save_state()
+            if self.save_requests:
+                reasons, self.save_requests = self.save_requests, []
+                logging.info(f"State compaction ({', '.join(reasons)})")
+                self._save_state(compact=True)
+                self.last_state_save_time = current_time
+            elif current_time - self.last_state_save_time >= self.state_save_interval:
+                logging.debug("State compaction (interval, skipped if nothing changed)")
+                self._save_state(compact=True, force=False)
                 self.last_state_save_time = current_time
+            else:
+                self._save_state()
 
             # ========================================================================
             # VOLTAGE OVERRIDE CONTROL LOGIC
             # ========================================================================
 
             # Calculate excess power (sweep_Pin_max - threshold - P_out)
-            sweep_pmax = reg(REG_SWEEP_PMAX) * self.i_pu * self.v_pu / 131072.0  # Watts
-            p_out = reg(REG_POUT) * self.i_pu * self.v_pu / 131072.0  # Watts
+            sweep_pmax = decoded['sweep_pmax']  # Watts
             excess_power_threshold = self.settings['excess_power_threshold']
-            excess_power = sweep_pmax - excess_power_threshold - p_out
-            self.dbus['/Custom/VoltageOverride/ExcessPower'] = round(excess_power, 0)
+            excess_power = sweep_pmax - excess_power_threshold - p_out if p_out is not None else None
+            self.dbus['/Custom/VoltageOverride/ExcessPower'] = round(excess_power, 0) if excess_power is not None else None
 
             # Get safety limits from settings
             max_time = self.settings['max_voltage_override_time']
             battery_full_current = self.settings['battery_full_current']
             tail_current_time = self.settings['tail_current_time']
 
-            # Get current battery measurements
-            i_charge = self._to_signed(reg(REG_I_CC_1M)) * self.i_pu / 32768.0  # Amps (filtered, 1-min avg)
-            v_battery = reg(REG_V_BAT) * self.v_pu / 32768.0  # Volts
+            # Get current battery measurements (validated)
+            i_charge = i_cc  # Amps (filtered, 1-min avg)
+            v_battery = v_bat  # Volts
 
             current_time = time()
 
             # Check if override is active
-            if self.pending_voltage_override is not None:
+            if self.pending_voltage_override is not None and None in (v_battery, i_charge, excess_power):
+                # Don't advance or reset override timers on a rejected reading - keep state until next cycle
+                logging.debug("Voltage override checks skipped this cycle: battery voltage/current/power invalid")
+            elif self.pending_voltage_override is not None:
                 self.voltage_override_active = True
 
                 # Get target voltage for safety checks
@@ -2372,12 +3697,13 @@ class TriStarDriver:
 
             # Total yield (use persistent counter to avoid double-counting)
             # Do NOT auto-initialize from TriStar registers (they may be reset or have wrong baseline)
-            # User must manually set total_yield_kwh in state.json to desired starting value
+            # User must manually set total_yield_kwh in the state to desired starting value
             if self.state['total_yield_kwh'] == 0.0:
-                logging.warning("total_yield_kwh is 0! Please manually set it in state.json to your desired baseline.")
+                logging.warning("total_yield_kwh is 0! Please manually set it in the state to your desired baseline.")
                 logging.warning(f"  REG_KWH_TOTAL_RES (resettable) = {reg(REG_KWH_TOTAL_RES)} kWh")
                 logging.warning(f"  REG_KWH_TOTAL (permanent) = {reg(REG_KWH_TOTAL)} kWh")
-                logging.warning("  Edit /data/dbus-tristar/state.json and set 'total_yield_kwh' to correct value.")
+                logging.warning("  Stop the driver, run tristar_storage.py dump > /data/dbus-tristar/state.json,")
+                logging.warning("  set 'total_yield_kwh' to correct value and start the driver (state.json is imported).")
 
             # Total yield: persistent total + today's calculated yield (already handled above)
             new_yield_system = round(self.state['total_yield_kwh'] + daily_kwh, 2)
@@ -2391,6 +3717,10 @@ class TriStarDriver:
                     logging.warning(f"  total_yield_kwh={self.state['total_yield_kwh']:.3f}, daily_kwh={daily_kwh:.3f}, daily_reg_reset={self.daily_register_has_reset}")
                     logging.warning(f"  current_daily_wh={current_daily_wh} Wh, last_daily_reg={self.last_daily_register_value} Wh")
                     logging.warning(f"  cs_raw={cs_raw}, cs={cs}, first_update_done={self.first_update_done}")
+                    _, times, states = self.snapshots.last(12)
+                    whc = self.snapshots.column(REG_WHC_DAILY, 12)
+                    logging.warning(f"  Last {len(times)} samples (age s, cs_raw, whc_daily): " + ", ".join(
+                        f"({times[-1] - t:.0f}, {c}, {w})" for t, c, w in zip(times, states, whc)))
 
             self.dbus['/Yield/User'] = new_yield_system
             self.dbus['/Yield/System'] = new_yield_system
@@ -2426,13 +3756,46 @@ class TriStarDriver:
             self._read_eeprom_lifetime_kwh()
             self.eeprom_kwh_counter = 0
 
-        # Read charge settings on-demand (after EEPROM write or at startup)
-        if self.eeprom_refresh_needed:
-            self._read_eeprom_charge_settings()
-            self.eeprom_refresh_needed = False
+        # Background check that the EEPROM shadow still matches the controller
+        if (self.eeprom_revalidate_at is not None and time() >= self.eeprom_revalidate_at
+                and self.eeprom_revalidate_thread is None and not self.profile_apply_in_progress):
+            self.eeprom_revalidate_thread = threading.Thread(target=self._revalidate_eeprom_shadow,
+                                                             name='eeprom-shadow', daemon=True)
+            self.eeprom_revalidate_thread.start()
 
         return True  # Continue timer
 
+    def _record_fault_event(self, field, changed, set_bits, cleared_bits):
+        """Append a bitfield transition to the fault event log (bounded, persisted in state.json)"""
+        event = {
+            "t": int(time()),
+            "field": field,
+            "mask": changed,
+            "set": set_bits,
+            "cleared": cleared_bits,
+        }
+        events = self.state['fault_events']
+        events.append(event)
+        if len(events) > FAULT_EVENT_LOG_SIZE:
+            del events[:-FAULT_EVENT_LOG_SIZE]
+        self._mark_state_dirty('fault_events')
+        self.state['fault_event_count'] = self.state.get('fault_event_count', 0) + 1
+        if field == 'faults' and set_bits:
+            self.state['today']['fault_count'] += 1
+
+        logging.info(f"Bitfield transition: {field} set=0x{set_bits:04X} cleared=0x{cleared_bits:04X}")
+        self._publish_fault_event_summary()
+
+    def _publish_fault_event_summary(self):
+        """Publish fault event count and the most recent transition"""
+        self.dbus['/Custom/Faults/EventCount'] = self.state.get('fault_event_count', 0)
+        events = self.state.get('fault_events', [])
+        if events:
+            last = events[-1]
+            ts = datetime.fromtimestamp(last['t']).strftime('%Y-%m-%d %H:%M:%S')
+            self.dbus['/Custom/Faults/LastEvent'] = \
+                f"{ts} {last['field']} set=0x{last['set']:04X} cleared=0x{last['cleared']:04X}"
+
     def _check_nightly_reset(self):
         """Check if we should perform nightly TriStar comm server reset (local time)"""
         # Get current local date and time (same method as midnight detection)
@@ -2490,7 +3853,7 @@ class TriStarDriver:
                         logging.info(f"Season changed {last_season!r} → {new_season!r}, active='{active}' — no auto-switch")
                     self.dbus['/Custom/Season/CurrentSeason'] = new_season
                     self._update_planned_visit_soc()
-                    self._save_state()
+                    self._request_save("season change")
 
         # Check if it's reset time (5-minute window to catch it)
         if current_hour == reset_hour and current_minute < 5:
@@ -2811,8 +4174,9 @@ class TriStarDriver:
         try:
             # Step 1: Flush today's values and save state (daily registers reset on controller restart)
             self._flush_today_to_state()
-            self._save_state()
+            self._save_state(compact=True, wait=True)  # On flash before the reset - registers are lost
             logging.info("✓ State saved before controller reset")
+            self._flush_register_archive()
 
             # Create dedicated Modbus client (same pattern as profile apply)
             ip = self.settings['ip_address']
@@ -2859,11 +4223,21 @@ class TriStarDriver:
         finally:
             self.main_loop_paused = False
 
-    def _apply_charge_profile_async(self, profile_name):
+    def _apply_charge_profile_async(self, profile_name, values=None, active_profile=None, backup_reason=None):
         """
         Async operation to apply charge profile to EEPROM
         Follows Morningstar recommended procedure with intelligent retry
+
+        values: parameters to write instead of the named profile's settings
+        (backup restore); active_profile is then recorded as the active profile
+        and backup_reason tags the backup of the values being replaced.
         """
+        # profile_name labels the operation (logs, status); the bookkeeping uses the profile it activates
+        if values is not None:
+            active_profile = active_profile or ''
+        else:
+            active_profile = profile_name
+        backup_reason = backup_reason or f"before_profile_{profile_name}"
         try:
             # ==== LOCK MODBUS (prevent collision with main update loop) ====
             self.profile_apply_in_progress = True
@@ -2881,34 +4255,43 @@ class TriStarDriver:
 
             self._update_profile_status("validating", 0, "")
 
-            # Step 1: Get profile from Settings
-            profile = self._get_profile_from_settings(profile_name)
+            # Step 1: Get profile from Settings (or the backup being restored)
+            profile = values if values is not None else self._get_profile_from_settings(profile_name)
             logging.info(f"Profile '{profile_name}': {profile}")
 
             # Step 2: Validate relationships
             self._validate_profile(profile)
 
-            # Step 3: Read current EEPROM values
+            # Step 3: Pre-compute the diff from the EEPROM shadow, then confirm it with one live
+            # block read (0xE000-0xE006) - the EEPROM may have been changed outside the driver
+            shadow_eeprom = self._eeprom_shadow_values()
+            expected = self._compare_profiles(profile, shadow_eeprom) if shadow_eeprom is not None else None
             self._update_profile_status("validating", 10, "Reading current EEPROM...")
             current_eeprom = self._read_eeprom_values()
             logging.info(f"Current EEPROM: {current_eeprom}")
 
             # Step 4: Compare and filter (only write changed values)
             changes = self._compare_profiles(profile, current_eeprom)
+            if expected is not None and set(expected) != set(changes):
+                logging.warning(f"EEPROM differs from its shadow (changed outside the driver?): "
+                                f"shadow diff {sorted(expected)}, live diff {sorted(changes)}")
 
             if not changes:
                 logging.info(f"Profile '{profile_name}' already matches EEPROM, no changes needed")
                 self._update_profile_status("success", 100, "success (no changes needed)")
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 self.dbus['/Custom/ChargeProfile/LastApplied'] = f"{profile_name} (no changes) at {timestamp}"
+                self.charge_profiles['last_applied_profile'] = active_profile
+                self.charge_profiles['last_applied_timestamp'] = timestamp
                 self._save_charge_profiles()
+                self._set_active_profile(active_profile)
                 return
 
             logging.info(f"Will write {len(changes)} EEPROM parameter(s): {list(changes.keys())}")
 
             # Step 5: Backup current EEPROM
             self._update_profile_status("validating", 20, "Backing up current values...")
-            backup = self._backup_eeprom(current_eeprom, f"before_profile_{profile_name}")
+            self._backup_eeprom(current_eeprom, backup_reason)
 
             # Step 6: Disable charging (DISCONNECT) with intelligent wait
             self._update_profile_status("disconnecting", 30, "Disconnecting charger...")
@@ -2940,8 +4323,9 @@ class TriStarDriver:
 
             # Step 8.5: Flush today's values and save state (daily registers reset on controller restart)
             self._flush_today_to_state()
-            self._save_state()
+            self._save_state(compact=True, wait=True)  # On flash before the reset - registers are lost
             logging.info("✓ State saved before controller reset")
+            self._flush_register_archive()
 
             # Step 9: Reset controller (Morningstar recommended)
             self._update_profile_status("resetting", 70, "Resetting controller...")
@@ -2988,18 +4372,12 @@ class TriStarDriver:
             self.dbus['/Custom/ChargeProfile/LastApplied'] = f"{profile_name} at {timestamp}"
 
             # Update profiles JSON
-            self.charge_profiles['last_applied_profile'] = profile_name
+            self.charge_profiles['last_applied_profile'] = active_profile
             self.charge_profiles['last_applied_timestamp'] = timestamp
             self._save_charge_profiles()
 
-            # Flag main loop to refresh EEPROM charge settings on next update
-            self.eeprom_refresh_needed = True
-
             # Track active profile and update season display
-            self.state['active_profile'] = profile_name
-            self.dbus['/Custom/Season/ActiveProfile'] = profile_name
-            self._update_planned_visit_soc()
-            self._save_state()
+            self._set_active_profile(active_profile)
 
             logging.info(f"✅ Charge profile '{profile_name}' applied successfully ({len(changes)} changes)")
 
@@ -3093,37 +4471,24 @@ class TriStarDriver:
         """
         Read current EEPROM charge parameter values from TriStar
         Returns actual voltages (converted from 12V-equivalent stored in EEPROM)
+        One read of 0xE000-0xE006 (the charger may be disconnected while this runs)
         """
-        reg_map = {
-            'EV_absorp': REG_EEPROM_EV_ABSORP,
-            'EV_float': REG_EEPROM_EV_FLOAT,
-            'Et_absorp': REG_EEPROM_ET_ABSORP,
-            'Et_float_exit_cum': REG_EEPROM_ET_FLOAT_EXIT_CUM,
-        }
-
-        values = {}
-        for param, addr in reg_map.items():
-            raw = self.client.read_holding_registers(addr, 1, unit=self.settings['slave_id']).registers[0]
-            if param in ('Et_absorp', 'Et_float_exit_cum'):
-                values[param] = raw  # Seconds, no scaling
-            else:
-                # EEPROM stores 12V-equivalent, convert to actual voltage
-                voltage_12v = raw * self.v_pu * (2**-15)
-                values[param] = round(voltage_12v * self.system_voltage_scale, 2)
-
-        return values
+        regs = self.client.read_holding_registers(REG_EEPROM_EV_ABSORP, EEPROM_PROFILE_BLOCK_COUNT,
+                                                  unit=self.settings['slave_id']).registers
+        if len(regs) < EEPROM_PROFILE_BLOCK_COUNT:
+            raise Exception(f"Short EEPROM read: {len(regs)} of {EEPROM_PROFILE_BLOCK_COUNT} registers")
+        GLib.idle_add(self._patch_eeprom_shadow, list(regs[:EEPROM_PROFILE_BLOCK_COUNT]))
+        return decode_eeprom_params(regs, REG_EEPROM_EV_ABSORP, self.v_pu, self.system_voltage_scale)
 
     def _compare_profiles(self, new_profile, current_eeprom):
         """Return only parameters that differ from current EEPROM"""
         changes = {}
         tolerance = 0.01  # ±0.01V tolerance for voltage comparisons
 
-        integer_params = ('Et_absorp', 'Et_float_exit_cum')
-
         for param, new_value in new_profile.items():
             current_value = current_eeprom.get(param)
 
-            if param in integer_params:
+            if param in EEPROM_SECONDS_PARAMS:
                 if current_value != new_value:
                     changes[param] = new_value
             else:
@@ -3137,16 +4502,9 @@ class TriStarDriver:
         Write single EEPROM parameter
         Converts actual voltage to 12V-equivalent before writing to EEPROM
         """
-        reg_map = {
-            'EV_absorp': REG_EEPROM_EV_ABSORP,
-            'EV_float': REG_EEPROM_EV_FLOAT,
-            'Et_absorp': REG_EEPROM_ET_ABSORP,
-            'Et_float_exit_cum': REG_EEPROM_ET_FLOAT_EXIT_CUM,
-        }
-
-        addr = reg_map[param]
+        addr = EEPROM_PROFILE_REGISTERS[param]
 
-        if param in ('Et_absorp', 'Et_float_exit_cum'):
+        if param in EEPROM_SECONDS_PARAMS:
             raw_value = int(value)
         else:
             # Convert actual voltage to 12V-equivalent for EEPROM storage
@@ -3162,89 +4520,78 @@ class TriStarDriver:
         Verify written values match expected
         Converts from 12V-equivalent stored in EEPROM to actual voltage for comparison
         """
-        reg_map = {
-            'EV_absorp': REG_EEPROM_EV_ABSORP,
-            'EV_float': REG_EEPROM_EV_FLOAT,
-            'Et_absorp': REG_EEPROM_ET_ABSORP,
-            'Et_float_exit_cum': REG_EEPROM_ET_FLOAT_EXIT_CUM,
-        }
+        actual = self._read_eeprom_values()  # One block read for all written parameters
 
         for param, expected_value in changes.items():
-            addr = reg_map[param]
-            raw = self.client.read_holding_registers(addr, 1, unit=self.settings['slave_id']).registers[0]
-
-            if param in ('Et_absorp', 'Et_float_exit_cum'):
-                actual_value = raw
+            actual_value = actual[param]
+            if param in EEPROM_SECONDS_PARAMS:
                 if actual_value != expected_value:
                     raise Exception(f"Verification failed for {param}: expected {expected_value}, got {actual_value}")
             else:
-                # Convert from 12V-equivalent to actual voltage
-                voltage_12v = raw * self.v_pu * (2**-15)
-                actual_value = round(voltage_12v * self.system_voltage_scale, 2)
                 if abs(actual_value - expected_value) > 0.05:
                     raise Exception(f"Verification failed for {param}: expected {expected_value:.2f}V, got {actual_value:.2f}V")
 
             logging.info(f"✓ Verified {param} = {actual_value}")
 
-    def _backup_eeprom(self, eeprom_values, reason):
-        """Create timestamped EEPROM backup"""
-        backup_dir = Path("/data/dbus-tristar/eeprom_backups")
-        backup_dir.mkdir(parents=True, exist_ok=True)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = backup_dir / f"backup_{timestamp}.json"
-
-        backup_data = {
-            "timestamp": datetime.now().isoformat(),
-            "reason": reason,
-            "values": eeprom_values
-        }
-
-        with open(backup_file, 'w') as f:
-            json.dump(backup_data, f, indent=2)
+    def _set_active_profile(self, profile_name):
+        """Record the profile now in EEPROM as active (state, season display, planned-visit SoC)"""
+        self.state['active_profile'] = profile_name
+        self.dbus['/Custom/Season/ActiveProfile'] = profile_name
+        self._update_planned_visit_soc()
+        self._request_save(f"profile '{profile_name}' active")
 
-        # Keep only last 10 backups
-        backups = sorted(backup_dir.glob("backup_*.json"))
-        if len(backups) > 10:
-            for old_backup in backups[:-10]:
-                old_backup.unlink()
+    def _backup_eeprom(self, eeprom_values, reason):
+        """Append an EEPROM backup (tagged with the profile active before the change) to the archive"""
+        entry = self.eeprom_backups.add(eeprom_values, reason, self.state.get('active_profile', ''))
+        logging.info(f"EEPROM backup #{entry['id']} saved ({reason}, image {entry['image']})")
+        return entry
 
-        logging.info(f"EEPROM backup saved: {backup_file}")
-        return backup_data
+    def _restore_eeprom_backup(self, backup_id):
+        """Restore() backend (main loop): write a backup's parameters back with the profile apply procedure"""
+        try:
+            entry, values = self.eeprom_backups.get(backup_id)
+        except KeyError:
+            raise ValueError(f"No EEPROM backup {backup_id}")
+        if self.profile_apply_status not in ['idle', 'success', 'failed']:
+            raise ValueError(f"Profile apply already in progress (status: {self.profile_apply_status})")
+        label = f"backup #{backup_id}"
+        logging.info(f"Restoring EEPROM {label} from {entry['t']} ({entry['reason']}): {values}")
+        threading.Thread(target=self._apply_charge_profile_async,
+                         args=(label, values, entry['profile'], f"before_restore_{backup_id}"),
+                         daemon=True).start()
+        return f"restoring {label}"
 
     def _read_eeprom_charge_settings(self):
         """
-        Read EEPROM charge settings and update D-Bus paths
-        Called: at startup, after EEPROM write, or on-demand
+        Read EEPROM charge settings and update D-Bus paths; returns True on success
+        Called: at startup when there is no shadow (retried by the shadow revalidation)
         NOT called in main poll loop (per Morningstar recommendation)
         """
-        eeprom_regs = self.read_input_registers(0xE000, 18)  # Read EV_absorp through Evb_ref_lim
-        if eeprom_regs and len(eeprom_regs) >= 18:
-            # Read 12V-equivalent values from EEPROM
-            ev_absorp_12v = eeprom_regs[0] * self.v_pu / 32768.0  # 0xE000
-            ev_float_12v = eeprom_regs[1] * self.v_pu / 32768.0   # 0xE001
-            et_absorp = eeprom_regs[2]                            # 0xE002 (seconds, no scaling)
-            ev_eq_12v = eeprom_regs[7] * self.v_pu / 32768.0      # 0xE007
-            ev_tempcomp = eeprom_regs[13] * self.v_pu / 32768.0  # 0xE00D (V/C, no system scale)
-            evb_ref_lim_12v = eeprom_regs[16] * self.v_pu / 32768.0  # 0xE010
-
-            # Convert to actual voltages for display (multiply by system voltage scale)
-            ev_absorp = ev_absorp_12v * self.system_voltage_scale
-            ev_float = ev_float_12v * self.system_voltage_scale
-            ev_eq = ev_eq_12v * self.system_voltage_scale
-            evb_ref_lim = evb_ref_lim_12v * self.system_voltage_scale
-
-            self.dbus['/Custom/EEPROM/AbsorptionVoltage'] = round(ev_absorp, 2)
-            self.dbus['/Custom/EEPROM/FloatVoltage'] = round(ev_float, 2)
-            self.dbus['/Custom/EEPROM/AbsorptionTime'] = et_absorp
-            self.dbus['/Custom/EEPROM/FloatExitTime'] = eeprom_regs[6]  # 0xE006 - Et_float_exit_cum (seconds)
-            self.dbus['/Custom/EEPROM/EqualizeVoltage'] = round(ev_eq, 2)
-            self.dbus['/Custom/EEPROM/TempCompensation'] = round(ev_tempcomp, 4)
-            self.dbus['/Custom/EEPROM/MaxRegulationLimit'] = round(evb_ref_lim, 2)
-
+        eeprom_regs = self.read_input_registers(REG_EEPROM_EV_ABSORP, EEPROM_SETTINGS_COUNT)  # EV_absorp .. Evb_ref_lim
+        if eeprom_regs and len(eeprom_regs) >= EEPROM_SETTINGS_COUNT:
+            self._publish_eeprom_charge_settings(eeprom_regs)
+            self._store_eeprom_shadow(regs=eeprom_regs)
             logging.debug("EEPROM charge settings refreshed")
-        else:
-            logging.warning("Failed to read EEPROM charge settings")
+            return True
+        logging.warning("Failed to read EEPROM charge settings")
+        return False
+
+    def _publish_eeprom_charge_settings(self, eeprom_regs):
+        """Publish /Custom/EEPROM/* from the 0xE000-0xE011 block (live read or shadow)"""
+        # Profile parameters (0xE000-0xE006), then the others: 12V-equivalent values from EEPROM
+        self._update_active_eeprom_display(
+            decode_eeprom_params(eeprom_regs, REG_EEPROM_EV_ABSORP, self.v_pu, self.system_voltage_scale))
+        ev_eq_12v = eeprom_regs[7] * self.v_pu / 32768.0      # 0xE007
+        ev_tempcomp = eeprom_regs[13] * self.v_pu / 32768.0  # 0xE00D (V/C, no system scale)
+        evb_ref_lim_12v = eeprom_regs[16] * self.v_pu / 32768.0  # 0xE010
+
+        # Convert to actual voltages for display (multiply by system voltage scale)
+        ev_eq = ev_eq_12v * self.system_voltage_scale
+        evb_ref_lim = evb_ref_lim_12v * self.system_voltage_scale
+
+        self.dbus['/Custom/EEPROM/EqualizeVoltage'] = round(ev_eq, 2)
+        self.dbus['/Custom/EEPROM/TempCompensation'] = round(ev_tempcomp, 4)
+        self.dbus['/Custom/EEPROM/MaxRegulationLimit'] = round(evb_ref_lim, 2)
 
     def _read_eeprom_lifetime_kwh(self):
         """
@@ -3252,19 +4599,98 @@ class TriStarDriver:
         Called: at startup, every 30 minutes
         NOT called in main poll loop (per Morningstar recommendation)
         """
-        kwh_regs = self.read_input_registers(0xE086, 2)
+        kwh_regs = self.read_input_registers(REG_EEPROM_KWHC_R, 2)
         if kwh_regs and len(kwh_regs) >= 2:
-            # Spec page 15: kWhc registers already in kWh units (no scaling needed)
-            ekwhc_r = kwh_regs[0]  # 0xE086 - Resetable kWh
-            ekwhc_t = kwh_regs[1]  # 0xE087 - Total kWh (lifetime)
-
-            self.dbus['/Custom/EEPROM/ChargeKwhResetable'] = round(ekwhc_r, 1)
-            self.dbus['/Custom/EEPROM/ChargeKwhTotal'] = round(ekwhc_t, 1)
-
-            logging.debug(f"EEPROM lifetime kWh refreshed: {ekwhc_t} kWh total")
+            self._publish_eeprom_kwh(kwh_regs)
+            # Persisted with the next settings write (the first reading right away)
+            first = 'kwh' not in self.eeprom_shadow.get(self.serial_number, {})
+            self._store_eeprom_shadow(kwh=kwh_regs, save=first)
+            logging.debug(f"EEPROM lifetime kWh refreshed: {kwh_regs[1]} kWh total")
         else:
             logging.warning("Failed to read EEPROM lifetime kWh")
 
+    def _publish_eeprom_kwh(self, kwh_regs):
+        # Spec page 15: kWhc registers already in kWh units (no scaling needed)
+        self.dbus['/Custom/EEPROM/ChargeKwhResetable'] = round(kwh_regs[0], 1)  # 0xE086 - Resetable kWh
+        self.dbus['/Custom/EEPROM/ChargeKwhTotal'] = round(kwh_regs[1], 1)      # 0xE087 - Total kWh (lifetime)
+
+    def _load_eeprom_shadow(self):
+        try:
+            with open(EEPROM_SHADOW_FILE) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"EEPROM shadow unreadable, reading EEPROM at startup: {e}")
+            return {}
+
+    def _store_eeprom_shadow(self, regs=None, kwh=None, save=True, read_at=None):
+        """Record a live EEPROM read in this controller's shadow (main loop)"""
+        if not self.serial_number:
+            return
+        shadow = self.eeprom_shadow.setdefault(self.serial_number, {})
+        if regs is not None:
+            shadow['regs'] = [int(value) for value in regs[:EEPROM_SETTINGS_COUNT]]
+            shadow['read_at'] = read_at or time()
+        if kwh is not None:
+            shadow['kwh'] = [int(value) for value in kwh[:2]]
+        if save and 'regs' in shadow:
+            temp_file = EEPROM_SHADOW_FILE.with_suffix('.tmp')
+            try:
+                with open(temp_file, 'w') as f:
+                    json.dump(self.eeprom_shadow, f)
+                temp_file.replace(EEPROM_SHADOW_FILE)
+            except OSError as e:
+                logging.error(f"Failed to save EEPROM shadow: {e}")
+
+    def _patch_eeprom_shadow(self, profile_regs):
+        """Profile apply read 0xE000-0xE006 live (idle callback): keep the shadow in step"""
+        shadow = self.eeprom_shadow.get(self.serial_number)
+        if not shadow or len(shadow.get('regs', ())) != EEPROM_SETTINGS_COUNT:
+            return False
+        if shadow['regs'][:len(profile_regs)] != profile_regs:
+            # Only part of the block was read: keep the age of the full read
+            self._store_eeprom_shadow(regs=profile_regs + shadow['regs'][len(profile_regs):],
+                                      read_at=shadow['read_at'])
+        return False
+
+    def _eeprom_shadow_values(self):
+        """Profile parameters from the shadow if it was validated within eeprom_shadow_max_age_sec, else None"""
+        shadow = self.eeprom_shadow.get(self.serial_number)
+        if (not shadow or len(shadow.get('regs', ())) != EEPROM_SETTINGS_COUNT
+                or time() - shadow['read_at'] >= CONFIG['eeprom_shadow_max_age_sec']):
+            return None
+        return decode_eeprom_params(shadow['regs'], REG_EEPROM_EV_ABSORP, self.v_pu, self.system_voltage_scale)
+
+    def _revalidate_eeprom_shadow(self):
+        """Background thread: one read of the settings block and the kWh counters"""
+        regs = self.read_input_registers(REG_EEPROM_EV_ABSORP, EEPROM_SETTINGS_COUNT)
+        kwh = self.read_input_registers(REG_EEPROM_KWHC_R, 2)
+        GLib.idle_add(self._on_eeprom_revalidated, regs, kwh)
+
+    def _on_eeprom_revalidated(self, regs, kwh):
+        """Main loop: compare the fresh read with the shadow, republish if the EEPROM changed"""
+        self.eeprom_revalidate_thread = None
+        if not regs or len(regs) < EEPROM_SETTINGS_COUNT:
+            logging.warning("EEPROM shadow revalidation read failed - retrying in 10 min")
+            self.eeprom_revalidate_at = time() + 600
+            return False
+        shadow = self.eeprom_shadow.get(self.serial_number, {})
+        old = shadow.get('regs', [])
+        changed = [f"0x{REG_EEPROM_EV_ABSORP + i:04X}" for i, value in enumerate(regs[:EEPROM_SETTINGS_COUNT])
+                   if i >= len(old) or old[i] != value]
+        if not old:
+            logging.info("EEPROM charge settings read (no shadow yet)")
+            self._publish_eeprom_charge_settings(regs)
+        elif changed:
+            logging.warning(f"EEPROM changed outside the driver ({', '.join(changed)}) - shadow updated")
+            self._publish_eeprom_charge_settings(regs)
+        if kwh and len(kwh) >= 2:
+            self._publish_eeprom_kwh(kwh)
+        self._store_eeprom_shadow(regs=regs, kwh=kwh if kwh and len(kwh) >= 2 else None)
+        self.eeprom_revalidate_at = time() + CONFIG['eeprom_shadow_max_age_sec']
+        return False
+
     def _update_active_eeprom_display(self, eeprom_values):
         """Update D-Bus paths showing active EEPROM values"""
         self.dbus['/Custom/EEPROM/AbsorptionVoltage'] = eeprom_values.get('EV_absorp', 0.0)
@@ -3401,10 +4827,19 @@ def main():
         # Save state before shutdown
         if driver:
             try:
-                driver._save_state()
-                logging.info("✓ State saved before shutdown")
+                driver._save_state(compact=True)
+                if driver.state_writer.stop(timeout=5):
+                    logging.info("✓ State saved before shutdown")
+                else:
+                    logging.error("State writer did not finish within 5s - last changes may be lost")
             except Exception as e:
                 logging.error(f"Failed to save state on shutdown: {e}")
+            if driver.mqtt is not None:
+                driver.mqtt.stop()  # Publishes 'offline' status before disconnecting
+            if driver.timeseries is not None and not driver.timeseries.stop(timeout=5):
+                logging.error("Time-series writer did not finish within 5s - last samples may be lost")
+            if driver.archive is not None and not driver.archive.stop(timeout=5):
+                logging.error("Register archive did not finish within 5s - last snapshots may be lost")
 
         if mainloop:
             mainloop.quit()
@@ -19,8 +19,10 @@ sys.path.insert(1, '/opt/victronenergy/dbus-systemcalc-py/ext/velib_python')
 from vedbus import VeDbusService
 from settingsdevice import SettingsDevice
 
+# Same D-Bus schema as the real driver (installed alongside in /data/dbus-tristar/)
+from tristar_schema import DBUS_PATHS, UNIT_FORMATTERS, register_dbus_paths
+
 VERSION = "2.0-MOCK"
-PRODUCT_ID = 0xABCD
 
 # Charge states for rotation
 STATES = [
@@ -72,52 +74,24 @@ class MockTriStarDriver:
         logging.info("Mock TriStar MPPT driver initialized")
 
     def _setup_dbus_paths(self):
-        """Setup all D-Bus paths"""
+        """Setup D-Bus paths from the driver's schema (subset that is simulated)"""
         s = self.dbus
 
-        # Management
-        s.add_path('/Mgmt/ProcessName', __file__)
-        s.add_path('/Mgmt/ProcessVersion', VERSION)
-        s.add_path('/Mgmt/Connection', 'MOCK - Simulated Data')
-
-        # Device info
-        s.add_path('/ProductId', PRODUCT_ID)
-        s.add_path('/ProductName', '')
-        s.add_path('/FirmwareVersion', 0)
-        s.add_path('/HardwareVersion', '')
-        s.add_path('/Serial', '')
-        s.add_path('/DeviceInstance', 0)
-        s.add_path('/Connected', 0)
-        s.add_path('/Mode', 1)
-        s.add_path('/ErrorCode', 0)
-
-        # PV array
-        s.add_path('/Pv/V', None, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Pv/I', None, gettextcallback=lambda p, v: f"{v}A")
-
-        # Battery
-        s.add_path('/Dc/0/Voltage', None, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/Dc/0/Current', None, gettextcallback=lambda p, v: f"{v}A")
-        s.add_path('/Dc/0/Temperature', None)
-
-        # Power and state
-        s.add_path('/Yield/Power', None, gettextcallback=lambda p, v: f"{v}W")
-        s.add_path('/State', 0)
-
-        # History
+        # Management, device info, PV, battery, power/state, today's history and total yield
+        simulated_groups = {'mgmt', 'device', 'pv', 'battery', 'state', 'yield'}
+        entries = [e for e in DBUS_PATHS
+                   if e.group in simulated_groups or e.path.startswith('/History/Daily/0/')]
+        register_dbus_paths(s, entries, initial={
+            '/Mgmt/ProcessName': __file__,
+            '/Mgmt/ProcessVersion': VERSION,
+            '/Mgmt/Connection': 'MOCK - Simulated Data',
+            **{e.path: None for e in entries if e.group in ('pv', 'battery', 'state', 'yield', 'history_daily')},
+            '/State': 0,
+        })
+
+        # Mock-only paths
+        s.add_path('/Pv/I', None, gettextcallback=UNIT_FORMATTERS['A'])
         s.add_path('/History/Overall/DaysAvailable', 1)
-        s.add_path('/History/Daily/0/Yield', None, gettextcallback=lambda p, v: f"{v}kWh")
-        s.add_path('/History/Daily/0/MaxPower', None, gettextcallback=lambda p, v: f"{v}W")
-        s.add_path('/History/Daily/0/MaxPvVoltage', None, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Daily/0/MaxBatteryVoltage', None, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Daily/0/MinBatteryVoltage', None, gettextcallback=lambda p, v: f"{v}V")
-        s.add_path('/History/Daily/0/TimeInBulk', None)
-        s.add_path('/History/Daily/0/TimeInAbsorption', None)
-        s.add_path('/History/Daily/0/TimeInFloat', None)
-
-        # Total yield
-        s.add_path('/Yield/User', None, gettextcallback=lambda p, v: f"{v}kWh")
-        s.add_path('/Yield/System', None, gettextcallback=lambda p, v: f"{v}kWh")
 
     def update(self):
         """Generate fake data"""
@@ -25,9 +25,15 @@ echo ""
 echo "Creating installation directory: $INSTALL_DIR"
 mkdir -p $INSTALL_DIR
 
-# Copy driver
+# Copy driver (and its state storage module)
 echo "Installing driver..."
 cp $SCRIPT_NAME $INSTALL_DIR/
+cp tristar_schema.py $INSTALL_DIR/
+cp tristar_storage.py $INSTALL_DIR/
+cp tristar_history.py $INSTALL_DIR/
+cp tristar_archive.py $INSTALL_DIR/
+cp tristar_export.py $INSTALL_DIR/
+cp tristar_backups.py $INSTALL_DIR/
 chmod +x $INSTALL_DIR/$SCRIPT_NAME
 
 # Create service directory structure (daemontools persistent)
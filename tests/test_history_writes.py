@@ -0,0 +1,219 @@
+"""
+History days 1-30 are event-driven: ordinary poll cycles must not write /History/Daily/N/*
+
+Runs dbus_tristar without Venus OS: dbus, gi, pymodbus, vedbus and settingsdevice
+are replaced by minimal in-memory stand-ins before the driver is imported.
+
+    python -m pytest -q tests
+"""
+
+import re
+import sys
+import types
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+HISTORY_DAY_PATH = re.compile(r'^/History/Daily/([1-9]\d*)/')
+
+
+# ---- dbus / dbus.service / dbus.mainloop.glib ----
+dbus = types.ModuleType('dbus')
+dbus.SystemBus = dbus.SessionBus = lambda *args, **kwargs: types.SimpleNamespace()
+for _name, _type in (('Array', list), ('Dictionary', dict), ('Struct', tuple), ('Double', float),
+                     ('Int32', int), ('UInt32', int), ('Int64', int), ('String', str), ('Boolean', bool)):
+    setattr(dbus, _name, lambda value=None, signature=None, _type=_type: _type(value) if value is not None else _type())
+dbus.exceptions = types.SimpleNamespace(DBusException=Exception)
+dbus.service = types.ModuleType('dbus.service')
+dbus.service.Object = type('Object', (), {'__init__': lambda self, *args, **kwargs: None,
+                                          'remove_from_connection': lambda self, *args, **kwargs: None})
+dbus.service.method = dbus.service.signal = lambda *args, **kwargs: (lambda f: f)
+dbus.mainloop = types.ModuleType('dbus.mainloop')
+dbus.mainloop.glib = types.ModuleType('dbus.mainloop.glib')
+dbus.mainloop.glib.DBusGMainLoop = lambda **kwargs: None
+
+
+# ---- gi.repository.GLib: timers are never fired, idle callbacks run inline ----
+class GLib:
+    timeout_add = timeout_add_seconds = staticmethod(lambda interval, callback, *args: 1)
+    idle_add = staticmethod(lambda callback, *args: callback(*args) and 0)
+    source_remove = staticmethod(lambda source: None)
+    MainLoop = type('MainLoop', (), {'run': lambda self: None, 'quit': lambda self: None})
+
+
+gi = types.ModuleType('gi')
+gi.repository = types.ModuleType('gi.repository')
+gi.repository.GLib = GLib
+
+
+# ---- pymodbus: a register map instead of a controller ----
+REGISTERS = {}
+
+
+class _Result:
+    def __init__(self, registers=None, bits=None):
+        self.registers = registers
+        self.bits = bits
+
+    def isError(self):
+        return False
+
+
+class ModbusTcpClient:
+    def __init__(self, **kwargs):
+        pass
+
+    def connect(self):
+        return True
+
+    def close(self):
+        pass
+
+    def read_input_registers(self, address, count=1, **kwargs):
+        return _Result([REGISTERS.get(address + i, 0) for i in range(count)])
+
+    read_holding_registers = read_input_registers
+
+    def read_coils(self, address, count=1, **kwargs):
+        return _Result(bits=[False] * max(count, 8))
+
+    def write_coil(self, address, value, **kwargs):
+        return _Result()
+
+    def write_register(self, address, value, **kwargs):
+        REGISTERS[address] = value
+        return _Result()
+
+
+pymodbus = types.ModuleType('pymodbus')
+pymodbus.client = types.ModuleType('pymodbus.client')
+pymodbus.client.ModbusTcpClient = ModbusTcpClient
+
+
+# ---- velib: vedbus / settingsdevice ----
+class VeDbusService:
+    def __init__(self, servicename, bus=None, register=True):
+        self.values = {}
+        self._dbusconn = None
+
+    def add_path(self, path, value, **kwargs):
+        self.values[path] = value
+
+    def register(self):
+        pass
+
+    def __contains__(self, path):
+        return path in self.values
+
+    def __getitem__(self, path):
+        return self.values[path]
+
+    def __setitem__(self, path, value):
+        self.values[path] = value
+
+
+class SettingsDevice(dict):
+    def __init__(self, bus, supportedSettings, eventCallback, **kwargs):
+        super().__init__({name: spec[1] for name, spec in supportedSettings.items()})
+
+
+vedbus = types.ModuleType('vedbus')
+vedbus.VeDbusService = VeDbusService
+settingsdevice = types.ModuleType('settingsdevice')
+settingsdevice.SettingsDevice = SettingsDevice
+
+sys.modules.update({
+    'dbus': dbus, 'dbus.service': dbus.service, 'dbus.mainloop': dbus.mainloop,
+    'dbus.mainloop.glib': dbus.mainloop.glib,
+    'gi': gi, 'gi.repository': gi.repository,
+    'pymodbus': pymodbus, 'pymodbus.client': pymodbus.client,
+    'vedbus': vedbus, 'settingsdevice': settingsdevice,
+})
+sys.path.insert(0, str(ROOT))
+
+import dbus_tristar  # noqa: E402
+import tristar_storage  # noqa: E402
+
+
+def _set_registers():
+    """A 24V controller in float, 250 W, 0.1 kWh so far today"""
+    v_pu, i_pu = 180.0, 80.0
+    REGISTERS.update({0: 180, 1: 0, 2: 80, 3: 0, 4: 0x0123, dbus_tristar.REG_EMODEL: 1})
+    for i in range(4):
+        REGISTERS[dbus_tristar.REG_ESERIAL + i] = 0x3132
+    REGISTERS[dbus_tristar.REG_V_BAT] = int(26.5 * 32768 / v_pu)
+    REGISTERS[dbus_tristar.REG_V_PV] = int(60.0 * 32768 / v_pu)
+    REGISTERS[dbus_tristar.REG_I_CC_1M] = int(10.0 * 32768 / i_pu)
+    REGISTERS[dbus_tristar.REG_POUT] = int(250.0 * 131072 / (v_pu * i_pu))
+    REGISTERS[dbus_tristar.REG_CHARGE_STATE] = 5
+    REGISTERS[dbus_tristar.REG_WHC_DAILY] = 100
+    for address in range(0xE000, 0xE012):
+        REGISTERS[address] = 0x2000
+
+
+@pytest.fixture
+def driver(tmp_path, monkeypatch):
+    """A started driver (first cycle done) with 3 history days, all files under tmp_path"""
+    for module in (dbus_tristar, tristar_storage):
+        for name, value in vars(module).items():
+            if isinstance(value, Path) and str(value).startswith(('/data', '/run')):
+                monkeypatch.setattr(module, name, tmp_path / value.name)
+    _set_registers()
+
+    writes = []
+    setitem = dbus_tristar.BatchedDbusService.__setitem__
+
+    def recording_setitem(self, path, value):
+        if HISTORY_DAY_PATH.match(path):
+            writes.append(path)
+        setitem(self, path, value)
+
+    monkeypatch.setattr(dbus_tristar.BatchedDbusService, '__setitem__', recording_setitem)
+
+    instance = dbus_tristar.TriStarDriver()
+    today = date.fromisoformat(instance._get_local_date())
+    instance.state['history'] = [{'date': (today - timedelta(days=n)).isoformat(), 'yield': 1.5 + n}
+                                 for n in range(1, 4)]
+    instance._mark_history_dirty()
+    instance.update()
+    assert writes, "history days were not published at startup"
+    instance.history_writes = writes
+    yield instance
+    instance.state_writer.stop(timeout=5)
+
+
+def _cycles(driver, count=5):
+    driver.history_writes.clear()
+    for _ in range(count):
+        driver.update()
+    return list(driver.history_writes)
+
+
+def test_ordinary_cycles_write_no_history(driver):
+    assert _cycles(driver) == []
+
+
+def test_cycles_with_changing_live_values_write_no_history(driver):
+    driver.history_writes.clear()
+    for whc in (200, 300, 400):
+        REGISTERS[dbus_tristar.REG_WHC_DAILY] = whc
+        driver.update()
+    assert driver.history_writes == []
+
+
+def test_mark_history_dirty_republishes_once(driver):
+    driver._mark_history_dirty()
+    writes = _cycles(driver, 3)
+    assert {HISTORY_DAY_PATH.match(path).group(1) for path in writes} == {'1', '2', '3'}
+    assert len(writes) == 3 * len(dbus_tristar.HISTORY_DAY_FIELDS)  # First cycle only
+    assert _cycles(driver) == []
+
+
+def test_rollover_republishes_history(driver, monkeypatch):
+    tomorrow = (date.fromisoformat(driver._get_local_date()) + timedelta(days=1)).isoformat()
+    monkeypatch.setattr(driver, '_get_local_date', lambda: tomorrow)
+    writes = _cycles(driver, 1)
+    assert '/History/Daily/4/Yield' in writes  # Yesterday pushed the three older days back
+    assert _cycles(driver) == []
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+"""
+Lossless archive of raw TriStar register snapshots
+
+Standard library only (no D-Bus / Modbus imports), so offline tools can read
+the archive the driver writes.
+
+One file per local day (<dir>/YYYY-MM-DD.tsra), a sequence of blocks:
+
+    block   = u32 length, u32 crc32(data), data = zlib(payload)
+    payload = u16 format version, u16 base register address, u16 width, u32 count,
+              then unsigned LEB128 varints, column by column:
+              timestamps (ms): first value, then zigzag deltas
+              each register:   first value, then zigzag deltas
+
+Column-oriented deltas turn the mostly constant or slowly changing registers
+into runs of zero bytes that zlib compresses to almost nothing. A torn or
+corrupt block (power loss mid-append) ends reading and is truncated away before
+the next append to that file.
+
+Command line: tristar_archive.py <day file>   (prints one CSV line per snapshot)
+"""
+
+import logging
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from pathlib import Path
+
+ARCHIVE_SUFFIX = '.tsra'
+FORMAT_VERSION = 1
+BLOCK_HEADER = struct.Struct('<II')     # length, crc32
+PAYLOAD_HEADER = struct.Struct('<HHHI')  # format version, base address, width, count
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _encode_column(out, values):
+    previous = values[0]
+    _put_varint(out, previous)
+    for value in values[1:]:
+        _put_varint(out, _zigzag(value - previous))
+        previous = value
+
+
+def encode_block(base, width, times, rows):
+    """Compress one block of snapshots (times in seconds, rows of width registers)"""
+    out = bytearray(PAYLOAD_HEADER.pack(FORMAT_VERSION, base, width, len(rows)))
+    _encode_column(out, [int(t * 1000) for t in times])
+    for column in range(width):
+        _encode_column(out, [row[column] for row in rows])
+    data = zlib.compress(bytes(out), 6)
+    return BLOCK_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def decode_block(data):
+    """Decompressed block -> (base, width, times in seconds, list of register columns)"""
+    payload = zlib.decompress(data)
+    version, base, width, count = PAYLOAD_HEADER.unpack_from(payload)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported archive block version {version}")
+    offset = PAYLOAD_HEADER.size
+
+    def column():
+        nonlocal offset
+        values = []
+        value = 0
+        for i in range(count):
+            shift = raw = 0
+            while True:
+                byte = payload[offset]
+                offset += 1
+                raw |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            value = raw if i == 0 else value + _unzigzag(raw)
+            values.append(value)
+        return values
+
+    times = [ms / 1000.0 for ms in column()]
+    columns = [array('H', column()) for _ in range(width)]
+    return base, width, times, columns
+
+
+def read_blocks(path):
+    """Yield (end offset, base, width, times, columns) for every intact block of a day file"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return
+    offset = 0
+    while offset + BLOCK_HEADER.size <= len(data):
+        length, crc = BLOCK_HEADER.unpack_from(data, offset)
+        start = offset + BLOCK_HEADER.size
+        block = data[start:start + length]
+        if len(block) != length or zlib.crc32(block) != crc:
+            return
+        try:
+            decoded = decode_block(block)
+        except (ValueError, IndexError, zlib.error, struct.error):
+            return
+        offset = start + length
+        yield (offset,) + decoded
+
+
+def iter_snapshots(path):
+    """Stream a day file back as (timestamp, array('H') of registers), oldest first"""
+    for _, _, width, times, columns in read_blocks(path):
+        for i, timestamp in enumerate(times):
+            yield timestamp, array('H', (columns[column][i] for column in range(width)))
+
+
+class RegisterArchive:
+    """
+    Append raw register snapshots to per-day archive files
+
+    append() only buffers (main loop); a block is handed to a background
+    thread that encodes, writes and fsyncs it once it holds block_size
+    snapshots or spans block_seconds, and the partial block at flush()/
+    rotate()/stop(). flush() can be called from any thread (before a
+    controller reset) and waits until the block is on disk. rotate(day)
+    switches to a new day file and deletes day files older than keep_days.
+    """
+
+    def __init__(self, directory, day, base, width, block_size=720, keep_days=90, block_seconds=300):
+        self.directory = Path(directory)
+        self.day = day
+        self.base = base
+        self.width = width
+        self.block_size = block_size
+        self.block_seconds = block_seconds
+        self.keep_days = keep_days
+        self.bytes_written = 0
+        self._lock = threading.Lock()   # Buffer is shared with flush() from other threads
+        self._times = []
+        self._rows = []
+        self._queue = queue.Queue()
+        self._checked = set()   # Day files whose tail was validated since start
+        self._thread = threading.Thread(target=self._run, name='register-archive', daemon=True)
+        self._thread.start()
+
+    def path_for(self, day):
+        return self.directory / f'{day}{ARCHIVE_SUFFIX}'
+
+    def append(self, timestamp, regs):
+        with self._lock:
+            self._times.append(timestamp)
+            self._rows.append(array('H', regs))
+            if len(self._rows) >= self.block_size or timestamp - self._times[0] >= self.block_seconds:
+                self._flush_block()
+
+    def flush(self, timeout=None):
+        """Write the buffered partial block now; False if it was not on disk within timeout"""
+        done = threading.Event()
+        with self._lock:
+            self._flush_block()
+            self._queue.put(('sync', done))
+        return done.wait(timeout)
+
+    def rotate(self, day):
+        """Close the current day (midnight rollover); later snapshots go to day's file"""
+        with self._lock:
+            self._flush_block()
+            self.day = day
+        self._queue.put(('prune', None))
+
+    def stop(self, timeout=None):
+        """Write the buffered partial block and stop the thread; False if it did not finish in time"""
+        with self._lock:
+            self._flush_block()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _flush_block(self):
+        """Queue the buffered snapshots as one block (caller holds _lock)"""
+        if self._rows:
+            self._queue.put(('block', (self.path_for(self.day), self._times, self._rows)))
+            self._times = []
+            self._rows = []
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            kind, args = item
+            try:
+                if kind == 'block':
+                    self._write_block(*args)
+                elif kind == 'sync':
+                    args.set()
+                else:
+                    self._prune()
+            except Exception as e:
+                logging.error(f"Register archive: {e}")
+
+    def _write_block(self, path, times, rows):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path not in self._checked:
+            # First append since start: cut a torn tail so later blocks stay readable
+            valid_end = 0
+            for valid_end, *_ in read_blocks(path):
+                pass
+            if path.exists() and path.stat().st_size > valid_end:
+                logging.warning(f"Register archive {path.name}: truncating corrupt tail after {valid_end} bytes")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_end)
+            self._checked.add(path)
+        block = encode_block(self.base, self.width, times, rows)
+        with open(path, 'ab') as f:
+            f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+        self.bytes_written += len(block)
+
+    def _prune(self):
+        if not self.keep_days:
+            return
+        files = sorted(self.directory.glob(f'*{ARCHIVE_SUFFIX}'))
+        for path in files[:-self.keep_days]:
+            path.unlink()
+            self._checked.discard(path)
+            logging.info(f"Register archive: removed {path.name}")
+
+
+def main(argv):
+    if len(argv) != 2:
+        print(f"usage: {argv[0]} <archive day file>   (CSV: timestamp, registers from the base address)",
+              file=sys.stderr)
+        return 2
+    for timestamp, regs in iter_snapshots(argv[1]):
+        print(f"{timestamp:.3f}," + ','.join(str(value) for value in regs))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
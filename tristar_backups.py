@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""
+Append-only archive of EEPROM charge parameter backups
+
+Standard library only (no D-Bus / Modbus imports), so the backups can be
+listed offline. One file (eeprom_backups.log) of CRC-framed JSON records, the
+same framing as the state journal (tristar_storage.encode_record):
+
+    {"image": hash, "values": {...}}                      parameter image, stored once
+    {"id": n, "t": iso time, "reason": str, "profile": str, "image": hash}
+                                                          index entry (one per backup)
+
+Identical images (the usual case: the same profile applied again) are stored
+once and referenced by hash. The index and image offsets are rebuilt by one
+scan at open, so listing never touches the disk and a restore is one seek.
+A torn tail (power loss mid-append) is truncated before the next append.
+Retention (count and age) is applied by rewriting the file, in batches of
+PRUNE_BATCH entries so the file stays append-only in between; the newest
+backup is always kept.
+
+Command line: tristar_backups.py <archive> [id]   (list, or print one backup's values)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from tristar_storage import RECORD_HEADER, encode_record, read_records
+
+PRUNE_BATCH = 10
+
+
+def image_hash(values):
+    """Stable short hash of a parameter dict (key order does not matter)"""
+    data = json.dumps(values, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class EepromBackupArchive:
+    """
+    Index + deduplicated images of EEPROM backups in one append-only file
+
+    add() is called from the profile apply thread, entries()/get() from the
+    main loop (D-Bus), so all access is serialised by a lock.
+    """
+
+    def __init__(self, path, keep=50, max_age_days=0):
+        self.path = Path(path)
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._entries = []   # Index entries, oldest first
+        self._images = {}    # hash -> file offset of the image record
+        self._end = 0        # End of the last intact record
+        for offset, end, record in read_records(self.path):
+            if 'values' in record:
+                self._images[record['image']] = offset
+            else:
+                self._entries.append(record)
+            self._end = end
+
+    def entries(self):
+        """Index entries, newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def get(self, backup_id):
+        """(entry, values) of one backup; KeyError if it does not exist"""
+        with self._lock:
+            entry = next((entry for entry in self._entries if entry['id'] == backup_id), None)
+            if entry is None:
+                raise KeyError(backup_id)
+            return entry, self._read_image(self._images[entry['image']])
+
+    def add(self, values, reason, profile='', timestamp=None):
+        """Append a backup (image only if new); returns its index entry"""
+        digest = image_hash(values)
+        with self._lock:
+            entry = {
+                'id': self._entries[-1]['id'] + 1 if self._entries else 1,
+                't': timestamp or datetime.now().isoformat(timespec='seconds'),
+                'reason': reason,
+                'profile': profile,
+                'image': digest,
+            }
+            records = [] if digest in self._images else [{'image': digest, 'values': values}]
+            self._append(records + [entry])
+            self._entries.append(entry)
+            self._prune()
+        return entry
+
+    def _read_image(self, offset):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            length, _ = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            return json.loads(f.read(length))['values']
+
+    def _append(self, records):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            if f.tell() > self._end:
+                logging.warning(f"EEPROM backups: truncating corrupt tail after {self._end} bytes")
+                f.truncate(self._end)
+                f.seek(self._end)
+            for record in records:
+                if 'values' in record:
+                    self._images[record['image']] = f.tell()
+                f.write(encode_record(record))
+            f.flush()
+            os.fsync(f.fileno())
+            self._end = f.tell()
+
+    def _prune(self):
+        """Drop entries beyond keep or older than max_age_days (batched), then rewrite the file"""
+        expired = 0
+        if self.max_age_days:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+            expired = sum(1 for entry in self._entries[:-1] if entry['t'] < cutoff)
+        excess = len(self._entries) - self.keep if self.keep else 0
+        if max(excess, expired) < PRUNE_BATCH:
+            return
+        drop = max(excess, expired)
+        kept = self._entries[drop:]
+        records = []
+        for image in dict.fromkeys(entry['image'] for entry in kept):
+            records.append({'image': image, 'values': self._read_image(self._images[image])})
+        records.extend(kept)
+
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            images = {}
+            for record in records:
+                if 'values' in record:
+                    images[record['image']] = f.tell()
+                f.write(encode_record(record))
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+        os.replace(tmp, self.path)
+        logging.info(f"EEPROM backups: removed {drop} old entries (ids {self._entries[0]['id']}-"
+                     f"{self._entries[drop - 1]['id']}), {len(kept)} kept")
+        self._entries, self._images, self._end = kept, images, end
+
+    def import_legacy(self, directory):
+        """Move backup_*.json files of the old per-file layout into the archive (oldest first)"""
+        directory = Path(directory)
+        files = sorted(directory.glob('backup_*.json'))
+        for path in files:
+            try:
+                with open(path) as f:
+                    backup = json.load(f)
+                self.add(backup['values'], backup.get('reason', ''), timestamp=backup.get('timestamp'))
+                path.unlink()
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"EEPROM backups: could not import {path.name}: {e}")
+        if files:
+            logging.info(f"EEPROM backups: imported {len(files)} legacy backup files from {directory}")
+
+
+def main(argv):
+    if len(argv) not in (2, 3):
+        print(f"usage: {argv[0]} <eeprom_backups.log> [id]   (list backups, or print one backup's values)",
+              file=sys.stderr)
+        return 2
+    archive = EepromBackupArchive(argv[1], keep=0)
+    if len(argv) == 3:
+        try:
+            entry, values = archive.get(int(argv[2]))
+        except (KeyError, ValueError):
+            print(f"No backup {argv[2]}", file=sys.stderr)
+            return 1
+        json.dump(dict(entry, values=values), sys.stdout, indent=2)
+        print()
+        return 0
+    for entry in archive.entries():
+        print(f"{entry['id']:5d}  {entry['t']}  {entry['image']}  {entry['profile'] or '-':<20}  {entry['reason']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+"""
+Export TriStar MPPT driver data for a date range (CSV or columnar binary)
+
+Standard library only, reads a (copy of a) driver data directory offline:
+
+    days       daily summaries: history.db "days" merged with the state history
+    rollups    month/year accumulators from the state
+    samples    time-series rows from history.db (--level raw, m1, m15 or d1)
+    registers  raw register snapshots from archive/YYYY-MM-DD.tsra
+
+Everything is streamed in chunks of --chunk rows (SQLite cursors, archive
+blocks), so memory stays bounded however long the range is. Dates are local
+calendar days of the controller; --to is inclusive.
+
+Columnar format (--format columnar), little-endian:
+
+    header = b'TSCX', u16 version, u32 length, JSON {"kind", "columns": [{"name", "type"}]}
+    chunk  = u32 row count, then per column:
+             f8  -> count float64 (missing = NaN)
+             u2  -> count uint16
+             str -> u32 length, UTF-8 values joined by newlines
+    end    = u32 0
+
+e.g. numpy.frombuffer(data, '<f8', count, offset) reads a numeric column.
+
+Command line: tristar_export.py <kind> [--from DATE] [--to DATE] [options]
+"""
+
+import argparse
+import calendar
+import csv
+import json
+import math
+import struct
+import sys
+from array import array
+from datetime import date
+from pathlib import Path
+
+import tristar_history
+from tristar_archive import ARCHIVE_SUFFIX, read_blocks
+from tristar_storage import StateStore
+
+DATA_DIR = '/data/dbus-tristar'
+COLUMNAR_MAGIC = b'TSCX'
+COLUMNAR_VERSION = 1
+COLUMNAR_HEADER = struct.Struct('<4sHI')  # magic, version, JSON length
+CHUNK_HEADER = struct.Struct('<I')        # row count (0 = end)
+KINDS = ('days', 'rollups', 'samples', 'registers')
+
+
+def _load_state(data_dir):
+    state = StateStore(data_dir / 'state.bin', import_path=data_dir / 'state.json').load(readonly=True)
+    return state or {}
+
+
+def _open_history(data_dir):
+    path = data_dir / 'history.db'
+    if tristar_history.sqlite3 is None or not path.exists():
+        return None
+    return tristar_history.connect(path, readonly=True)
+
+
+def _chunks(rows, size):
+    """Group an iterable of rows into lists of at most size rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _fetch(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield [tuple(row) for row in rows]
+
+
+def export_days(data_dir, from_date, to_date, chunk):
+    """Daily summaries oldest first; days still only in the state (not yet in history.db) are merged in"""
+    fields = tristar_history.DAY_FIELDS
+    columns = [('date', 'str')] + [(name, 'f8') for name in fields]
+    pending = sorted((day['date'], tuple(day.get(name) for name in fields))
+                     for day in _load_state(data_dir).get('history', [])
+                     if day.get('date') and from_date <= day['date'] <= to_date)
+
+    def rows():
+        conn = _open_history(data_dir)
+        if conn is not None:
+            cursor = conn.execute(f"SELECT date, {tristar_history._quoted(fields)} FROM days "
+                                  f"WHERE date >= ? AND date <= ? ORDER BY date", (from_date, to_date))
+            for block in _fetch(cursor, chunk):
+                for row in block:
+                    while pending and pending[0][0] < row[0]:
+                        day, values = pending.pop(0)
+                        yield (day,) + values
+                    if pending and pending[0][0] == row[0]:
+                        pending.pop(0)  # history.db has the day
+                    yield row
+            conn.close()
+        for day, values in pending:
+            yield (day,) + values
+
+    return columns, _chunks(rows(), chunk)
+
+
+def export_rollups(data_dir, from_date, to_date, chunk):
+    """Month and year accumulators whose period overlaps the range"""
+    rollups = _load_state(data_dir).get('rollups', {})
+    entries = [(kind, entry) for kind in ('monthly', 'yearly') for entry in reversed(rollups.get(kind, []))
+               if from_date[:len(entry['period'])] <= entry['period'] <= to_date[:len(entry['period'])]]
+    names = []
+    for _, entry in entries:
+        names.extend(name for name in entry if name != 'period' and name not in names)
+    columns = [('kind', 'str'), ('period', 'str')] + [(name, 'f8') for name in names]
+    rows = ((kind, entry['period']) + tuple(entry.get(name) for name in names) for kind, entry in entries)
+    return columns, _chunks(rows, chunk)
+
+
+def export_samples(data_dir, from_date, to_date, chunk, level='m1'):
+    """history.db rows of one level whose local time falls within the range, oldest first"""
+    tables = ['raw'] + [table for table, _, _, _ in tristar_history.LEVELS]
+    if level not in tables:
+        raise ValueError(f"Unknown level {level} (one of {', '.join(tables)})")
+    names = tristar_history.RAW_COLUMNS if level == 'raw' else tristar_history.ROLLUP_COLUMNS
+    columns = [(name, 'f8') for name in names]
+    start = calendar.timegm(date.fromisoformat(from_date).timetuple()) if from_date else 0
+    end = calendar.timegm(date.fromisoformat(to_date).timetuple()) + 86400 if to_date else 2 ** 40
+    margin = 14 * 3600  # Largest UTC offset: keeps the primary key usable for the range
+
+    def chunks():
+        conn = _open_history(data_dir)
+        if conn is None:
+            return
+        cursor = conn.execute(f"SELECT {tristar_history._quoted(names)} FROM {level} "
+                              f"WHERE t >= ? AND t < ? AND t + tz >= ? AND t + tz < ? ORDER BY t",
+                              (start - margin, end + margin, start, end))
+        yield from _fetch(cursor, chunk)
+        conn.close()
+
+    return columns, chunks()
+
+
+def export_registers(data_dir, from_date, to_date, chunk):
+    """Raw register snapshots from the archive day files within the range (one chunk per block)"""
+    files = [path for path in sorted((data_dir / 'archive').glob(f'*{ARCHIVE_SUFFIX}'))
+             if from_date <= path.stem <= to_date]
+    base = width = None
+    for path in files:
+        for _, base, width, _, _ in read_blocks(path):
+            break
+        if base is not None:
+            break
+    if base is None:
+        return [('t', 'f8')], iter(())
+    columns = [('t', 'f8')] + [(f'r{base + i}', 'u2') for i in range(width)]
+
+    def chunks():
+        for path in files:
+            for _, block_base, block_width, times, registers in read_blocks(path):
+                if (block_base, block_width) != (base, width):
+                    print(f"{path.name}: skipping block with registers {block_base}+{block_width}", file=sys.stderr)
+                    continue
+                yield list(zip(times, *registers))
+
+    return columns, chunks()
+
+
+def write_csv(out, columns, chunks):
+    writer = csv.writer(out)
+    writer.writerow(name for name, _ in columns)
+    for rows in chunks:
+        writer.writerows(['' if value is None else value for value in row] for row in rows)
+
+
+def _column_bytes(kind, values):
+    if kind == 'str':
+        data = '\n'.join('' if value is None else str(value) for value in values).encode()
+        return CHUNK_HEADER.pack(len(data)) + data
+    if kind == 'u2':
+        packed = array('H', values)
+    else:
+        packed = array('d', (math.nan if value is None else value for value in values))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def write_columnar(out, kind, columns, chunks):
+    header = json.dumps({'kind': kind, 'columns': [{'name': name, 'type': type_} for name, type_ in columns]})
+    header = header.encode()
+    out.write(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(header)) + header)
+    for rows in chunks:
+        out.write(CHUNK_HEADER.pack(len(rows)))
+        for (_, type_), values in zip(columns, zip(*rows)):
+            out.write(_column_bytes(type_, values))
+    out.write(CHUNK_HEADER.pack(0))
+
+
+def read_columnar(f):
+    """Yield ({name: list of values}) per chunk of a columnar export (file opened in binary mode)"""
+    magic, version, length = COLUMNAR_HEADER.unpack(f.read(COLUMNAR_HEADER.size))
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError("Not a TSCX columnar export")
+    columns = json.loads(f.read(length))['columns']
+    while True:
+        count, = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+        if not count:
+            return
+        chunk = {}
+        for column in columns:
+            if column['type'] == 'str':
+                size, = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+                chunk[column['name']] = f.read(size).decode().split('\n')
+            else:
+                values = array('H' if column['type'] == 'u2' else 'd')
+                values.frombytes(f.read(values.itemsize * count))
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                chunk[column['name']] = values.tolist()
+        yield chunk
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog=Path(argv[0]).name, description="Export TriStar driver history")
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('--from', dest='from_date', default='', help="first local day (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='to_date', default='', help="last local day, inclusive")
+    parser.add_argument('--format', choices=('csv', 'columnar'), default='csv')
+    parser.add_argument('--level', default='m1', help="samples table: raw, m1, m15 or d1")
+    parser.add_argument('--dir', default=DATA_DIR, help="driver data directory (or a copy)")
+    parser.add_argument('--chunk', type=int, default=1000, help="rows per chunk")
+    parser.add_argument('-o', '--output', help="output file (default stdout)")
+    args = parser.parse_args(argv[1:])
+
+    for value in (args.from_date, args.to_date):
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                parser.error(f"invalid date {value!r}")
+    from_date = args.from_date
+    to_date = args.to_date or '9999-12-31'
+    data_dir = Path(args.dir)
+
+    if args.kind == 'samples':
+        try:
+            columns, chunks = export_samples(data_dir, from_date, args.to_date, args.chunk, args.level)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        exporter = {'days': export_days, 'rollups': export_rollups, 'registers': export_registers}[args.kind]
+        columns, chunks = exporter(data_dir, from_date, to_date, args.chunk)
+
+    if args.format == 'csv':
+        out = open(args.output, 'w', newline='') if args.output else sys.stdout
+        write_csv(out, columns, chunks)
+    else:
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        write_columnar(out, args.kind, columns, chunks)
+    if args.output:
+        out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+"""
+Local time-series history for the TriStar MPPT driver (SQLite)
+
+Standard library only (no D-Bus / Modbus imports), so offline tools can read
+the same database as the driver.
+
+Every decoded poll cycle becomes one row of the raw table. Complete buckets are
+rolled up into coarser tables as soon as a newer row arrives:
+
+    table  bucket      retention    source
+    raw    poll cycle  48 hours     driver
+    m1     1 minute    30 days      raw
+    m15    15 minutes  1 year       m1
+    d1     local day   forever      m15
+
+Rollup rows hold per-field avg (plus min/max for the main measurements), the
+sample count, covered seconds, energy (Wh, integrated from output power),
+seconds with voltage/current override active and the last charge state.
+Bucket boundaries are local time (each row carries its UTC offset), so d1 rows
+are calendar days in the controller's timezone.
+
+All database work happens on one writer thread: samples are queued in memory
+and inserted in one transaction per flush interval. Retention is enforced
+hourly; if the database still exceeds its byte budget the oldest rows of the
+largest finite-retention table are trimmed (d1 is never trimmed).
+
+The days table holds the driver's daily summaries (the state history entry
+written at each midnight rollover), keyed by ISO date and never trimmed, for
+queries beyond the 30 days kept in the state (query_days()).
+"""
+
+import json
+import logging
+import threading
+from pathlib import Path
+from time import monotonic, time
+
+try:
+    import sqlite3
+except ImportError:  # Stripped-down Python builds
+    sqlite3 = None
+
+# Decoded driver fields stored per cycle; MINMAX_FIELDS also keep min/max in rollups
+FIELDS = ('v_bat', 'i_cc', 'v_pv', 'i_pv', 'p_out', 'v_target', 't_bat', 't_hs')
+MINMAX_FIELDS = ('v_bat', 'i_cc', 'v_pv', 'p_out', 't_bat')
+
+OVERRIDE_VOLTAGE = 1  # Override bits of a raw sample
+OVERRIDE_CURRENT = 2
+
+# (table, bucket width seconds, retention seconds or None, source table)
+LEVELS = (
+    ('m1', 60, 30 * 86400, 'raw'),
+    ('m15', 900, 365 * 86400, 'm1'),
+    ('d1', 86400, None, 'm15'),
+)
+RAW_RETENTION = 48 * 3600
+RETENTION_INTERVAL = 3600
+
+ROLLUP_COLUMNS = (('t', 'tz', 'n', 'seconds', 'wh', 'voltage_override_s', 'current_override_s', 'charge_state')
+                  + tuple(f'{name}_avg' for name in FIELDS)
+                  + tuple(f'{name}_{agg}' for name in MINMAX_FIELDS for agg in ('min', 'max')))
+RAW_COLUMNS = ('t', 'tz', 'dt', 'override', 'charge_state') + FIELDS
+
+# Daily summary columns (keys of a state history entry); other keys go to the JSON "extra" column
+DAY_FIELDS = ('yield', 'max_power', 'max_pv_voltage', 'max_battery_voltage', 'min_battery_voltage',
+              'max_battery_current', 'time_bulk', 'time_absorption', 'time_float', 'time_equalize')
+
+
+def bucket_start(t, tz, width):
+    """UTC start of the local-time bucket containing t"""
+    return t - (t + tz) % width
+
+
+def _aggregate(bucket, tz, rows):
+    """Merge rollup-shaped rows (dicts, oldest first) into one rollup row"""
+    n = sum(row['n'] for row in rows)
+    out = {
+        't': bucket,
+        'tz': tz,
+        'n': n,
+        'seconds': sum(row['seconds'] for row in rows),
+        'wh': sum(row['wh'] for row in rows),
+        'voltage_override_s': sum(row['voltage_override_s'] for row in rows),
+        'current_override_s': sum(row['current_override_s'] for row in rows),
+        'charge_state': rows[-1]['charge_state'],
+    }
+    for name in FIELDS:
+        weighted = [(row[f'{name}_avg'], row['n']) for row in rows if row[f'{name}_avg'] is not None]
+        weight = sum(count for _, count in weighted)
+        out[f'{name}_avg'] = sum(value * count for value, count in weighted) / weight if weight else None
+    for name in MINMAX_FIELDS:
+        lows = [row[f'{name}_min'] for row in rows if row[f'{name}_min'] is not None]
+        highs = [row[f'{name}_max'] for row in rows if row[f'{name}_max'] is not None]
+        out[f'{name}_min'] = min(lows) if lows else None
+        out[f'{name}_max'] = max(highs) if highs else None
+    return out
+
+
+def _raw_as_rollup(row):
+    """A raw sample as a one-sample rollup row"""
+    dt = row['dt']
+    p_out = row['p_out']
+    out = {
+        't': row['t'],
+        'tz': row['tz'],
+        'n': 1,
+        'seconds': dt,
+        'wh': p_out * dt / 3600.0 if p_out is not None else 0.0,
+        'voltage_override_s': dt if row['override'] & OVERRIDE_VOLTAGE else 0.0,
+        'current_override_s': dt if row['override'] & OVERRIDE_CURRENT else 0.0,
+        'charge_state': row['charge_state'],
+    }
+    for name in FIELDS:
+        out[f'{name}_avg'] = row[name]
+    for name in MINMAX_FIELDS:
+        out[f'{name}_min'] = out[f'{name}_max'] = row[name]
+    return out
+
+
+def _quoted(names, suffix=''):
+    """Comma-separated quoted column names ("yield" is not a safe bare identifier everywhere)"""
+    return ', '.join('"' + name + '"' + suffix for name in names)
+
+
+def connect(path, readonly=False):
+    """Open the history database (creating the schema unless readonly)"""
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    else:
+        conn = sqlite3.connect(str(path))
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')  # Only effective on a new database
+        conn.execute('PRAGMA journal_mode = WAL')          # Readers never block the writer
+        conn.execute('PRAGMA synchronous = NORMAL')        # fsync at checkpoints, not every commit
+        conn.execute('PRAGMA journal_size_limit = 1048576')
+        conn.execute(f"CREATE TABLE IF NOT EXISTS raw (t INTEGER PRIMARY KEY, tz INTEGER, dt REAL, "
+                     f"override INTEGER, charge_state INTEGER, {', '.join(f'{name} REAL' for name in FIELDS)})")
+        rollup_columns = ', '.join(f'{name} REAL' for name in ROLLUP_COLUMNS[8:])
+        for table, _, _, _ in LEVELS:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (t INTEGER PRIMARY KEY, tz INTEGER, n INTEGER, "
+                         f"seconds REAL, wh REAL, voltage_override_s REAL, current_override_s REAL, "
+                         f"charge_state INTEGER, {rollup_columns})")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS days (date TEXT PRIMARY KEY, "
+                     f"{_quoted(DAY_FIELDS, ' REAL')}, extra TEXT) WITHOUT ROWID")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        conn.commit()
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def query_days(conn, from_date='', to_date='', fields=(), limit=None):
+    """
+    Daily summaries with from_date <= date <= to_date (ISO dates, '' = open end), oldest first
+
+    Returns (fields, [(date, [value, ...]), ...]); fields defaults to DAY_FIELDS,
+    unknown field names raise ValueError. Values missing for a day are None.
+    """
+    fields = tuple(fields) or DAY_FIELDS
+    unknown = [name for name in fields if name not in DAY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown history fields: {', '.join(unknown)}")
+    sql = (f"SELECT date, {_quoted(fields)} FROM days "
+           f"WHERE date >= ? AND date <= ? ORDER BY date")
+    params = [from_date or '', to_date or '9999-99-99']
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return fields, [(row[0], list(row[1:])) for row in conn.execute(sql, params)]
+
+
+class TimeSeriesStore:
+    """
+    Batched SQLite time-series store with rollups, retention and a disk budget
+
+    add() only appends to an in-memory list (safe to call every poll cycle from
+    the main loop); the writer thread inserts pending samples every
+    flush_interval seconds in one transaction and then updates the rollups.
+    Samples further apart than max_gap seconds get dt=0 (a gap, no energy).
+    """
+
+    def __init__(self, path, flush_interval=60, max_bytes=32 * 1024 * 1024, max_gap=60):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_gap = max_gap
+        self.db_bytes = 0         # Used database size after the last retention pass
+        self.rows_written = 0
+        self.trimmed = 0          # Rows deleted to stay within max_bytes
+        self._pending = []
+        self._pending_days = []   # (entry, replace)
+        self._last_t = None
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='timeseries-writer', daemon=True)
+        self._thread.start()
+
+    def add(self, t, tz, values, charge_state, override=0):
+        """Queue one decoded sample (values: dict with FIELDS, None = invalid)"""
+        t = int(t)
+        if self._last_t is not None and t <= self._last_t:
+            return  # Same second or clock stepped back - keep raw timestamps unique and ordered
+        dt = t - self._last_t if self._last_t is not None else 0
+        if dt > self.max_gap:
+            dt = 0
+        self._last_t = t
+        row = (t, tz, dt, override, charge_state) + tuple(values.get(name) for name in FIELDS)
+        with self._cond:
+            self._pending.append(row)
+
+    def add_day(self, entry, replace=True):
+        """Queue one daily summary (state history entry with a 'date'); replace=False keeps an existing row"""
+        with self._cond:
+            self._pending_days.append((dict(entry), replace))
+
+    def stop(self, timeout=None):
+        """Write pending samples, stop the writer thread; False if it did not finish in time"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self):
+        try:
+            conn = connect(self.path)
+        except Exception as e:
+            logging.error(f"Time-series history disabled ({self.path}): {e}")
+            return
+        last_retention = None
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopping, self.flush_interval)
+                    rows, self._pending = self._pending, []
+                    days, self._pending_days = self._pending_days, []
+                    stopping = self._stopping
+                try:
+                    if rows:
+                        self._write(conn, rows)
+                    if days:
+                        self._write_days(conn, days)
+                    if last_retention is None or monotonic() - last_retention >= RETENTION_INTERVAL:
+                        self._enforce_retention(conn)
+                        last_retention = monotonic()
+                except Exception as e:
+                    conn.rollback()
+                    logging.error(f"Error writing time-series history: {e}")
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, rows):
+        with conn:
+            conn.executemany(f"INSERT OR REPLACE INTO raw ({', '.join(RAW_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(RAW_COLUMNS))})", rows)
+            for table, width, _, source in LEVELS:
+                self._rollup(conn, table, width, source)
+        self.rows_written += len(rows)
+
+    @staticmethod
+    def _write_days(conn, days):
+        columns = ('date',) + DAY_FIELDS + ('extra',)
+        with conn:
+            for entry, replace in days:
+                extra = {key: value for key, value in entry.items() if key != 'date' and key not in DAY_FIELDS}
+                values = [entry['date']] + [entry.get(name) for name in DAY_FIELDS] + \
+                    [json.dumps(extra, separators=(',', ':')) if extra else None]
+                conn.execute(f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO days "
+                             f"({_quoted(columns)}) "
+                             f"VALUES ({', '.join('?' * len(columns))})", values)
+
+    @staticmethod
+    def _rollup(conn, table, width, source):
+        """Aggregate the complete buckets of source rows not rolled into table yet"""
+        key = f'rolled_{table}'
+        done = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        done = done[0] if done else 0
+        rows = conn.execute(f"SELECT * FROM {source} WHERE t >= ? ORDER BY t", (done,)).fetchall()
+        if not rows:
+            return
+        if source == 'raw':
+            rows = [_raw_as_rollup(row) for row in rows]
+        newest = rows[-1]
+        open_bucket = bucket_start(newest['t'], newest['tz'], width)
+
+        out = []
+        group = []
+        group_bucket = None
+        for row in rows:
+            bucket = bucket_start(row['t'], row['tz'], width)
+            if bucket >= open_bucket:
+                break  # Still filling
+            if group and bucket != group_bucket:
+                out.append(_aggregate(group_bucket, group[-1]['tz'], group))
+                group = []
+            group_bucket = bucket
+            group.append(row)
+        if not group:
+            return
+        out.append(_aggregate(group_bucket, group[-1]['tz'], group))
+        conn.executemany(f"INSERT OR REPLACE INTO {table} ({', '.join(ROLLUP_COLUMNS)}) "
+                         f"VALUES ({', '.join(':' + name for name in ROLLUP_COLUMNS)})", out)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, group[-1]['t'] + 1))
+
+    def _used_bytes(self, conn):
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        pages = conn.execute('PRAGMA page_count').fetchone()[0] - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return pages * page_size
+
+    def _enforce_retention(self, conn):
+        now = int(time())
+        rolled_raw = conn.execute("SELECT value FROM meta WHERE key = 'rolled_m1'").fetchone()
+        with conn:
+            # Raw rows are only dropped once they are part of a 1-minute rollup
+            conn.execute("DELETE FROM raw WHERE t < ? AND t < ?",
+                         (now - RAW_RETENTION, rolled_raw[0] if rolled_raw else 0))
+            for table, _, retention, _ in LEVELS:
+                if retention is not None:
+                    conn.execute(f"DELETE FROM {table} WHERE t < ?", (now - retention,))
+
+        used = self._used_bytes(conn)
+        over_budget = used
+        trimmed = 0
+        while used > self.max_bytes:
+            # Over budget: drop the oldest 10% of the largest trimmable table
+            counts = [(conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0], table)
+                      for table in ('raw', 'm1', 'm15')]
+            count, table = max(counts)
+            if count < 10:
+                break
+            with conn:
+                conn.execute(f"DELETE FROM {table} WHERE t IN (SELECT t FROM {table} ORDER BY t LIMIT ?)",
+                             (count // 10,))
+            trimmed += count // 10
+            used = self._used_bytes(conn)
+        if trimmed:
+            self.trimmed += trimmed
+            logging.warning(f"History database over budget ({over_budget} > {self.max_bytes} bytes): "
+                            f"trimmed {trimmed} oldest rows")
+
+        conn.execute('PRAGMA incremental_vacuum')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.db_bytes = used
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+
+"""
+D-Bus path schema of the TriStar MPPT driver
+
+Standard library only, shared by dbus_tristar.py and dbus_tristar_mock.py so
+the mock can register the same surface without pymodbus or the storage
+modules. Each row is (path, initial, unit, onchange, group); the process
+name/version rows are filled in by the registering program.
+"""
+
+from collections import namedtuple
+
+PRODUCT_ID = 0xABCD  # Placeholder - can be registered with Victron
+
+# Fault bitfield definitions (REG_FAULTS = 44, REG_FAULTS_DAILY = 73)
+FAULT_BITS = {
+    0: "Overcurrent",
+    1: "FETsShorted",
+    2: "SoftwareBug",
+    3: "BatteryHVD",
+    4: "ArrayHVD",
+    5: "SettingsSwitchChanged",
+    6: "CustomSettingsEdit",
+    7: "RTsShorted",
+    8: "RTsDisconnected",
+    9: "EEPROMRetryLimit",
+    10: "Reserved",
+    11: "SlaveControlTimeout",
+    12: "Fault12",
+    13: "Fault13",
+    14: "Fault14",
+    15: "Fault15"
+}
+
+# Daily flags bitfield definitions (REG_FLAGS_DAILY = 69)
+FLAGS_DAILY_BITS = {
+    0: "ResetDetected",
+    1: "EqualizeTriggered",
+    2: "EnteredFloat",
+    3: "AlarmOccurred",
+    4: "FaultOccurred"
+}
+
+# DIP switch bitfield definitions (REG_DIP_SWITCHES = 48, 8 switches)
+DIP_SWITCH_BITS = {i: f"Switch{i + 1}" for i in range(8)}
+
+# Validated fields -> D-Bus rejection counter name (/Custom/Stats/Rejected/<name>)
+VALIDATED_FIELDS = {
+    'v_bat': 'BatteryVoltage',
+    'v_pv': 'PvVoltage',
+    'i_cc': 'ChargeCurrent',
+    'p_out': 'OutputPower',
+}
+
+
+class UnitFormatter:
+    """Shared gettextcallback rendering a value with its unit suffix (one instance per unit)"""
+    __slots__ = ('unit',)
+
+    def __init__(self, unit):
+        self.unit = unit
+
+    def __call__(self, path, value):
+        return f"{value}{self.unit}"
+
+
+UNIT_FORMATTERS = {unit: UnitFormatter(unit) for unit in
+                   ('V', 'A', 'W', 'kWh', 'Wh', 'Ah', 's', 'min', '%', 'V/C', 'B')}
+
+# One D-Bus path: unit selects a shared UnitFormatter (None = no text callback),
+# onchange names a driver method (makes the path writeable), group is used by
+# docs/mock/tests to select subsets of the surface.
+DbusPath = namedtuple('DbusPath', 'path initial unit onchange group')
+
+# Per-day history fields: (path suffix, state['history'] key, unit, default)
+HISTORY_DAY_FIELDS = (
+    ('Yield', 'yield', 'kWh', 0.0),
+    ('MaxPower', 'max_power', 'W', 0),
+    ('MaxPvVoltage', 'max_pv_voltage', 'V', 0.0),
+    ('MaxBatteryVoltage', 'max_battery_voltage', 'V', 0.0),
+    ('MinBatteryVoltage', 'min_battery_voltage', 'V', 0.0),
+    ('MaxBatteryCurrent', 'max_battery_current', 'A', 0.0),
+    ('TimeInBulk', 'time_bulk', None, 0),
+    ('TimeInAbsorption', 'time_absorption', None, 0),
+    ('TimeInFloat', 'time_float', None, 0),
+    ('TimeInEqualize', 'time_equalize', None, 0),
+)
+
+
+# Month/year accumulators of finished days: (path suffix, key, unit, how a day is folded in)
+ROLLUP_FIELDS = (
+    ('Days', 'days', None, 'count'),
+    ('Yield', 'yield', 'kWh', 'sum'),
+    ('MaxPower', 'max_power', 'W', 'max'),
+    ('MaxPvVoltage', 'max_pv_voltage', 'V', 'max'),
+    ('MaxBatteryVoltage', 'max_battery_voltage', 'V', 'max'),
+    ('MinBatteryVoltage', 'min_battery_voltage', 'V', 'min'),
+    ('MaxBatteryCurrent', 'max_battery_current', 'A', 'max'),
+    ('TimeInBulk', 'time_bulk', 'min', 'sum'),
+    ('TimeInAbsorption', 'time_absorption', 'min', 'sum'),
+    ('TimeInFloat', 'time_float', 'min', 'sum'),
+    ('TimeInEqualize', 'time_equalize', 'min', 'sum'),
+    ('OverrideTime', 'override_seconds', 's', 'sum'),
+    ('FaultCount', 'fault_count', None, 'sum'),
+)
+
+# (path segment, state['rollups'] key, length of the date prefix naming a period, periods kept)
+ROLLUP_PERIODS = (
+    ('Monthly', 'monthly', 7, 24),
+    ('Yearly', 'yearly', 4, None),
+)
+ROLLUP_PUBLISHED = 2  # /Custom/History/<Monthly|Yearly>/0 = latest period, /1 = the one before
+
+
+def rollup_paths():
+    """Schema rows for /Custom/History/<Monthly|Yearly>/<0..ROLLUP_PUBLISHED-1>/*"""
+    return [DbusPath(f'/Custom/History/{segment}/{index}/{name}', None, unit, None, 'history_rollup')
+            for segment, _, _, _ in ROLLUP_PERIODS
+            for index in range(ROLLUP_PUBLISHED)
+            for name, _, unit, _ in (('Period', None, None, None),) + ROLLUP_FIELDS]
+
+
+def hourly_paths():
+    """Schema rows for today's hourly yield bins and the per-hour-of-day average"""
+    return ([DbusPath(f'/Custom/Hourly/Today/{hour}', 0.0, 'Wh', None, 'hourly') for hour in range(24)]
+            + [DbusPath(f'/Custom/Hourly/Average/{hour}', None, 'Wh', None, 'hourly') for hour in range(24)]
+            + [DbusPath('/Custom/Hourly/AverageDays', 0, None, None, 'hourly')])
+
+
+def history_day_paths(day_index):
+    """
+    Schema rows for /History/Daily/<day_index>/*
+
+    Day 0 (today, live values) starts at the field defaults; days 1-30 start
+    empty (None) until their stored values are published.
+    """
+    return [DbusPath(f'/History/Daily/{day_index}/{name}',
+                     default if day_index == 0 else None, unit, None, 'history_daily')
+            for name, key, unit, default in HISTORY_DAY_FIELDS]
+
+
+DBUS_PATHS = [
+    # Management
+    DbusPath('/Mgmt/ProcessName', '', None, None, 'mgmt'),
+    DbusPath('/Mgmt/ProcessVersion', '', None, None, 'mgmt'),
+    DbusPath('/Mgmt/Connection', 'Modbus TCP', None, None, 'mgmt'),
+
+    # Device info
+    DbusPath('/ProductId', PRODUCT_ID, None, None, 'device'),
+    DbusPath('/ProductName', '', None, None, 'device'),
+    DbusPath('/FirmwareVersion', 0, None, None, 'device'),
+    DbusPath('/HardwareVersion', '', None, None, 'device'),
+    DbusPath('/Serial', '', None, None, 'device'),
+    DbusPath('/DeviceInstance', 0, None, None, 'device'),
+    DbusPath('/Connected', 0, None, None, 'device'),
+    DbusPath('/Mode', 1, None, '_on_mode_change', 'device'),  # 1=On, 4=Off
+    DbusPath('/ErrorCode', 0, None, None, 'device'),
+    DbusPath('/NrOfTrackers', 1, None, None, 'device'),  # TriStar MPPT 60 is single-tracker
+
+    # PV array (/Pv/I is deprecated since v2.80 - GUI calculates current from /Yield/Power / /Pv/V)
+    DbusPath('/Pv/V', 0.0, 'V', None, 'pv'),
+
+    # Battery
+    DbusPath('/Dc/0/Voltage', 0.0, 'V', None, 'battery'),
+    DbusPath('/Dc/0/Current', 0.0, 'A', None, 'battery'),
+    DbusPath('/Dc/0/Temperature', 0.0, None, None, 'battery'),
+
+    # Power and state
+    DbusPath('/Yield/Power', 0, 'W', None, 'state'),
+    DbusPath('/State', 0, None, None, 'state'),
+    DbusPath('/MppOperationMode', 0, None, None, 'state'),  # 0=Off, 1=Voltage/Current limited, 2=MPPT active
+
+    # History - Overall (lifetime) - Values updated from state in update loop
+    DbusPath('/History/Overall/DaysAvailable', 1, None, None, 'history_overall'),
+    DbusPath('/History/Overall/MaxPvVoltage', 0.0, 'V', None, 'history_overall'),
+    DbusPath('/History/Overall/MaxBatteryVoltage', 0.0, 'V', None, 'history_overall'),
+    DbusPath('/History/Overall/MinBatteryVoltage', 0.0, 'V', None, 'history_overall'),
+    DbusPath('/History/Overall/LastError1', 0, None, None, 'history_overall'),  # Error history not yet implemented
+    DbusPath('/History/Overall/LastError2', 0, None, None, 'history_overall'),
+    DbusPath('/History/Overall/LastError3', 0, None, None, 'history_overall'),
+    DbusPath('/History/Overall/LastError4', 0, None, None, 'history_overall'),
+
+    # History - Day 0 (today, live values) - always created
+    # Days 1-30 are created dynamically as history accumulates, so Venus OS
+    # doesn't think we have 31 days of data when we don't
+    *history_day_paths(0),
+
+    # Month/year accumulators (latest two periods each)
+    *rollup_paths(),
+
+    # Hourly production profile
+    *hourly_paths(),
+
+    # Total yield
+    DbusPath('/Yield/User', 0.0, 'kWh', None, 'yield'),
+    DbusPath('/Yield/System', 0.0, 'kWh', None, 'yield'),
+
+    # Control (coils) - writable
+    DbusPath('/Control/EqualizeTriggered', 0, None, '_on_coil_write', 'control'),
+    DbusPath('/Control/ChargerDisconnect', 0, None, '_on_coil_write', 'control'),
+    DbusPath('/Control/ResetController', 0, None, '_on_coil_write', 'control'),
+    DbusPath('/Control/ResetCommServer', 0, None, '_on_coil_write', 'control'),
+
+    # Voltage override control - writable (non-persistent, starts at 0)
+    DbusPath('/Control/VoltageOverride', 0.0, 'V', '_on_voltage_override_write', 'control'),
+
+    # Statistics for diagnostics and health monitoring
+    DbusPath('/Custom/Stats/SuccessfulReads', 0, None, None, 'stats'),
+    DbusPath('/Custom/Stats/FailedReads', 0, None, None, 'stats'),
+    DbusPath('/Custom/Stats/ConsecutiveFailures', 0, None, None, 'stats'),
+    DbusPath('/Custom/Stats/LastSuccessTime', 0, None, None, 'stats'),  # Unix timestamp
+    DbusPath('/Custom/Stats/BackoffFactor', 1, None, None, 'stats'),  # Poll interval multiplier
+    DbusPath('/Custom/Stats/Storage/WritesToday', 0, None, None, 'stats'),  # State file writes (flash wear)
+    DbusPath('/Custom/Stats/Storage/BytesWrittenToday', 0, 'B', None, 'stats'),
+    DbusPath('/Custom/Stats/Storage/SkippedSaves', 0, None, None, 'stats'),  # Saves with nothing meaningful changed
+    DbusPath('/Custom/Stats/Storage/Compactions', 0, None, None, 'stats'),
+    *(DbusPath(f'/Custom/Stats/Rejected/{name}', 0, None, None, 'stats') for name in VALIDATED_FIELDS.values()),
+
+    # TriStar-specific charge state (raw values from TriStar)
+    DbusPath('/Custom/ChargeState', None, None, None, 'custom'),  # Raw TriStar charge state (0-9)
+    DbusPath('/Custom/ChargeStateText', None, None, None, 'custom'),
+    DbusPath('/Custom/TargetRegulationVoltage', 0.0, 'V', None, 'custom'),
+
+    # Voltage override monitoring
+    DbusPath('/Custom/VoltageOverride/ExcessPower', 0, 'W', None, 'voltage_override'),
+    DbusPath('/Custom/VoltageOverride/Active', False, None, None, 'voltage_override'),
+    DbusPath('/Custom/VoltageOverride/TimeAtTargetVoltage', 0, None, None, 'voltage_override'),  # Seconds
+    DbusPath('/Custom/VoltageOverride/TailCurrentTimer', 0, None, None, 'voltage_override'),  # Seconds
+    DbusPath('/Custom/VoltageOverride/StopReason', "", None, None, 'voltage_override'),  # TimeLimit/BatteryFull/UserDisabled
+    DbusPath('/Custom/VoltageOverride/BalanceComplete', False, None, None, 'voltage_override'),
+    DbusPath('/Custom/VoltageOverride/LastBalanceTimestamp', '', None, None, 'voltage_override'),
+    DbusPath('/Custom/VoltageOverride/CurrentVoltage', 0.0, 'V', None, 'voltage_override'),
+    DbusPath('/Custom/VoltageOverride/RegisterReadback', 0.0, 'V', None, 'voltage_override'),  # PDU 89 (vb_ref_slave)
+
+    # Current override control and monitoring (PDU register 88 - Ib_ref_slave, Logical 89)
+    DbusPath('/Control/CurrentOverride', 0.0, 'A', '_on_current_override_write', 'control'),
+    DbusPath('/Custom/CurrentOverride/Active', False, None, None, 'current_override'),
+    DbusPath('/Custom/CurrentOverride/CurrentValue', 0.0, 'A', None, 'current_override'),
+    DbusPath('/Custom/CurrentOverride/RegisterReadback', 0.0, 'A', None, 'current_override'),  # PDU 88 (Ib_ref_slave)
+
+    # Manual control register monitoring (registers that might interfere with slave mode)
+    DbusPath('/Custom/ManualControl/VaRefFixed', 0.0, 'V', None, 'custom'),  # Register 91 - Array voltage fixed target
+    DbusPath('/Custom/ManualControl/VaRefFixedPct', 0, '%', None, 'custom'),  # Register 92 - Array voltage % of Voc
+
+    # Battery diagnostics
+    DbusPath('/Custom/Battery/TerminalVoltage', 0.0, 'V', None, 'custom'),
+    DbusPath('/Custom/Battery/SenseVoltage', 0.0, 'V', None, 'custom'),
+    DbusPath('/Custom/Battery/CurrentFast', 0.0, 'A', None, 'custom'),
+    DbusPath('/Custom/Battery/VoltageSlow', 0.0, 'V', None, 'custom'),
+
+    # EEPROM charge settings (configured absorption/equalize voltages and limits)
+    DbusPath('/Custom/EEPROM/AbsorptionVoltage', 0.0, 'V', None, 'eeprom'),
+    DbusPath('/Custom/EEPROM/FloatVoltage', 0.0, 'V', None, 'eeprom'),
+    DbusPath('/Custom/EEPROM/AbsorptionTime', 0, 's', None, 'eeprom'),
+    DbusPath('/Custom/EEPROM/FloatExitTime', 0, 's', None, 'eeprom'),
+    DbusPath('/Custom/EEPROM/EqualizeVoltage', 0.0, 'V', None, 'eeprom'),
+    DbusPath('/Custom/EEPROM/TempCompensation', 0.0, 'V/C', None, 'eeprom'),
+    DbusPath('/Custom/EEPROM/MaxRegulationLimit', 0.0, 'V', None, 'eeprom'),
+
+    # Charge profile management (EEPROM profile apply control and status)
+    DbusPath('/Control/ApplyChargeProfile', '', None, '_on_apply_profile_requested', 'control'),
+    DbusPath('/Custom/ChargeProfile/ApplyStatus', 'idle', None, None, 'charge_profile'),
+    DbusPath('/Custom/ChargeProfile/LastApplied', '', None, None, 'charge_profile'),
+    DbusPath('/Custom/ChargeProfile/StatusDetail', '', None, None, 'charge_profile'),
+    DbusPath('/Custom/ChargeProfile/ProgressPercent', 0, None, None, 'charge_profile'),
+    DbusPath('/Custom/ChargeProfile/PlannedVisitSOC', 0, '%', None, 'charge_profile'),
+
+    # Season tracking (read-only display)
+    DbusPath('/Custom/Season/CurrentSeason', '', None, None, 'charge_profile'),
+    DbusPath('/Custom/Season/ActiveProfile', '', None, None, 'charge_profile'),
+
+    # EEPROM lifetime charge counters (TriStar's internal counters)
+    DbusPath('/Custom/EEPROM/ChargeKwhResetable', 0.0, 'kWh', None, 'eeprom'),
+    DbusPath('/Custom/EEPROM/ChargeKwhTotal', 0.0, 'kWh', None, 'eeprom'),
+
+    # Internal power supply monitoring
+    DbusPath('/Custom/InternalSupply/Rail12V', 0.0, 'V', None, 'custom'),
+    DbusPath('/Custom/InternalSupply/Rail3V', 0.0, 'V', None, 'custom'),
+    DbusPath('/Custom/InternalSupply/MeterBusV', 0.0, 'V', None, 'custom'),
+    DbusPath('/Custom/InternalSupply/Rail1V8', 0.0, 'V', None, 'custom'),
+    DbusPath('/Custom/InternalSupply/Vref', 0.0, 'V', None, 'custom'),
+
+    # Temperature sensors
+    DbusPath('/Custom/Temperature/Heatsink', 0.0, None, None, 'custom'),
+    DbusPath('/Custom/Temperature/RTS', 0.0, None, None, 'custom'),
+
+    # Min/Max tracking
+    DbusPath('/Custom/MinMax/MinBatteryVoltage', 0.0, 'V', None, 'custom'),
+    DbusPath('/Custom/MinMax/MaxBatteryVoltage', 0.0, 'V', None, 'custom'),
+
+    # Diagnostic bitfields (raw + decoded)
+    DbusPath('/Custom/Faults/Bitfield', None, None, None, 'bitfields'),
+    DbusPath('/Custom/DipSwitches/Bitfield', None, None, None, 'bitfields'),
+    DbusPath('/Custom/Led/State', None, None, None, 'bitfields'),
+    *(DbusPath(f'/Custom/Faults/{name}', None, None, None, 'bitfields') for name in FAULT_BITS.values()),
+    *(DbusPath(f'/Custom/DipSwitches/{name}', None, None, None, 'bitfields') for name in DIP_SWITCH_BITS.values()),
+    DbusPath('/Custom/Faults/EventCount', 0, None, None, 'bitfields'),  # Transitions logged since install
+    DbusPath('/Custom/Faults/LastEvent', '', None, None, 'bitfields'),  # "<time> <field> set=0x.. cleared=0x.."
+
+    # PV/MPPT data
+    DbusPath('/Custom/Pv/PowerInputShadow', 0, 'W', None, 'custom'),
+    DbusPath('/Custom/MPPT/LastSweep/Pmax', 0, 'W', None, 'custom'),
+    DbusPath('/Custom/MPPT/LastSweep/Vmp', 0.0, 'V', None, 'custom'),
+    DbusPath('/Custom/MPPT/LastSweep/Voc', 0.0, 'V', None, 'custom'),
+
+    # Daily history
+    DbusPath('/Custom/Daily/ChargeAh', 0.0, 'Ah', None, 'daily'),
+    DbusPath('/Custom/Daily/ChargeWh', 0, 'Wh', None, 'daily'),  # Raw Modbus REG_WHC_DAILY
+    DbusPath('/Custom/Daily/FlagsBitfield', None, None, None, 'daily'),
+    DbusPath('/Custom/Daily/MinBatteryTemperature', 0.0, None, None, 'daily'),
+    DbusPath('/Custom/Daily/MaxBatteryTemperature', 0.0, None, None, 'daily'),
+    DbusPath('/Custom/Daily/FaultsBitfield', None, None, None, 'daily'),
+    DbusPath('/Custom/Daily/TimeInEqualize', 0, 'min', None, 'daily'),
+    *(DbusPath(f'/Custom/Daily/Flags/{name}', None, None, None, 'bitfields') for name in FLAGS_DAILY_BITS.values()),
+    *(DbusPath(f'/Custom/Daily/Faults/{name}', None, None, None, 'bitfields') for name in FAULT_BITS.values()),
+]
+
+
+def register_dbus_paths(service, entries, owner=None, initial=None):
+    """
+    Register schema rows on a (not yet registered) D-Bus service in one pass
+
+    Text callbacks are the shared UNIT_FORMATTERS instances (no per-path closures).
+    onchange method names are resolved on owner; rows whose method owner doesn't
+    provide (e.g. the mock driver) are registered read-only.
+    """
+    initial = initial or {}
+    for entry in entries:
+        callback = getattr(owner, entry.onchange, None) if entry.onchange else None
+        service.add_path(
+            entry.path,
+            initial.get(entry.path, entry.initial),
+            writeable=callback is not None,
+            onchangecallback=callback,
+            gettextcallback=UNIT_FORMATTERS[entry.unit] if entry.unit else None,
+        )
@@ -0,0 +1,776 @@
+#!/usr/bin/env python3
+
+"""
+Persistent state storage for the TriStar MPPT driver
+
+Standard library only (no D-Bus / Modbus imports), so offline tools can read
+the same files as the driver.
+
+State is kept as a binary snapshot (state.bin) plus an append-only journal
+(state.journal) of small delta records:
+
+    record  = u32 payload length, u32 crc32(payload), payload
+    payload = compact JSON {"s": [[key path, value], ...], "d": [key path, ...]}
+
+The first record of a journal is a header {"generation": N}; the journal is only
+replayed on top of a snapshot of the same generation. Compaction writes a new
+snapshot with generation N+1 and then starts a fresh journal, so a crash between
+the two steps can never replay stale deltas. A torn or corrupt tail record
+(power loss mid-append) ends replay and is truncated away.
+
+Snapshot layout (little endian):
+
+    header  = magic "TSST", u16 layout version, u16 state version,
+              u32 generation, u32 crc32(body), u32 body length
+    body    = fixed fields (STATE_LAYOUTS[state version][0], one struct)
+              u16 day count, day records (STATE_LAYOUTS[state version][1])
+              u32 length, zlib(JSON of everything else)
+
+A state.json (older driver releases, or written by hand with "dump") is imported
+when there is no state.bin or it is newer than state.bin. Loaded states are
+upgraded step by step through MIGRATIONS to STATE_VERSION.
+
+Command line (driver stopped): tristar_storage.py dump [state dir]
+"""
+
+import copy
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import zlib
+from pathlib import Path
+from time import monotonic
+
+RECORD_HEADER = struct.Struct('<II')  # payload length, crc32
+GENERATION_KEY = '_journal_generation'
+_MISSING = object()
+
+STATE_VERSION = 4
+STATE_MAGIC = b'TSST'
+STATE_LAYOUT_VERSION = 1
+STATE_HEADER = struct.Struct('<4sHHIII')  # magic, layout version, state version, generation, crc32, body length
+HISTORY_COUNT = struct.Struct('<H')
+EXTRAS_LENGTH = struct.Struct('<I')
+
+# Fixed binary fields per state version: ((key path, struct code, default), ...) for the
+# top-level state and for one history day. '10s' is an ISO date (None stored empty).
+# Values a field can't hold exactly (wrong type, out of range) stay in the JSON extras.
+_V2_STATE_FIELDS = (
+    (('total_yield_kwh',), 'd', 0.0),
+    (('daily_wh_offset',), 'd', 0.0),
+    (('time_abs_offset',), 'i', 0),
+    (('time_float_offset',), 'i', 0),
+    (('time_eq_offset',), 'i', 0),
+    (('daily_register_has_reset',), '?', True),
+    (('current_date',), '10s', None),
+    (('today', 'yield'), 'd', 0.0),
+    (('today', 'max_battery_current'), 'd', 0.0),
+    (('today', 'max_power'), 'd', 0.0),
+    (('today', 'max_pv_voltage'), 'd', 0.0),
+    (('today', 'max_battery_voltage'), 'd', 0.0),
+    (('today', 'min_battery_voltage'), 'd', 999.0),
+    (('today', 'time_bulk'), 'i', 0),
+    (('today', 'time_absorption'), 'i', 0),
+    (('today', 'time_float'), 'i', 0),
+    (('today', 'time_equalize'), 'i', 0),
+    (('lifetime', 'max_pv_voltage'), 'd', 0.0),
+    (('lifetime', 'max_battery_voltage'), 'd', 0.0),
+    (('lifetime', 'min_battery_voltage'), 'd', 999.0),
+)
+_V2_DAY_FIELDS = (
+    (('date',), '10s', None),
+    (('yield',), 'd', 0.0),
+    (('max_power',), 'd', 0.0),
+    (('max_pv_voltage',), 'd', 0.0),
+    (('max_battery_voltage',), 'd', 0.0),
+    (('min_battery_voltage',), 'd', 0.0),
+    (('max_battery_current',), 'd', 0.0),
+    (('time_bulk',), 'i', 0),
+    (('time_absorption',), 'i', 0),
+    (('time_float',), 'i', 0),
+    (('time_equalize',), 'i', 0),
+)
+STATE_LAYOUTS = {
+    2: (_V2_STATE_FIELDS, _V2_DAY_FIELDS),
+    3: (
+        _V2_STATE_FIELDS + (
+            (('today', 'override_seconds'), 'd', 0.0),
+            (('today', 'fault_count'), 'i', 0),
+        ),
+        _V2_DAY_FIELDS + (
+            (('override_seconds',), 'd', 0.0),
+            (('fault_count',), 'i', 0),
+        ),
+    ),
+}
+STATE_LAYOUTS[4] = STATE_LAYOUTS[3]  # Version 4 only adds lists (kept in the extras)
+
+
+def fresh_state(current_date):
+    """Empty state of the current version (also the defaults migrations fill in)"""
+    return {
+        "version": STATE_VERSION,
+        "total_yield_kwh": 0.0,
+        "last_update": "",
+        "current_date": current_date,
+        "daily_register_has_reset": True,  # Assume Modbus valid initially
+        "daily_wh_offset": 0.0,  # Offset for controller resets before midnight
+        "time_abs_offset": 0,    # Absorption time before last controller reset
+        "time_float_offset": 0,  # Float time before last controller reset
+        "time_eq_offset": 0,     # Equalize time before last controller reset
+        "today": {
+            "yield": 0.0,
+            "max_battery_current": 0.0,
+            "max_power": 0.0,
+            "max_pv_voltage": 0.0,
+            "max_battery_voltage": 0.0,
+            "min_battery_voltage": 999.0,
+            "time_bulk": 0,
+            "time_absorption": 0,
+            "time_float": 0,
+            "time_equalize": 0,
+            "override_seconds": 0.0,  # Seconds with voltage/current override active
+            "fault_count": 0,         # Fault bitfield transitions that set a fault bit
+            "hourly_wh": [0.0] * 24   # Yield per local hour of the day
+        },
+        "history": [],  # Will grow to 30 days (Day 1-30)
+        "lifetime": {
+            "max_pv_voltage": 0.0,
+            "max_battery_voltage": 0.0,
+            "min_battery_voltage": 999.0  # High initial value so first real value will be lower
+        },
+        "voltage_override": {
+            "time_used_today": 0,         # Seconds at override voltage today
+            "current_date": current_date, # Date for midnight reset
+            "stop_reason": "",            # Last stop reason
+            "last_balance_timestamp": ""  # ISO timestamp of last BatteryFull stop
+        },
+        "active_profile": "",       # Last successfully applied charge profile
+        "last_known_season": "",    # Season at last profile auto-switch check
+        "bitfields": {},            # Last diagnostic bitfield words
+        "fault_events": [],         # Bitfield transition log
+        "fault_event_count": 0,
+        "storage_wear": {"date": "", "writes": 0, "bytes": 0},
+        "rollups": {"monthly": [], "yearly": []}  # Month/year accumulators of finished days, newest first
+    }
+
+
+def _fill_defaults(state, defaults):
+    """Add keys missing from state (recursively for dicts), keeping existing values"""
+    for key, value in defaults.items():
+        if key not in state:
+            state[key] = copy.deepcopy(value)
+        elif isinstance(value, dict) and value and isinstance(state[key], dict):
+            _fill_defaults(state[key], value)
+
+
+def _fill_fields(state, fields):
+    """Add missing fixed-layout fields ((key path, struct code, default), ...), keeping existing values"""
+    for path, code, default in fields:
+        node = state
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        if isinstance(node, dict):
+            node.setdefault(path[-1], default)
+
+
+def _fill_keys(state, keys):
+    """Add missing top-level keys with their fresh_state() defaults (subtrees no later version extends)"""
+    fresh = fresh_state(state.get('current_date'))
+    _fill_defaults(state, {key: fresh[key] for key in keys})
+
+
+def _migrate_v0(state):
+    """Unversioned state (before the version field): same layout as version 1"""
+    state.setdefault('history', [])
+
+
+def _migrate_v1(state):
+    """Version 1 -> 2: keys that driver releases used to backfill at startup"""
+    _fill_fields(state, STATE_LAYOUTS[2][0])
+    _fill_keys(state, ('voltage_override', 'active_profile', 'last_known_season',
+                       'bitfields', 'fault_events', 'fault_event_count', 'storage_wear'))
+
+
+def _migrate_v2(state):
+    """Version 2 -> 3: month/year rollups, today's override seconds and fault count"""
+    _fill_fields(state, STATE_LAYOUTS[3][0][len(STATE_LAYOUTS[2][0]):])
+    _fill_keys(state, ('rollups',))
+
+
+def _migrate_v3(state):
+    """Version 3 -> 4: today's hourly yield bins"""
+    state['today'].setdefault('hourly_wh', [0.0] * 24)
+
+
+# version -> function upgrading a state dict of that version in place to version + 1.
+# Each step adds only what its version introduced; fresh_state() is the current layout.
+MIGRATIONS = {
+    0: _migrate_v0,
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+}
+
+
+def migrate_state(state):
+    """Upgrade a loaded state dict in place to STATE_VERSION; returns the version it had"""
+    version = state.get('version', 0)
+    if not isinstance(version, int) or version > STATE_VERSION:
+        raise ValueError(f"State version {version!r} is not supported (driver has {STATE_VERSION})")
+    loaded_version = version
+    while version < STATE_VERSION:
+        MIGRATIONS[version](state)
+        version += 1
+        state['version'] = version
+    return loaded_version
+
+
+def _pack_value(code, value):
+    """Value as stored in a fixed field, or _MISSING if the field can't hold it exactly"""
+    if code == 'd':
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif code == 'i':
+        if isinstance(value, int) and not isinstance(value, bool) and -2**31 <= value < 2**31:
+            return value
+    elif code == '?':
+        if isinstance(value, bool):
+            return value
+    elif value is None:
+        return b''
+    elif isinstance(value, str) and value and value.isascii() and '\0' not in value and len(value) <= 10:
+        return value.encode()
+    return _MISSING
+
+
+def _unpack_value(code, raw):
+    if code == '10s':
+        return raw.rstrip(b'\0').decode() or None
+    return raw
+
+
+def _pop_fields(rest, fields):
+    """Remove the fixed fields from a (copied) state dict; returns their packed values"""
+    values = []
+    for path, code, default in fields:
+        node = rest
+        for key in path[:-1]:
+            node = node.get(key)
+            if not isinstance(node, dict):
+                node = None
+                break
+        value = node.get(path[-1], _MISSING) if node is not None else _MISSING
+        packed = _pack_value(code, value) if value is not _MISSING else _MISSING
+        if packed is _MISSING:
+            packed = _pack_value(code, default)
+        else:
+            del node[path[-1]]
+            if not node and len(path) > 1:
+                rest.pop(path[0], None)  # Parent only held fixed fields
+        values.append(packed)
+    return values
+
+
+def _set_fields(state, fields, values):
+    for (path, code, _), raw in zip(fields, values):
+        node = state
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = _unpack_value(code, raw)
+
+
+def _merge(state, extras):
+    """Overlay the JSON extras onto the state rebuilt from the fixed fields"""
+    for key, value in extras.items():
+        if isinstance(value, dict) and isinstance(state.get(key), dict):
+            _merge(state[key], value)
+        else:
+            state[key] = value
+
+
+def _layout_structs(version):
+    fields, day_fields = STATE_LAYOUTS[version]
+    return (fields, struct.Struct('<' + ''.join(code for _, code, _ in fields)),
+            day_fields, struct.Struct('<' + ''.join(code for _, code, _ in day_fields)))
+
+
+def encode_state(state, generation=0):
+    """Serialize a STATE_VERSION state dict to the binary snapshot format"""
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"Can only encode state version {STATE_VERSION}, got {state.get('version')!r}")
+    fields, fixed, day_fields, day = _layout_structs(STATE_VERSION)
+    rest = copy.deepcopy(state)
+    del rest['version']
+    parts = [fixed.pack(*_pop_fields(rest, fields))]
+
+    history = rest.pop('history', [])
+    if not isinstance(history, list) or not all(isinstance(entry, dict) for entry in history):
+        rest['history'] = history  # Unexpected shape: keep it all in the extras
+        history = []
+    history = history[:0xFFFF]
+    parts.append(HISTORY_COUNT.pack(len(history)))
+    for entry in history:
+        parts.append(day.pack(*_pop_fields(entry, day_fields)))
+    if any(history):
+        rest['history'] = history  # Per-day leftovers (fields without a fixed slot)
+
+    extras = zlib.compress(json.dumps(rest, separators=(',', ':')).encode())
+    parts.append(EXTRAS_LENGTH.pack(len(extras)))
+    parts.append(extras)
+    body = b''.join(parts)
+    return STATE_HEADER.pack(STATE_MAGIC, STATE_LAYOUT_VERSION, STATE_VERSION, generation,
+                             zlib.crc32(body), len(body)) + body
+
+
+def decode_state(data):
+    """Parse a binary snapshot; returns (state dict, generation). Raises ValueError if invalid."""
+    if len(data) < STATE_HEADER.size:
+        raise ValueError("State snapshot is truncated")
+    magic, layout, version, generation, crc, length = STATE_HEADER.unpack_from(data)
+    body = data[STATE_HEADER.size:STATE_HEADER.size + length]
+    if magic != STATE_MAGIC or layout != STATE_LAYOUT_VERSION:
+        raise ValueError(f"Not a state snapshot (magic {magic!r}, layout {layout})")
+    if len(body) != length or zlib.crc32(body) != crc:
+        raise ValueError("State snapshot is truncated or corrupt (crc mismatch)")
+    if version not in STATE_LAYOUTS:
+        raise ValueError(f"State snapshot version {version} is not supported (driver has {STATE_VERSION})")
+
+    fields, fixed, day_fields, day = _layout_structs(version)
+    state = {'version': version}
+    _set_fields(state, fields, fixed.unpack_from(body))
+    offset = fixed.size
+    (count,) = HISTORY_COUNT.unpack_from(body, offset)
+    offset += HISTORY_COUNT.size
+    history = []
+    for _ in range(count):
+        entry = {}
+        _set_fields(entry, day_fields, day.unpack_from(body, offset))
+        history.append(entry)
+        offset += day.size
+    state['history'] = history
+
+    (extras_length,) = EXTRAS_LENGTH.unpack_from(body, offset)
+    offset += EXTRAS_LENGTH.size
+    extras = json.loads(zlib.decompress(body[offset:offset + extras_length]))
+    leftovers = extras.pop('history', None)
+    if isinstance(leftovers, list) and len(leftovers) == count:
+        for entry, rest in zip(history, leftovers):
+            entry.update(rest)
+    elif leftovers is not None:
+        extras['history'] = leftovers
+    _merge(state, extras)
+    return state, generation
+
+
+def _flatten(state, prefix=(), vectors=frozenset()):
+    """
+    Flatten nested dicts into {key path tuple: leaf value}
+
+    Lists (history, event logs) and empty dicts are leaves; they are copied so
+    later in-place changes to the live state still show up as differences.
+    Lists at a key path in vectors (fixed-length numeric bins) are flattened
+    per element instead, key path + (index,), so one changed bin is one leaf.
+    """
+    flat = {}
+    for key, value in state.items():
+        path = prefix + (key,)
+        if isinstance(value, dict) and value:
+            flat.update(_flatten(value, path, vectors))
+        elif isinstance(value, list) and path in vectors:
+            flat.update((path + (index,), item) for index, item in enumerate(value))
+        elif isinstance(value, (list, dict)):
+            flat[path] = copy.deepcopy(value)
+        else:
+            flat[path] = value
+    return flat
+
+
+def _apply_delta(state, delta):
+    """
+    Apply one journal payload to a nested state dict in place (deletions first)
+
+    An integer last key addresses an element of a vector list (see _flatten):
+    setting it assigns or appends, deleting it truncates the list there.
+    """
+    for path in delta.get('d', ()):
+        node = state
+        for key in path[:-1]:
+            node = node.get(key) if isinstance(node, dict) else None
+        if isinstance(node, list) and isinstance(path[-1], int):
+            del node[path[-1]:]
+        elif isinstance(node, dict):
+            node.pop(path[-1], None)
+    for path, value in delta.get('s', ()):
+        node = state
+        for key, next_key in zip(path[:-1], path[1:]):
+            container = list if isinstance(next_key, int) else dict
+            child = node.get(key)
+            if not isinstance(child, container):
+                child = node[key] = container()
+            node = child
+        key = path[-1]
+        if not isinstance(node, list):
+            node[key] = value
+        elif key < len(node):
+            node[key] = value
+        elif key == len(node):
+            node.append(value)
+
+
+def encode_record(payload):
+    """Frame one journal payload (dict) as length + crc32 + compact JSON"""
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    return RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def read_records(journal_path):
+    """
+    Yield (offset, end, payload) for every intact record of a journal file
+
+    Stops at the first truncated or corrupt record; the end of the last
+    yielded record is where a torn tail starts.
+    """
+    try:
+        with open(journal_path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return
+
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            return
+        try:
+            record = json.loads(payload)
+        except ValueError:
+            return
+        yield offset, start + length, record
+        offset = start + length
+
+
+class StateStore:
+    """
+    Snapshot + append-only journal persistence for the driver state dict
+
+    save() appends only the fields that changed since the last save (cheap
+    enough to call every poll cycle); compact() rewrites the snapshot and
+    starts a new journal. compact(force=False) (timed compaction) writes
+    nothing when the state is clean and the journal holds no records. fsync_interval bounds how long appended records may
+    sit in the page cache (0 = fsync every record, None = leave it to the OS).
+
+    Top-level keys in shared are large subtrees the caller replaces with a new
+    object whenever they change (StateWriter snapshots share unchanged copies):
+    when save() sees the same object as last time, its flattened leaves are
+    reused instead of copied and compared again.
+
+    Key paths in vectors are fixed-length lists journaled per element (only the
+    changed bins of a histogram are written each cycle).
+
+    Key paths in volatile (timestamps, the wear counters themselves) never make
+    the state dirty on their own: a save where only they changed writes nothing,
+    they are persisted along with the next meaningful change. Write counters
+    (writes, bytes_written, skipped, compactions) quantify flash wear.
+
+    import_path is a JSON state file that load() prefers when it is newer than
+    the binary snapshot; after the next compaction it is renamed to *.imported.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, fsync_interval=30, max_journal_bytes=64 * 1024,
+                 volatile=(), shared=(), vectors=(), import_path=None):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path) if journal_path else self.snapshot_path.with_suffix('.journal')
+        self.import_path = Path(import_path) if import_path else None
+        self.fsync_interval = fsync_interval
+        self.max_journal_bytes = max_journal_bytes
+        self.volatile = frozenset(tuple(path) for path in volatile)
+        self.shared = frozenset(shared)
+        self.vectors = frozenset(tuple(path) for path in vectors)
+        self.generation = 0
+        self.journal_bytes = 0
+        self.journal_records = 0  # Delta records in the current journal
+
+        # Flash wear accounting (since start)
+        self.writes = 0
+        self.bytes_written = 0
+        self.skipped = 0
+        self.compactions = 0
+        self._persisted = {}      # Flattened state as of the last save
+        self._subtrees = {}       # shared key -> (object, its flattened leaves) of the last flatten
+        self._journal = None      # Open append handle
+        self._last_fsync = monotonic()
+        self._imported = None     # JSON file the state was imported from (renamed after compaction)
+
+    def _read_snapshot(self):
+        """(state, generation, source path) of the newest snapshot, or None if there is none"""
+        snapshot_mtime = self.snapshot_path.stat().st_mtime if self.snapshot_path.exists() else None
+        if self.import_path is not None and self.import_path.exists() and \
+                (snapshot_mtime is None or self.import_path.stat().st_mtime > snapshot_mtime):
+            with open(self.import_path, 'r') as f:
+                state = json.load(f)
+            return state, state.pop(GENERATION_KEY, 0), self.import_path
+        if snapshot_mtime is None:
+            return None
+        with open(self.snapshot_path, 'rb') as f:
+            state, generation = decode_state(f.read())
+        return state, generation, self.snapshot_path
+
+    def load(self, readonly=False):
+        """
+        Return the persisted state (snapshot + replayed journal), or None if there is none
+
+        The state is returned as stored (see migrate_state). readonly=True leaves
+        the files untouched (offline tools).
+        """
+        snapshot = self._read_snapshot()
+        if snapshot is None:
+            return None
+        state, self.generation, source = snapshot
+        if source == self.import_path:
+            logging.info(f"Importing state from {source} (generation {self.generation})")
+            self._imported = source
+
+        replayed = 0
+        valid_end = None
+        for offset, end, record in read_records(self.journal_path):
+            if offset == 0:
+                if record.get('generation') != self.generation:
+                    logging.info(f"Ignoring journal from generation {record.get('generation')} "
+                                 f"(snapshot is {self.generation})")
+                    break
+            else:
+                _apply_delta(state, record)
+                replayed += 1
+            valid_end = end
+
+        if valid_end is not None and not readonly:
+            if self.journal_path.stat().st_size > valid_end:
+                logging.warning(f"Journal has a torn/corrupt tail after {valid_end} bytes - truncating")
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(valid_end)
+            if replayed:
+                logging.info(f"Replayed {replayed} journal records on top of state snapshot")
+            # Keep appending to the same journal (next save is a delta, not a compaction).
+            # An imported JSON file is compacted into state.bin on the first save instead.
+            if self._imported is None:
+                self._journal = open(self.journal_path, 'ab')
+                self.journal_bytes = valid_end
+                self.journal_records = replayed
+
+        self._persisted = _flatten(state, vectors=self.vectors)
+        return state
+
+    def save(self, state):
+        """Append the changes since the last save to the journal; returns bytes written"""
+        if self._journal is None or self.journal_bytes >= self.max_journal_bytes:
+            return self.compact(state)
+
+        flat = self._flatten_state(state)
+        changed, removed = self._changes(flat)
+        if self._clean(changed, removed):
+            self.skipped += 1
+            return 0
+        payload = {}
+        if changed:
+            payload['s'] = [[path, flat[tuple(path)]] for path in changed]
+        if removed:
+            payload['d'] = removed
+
+        record = encode_record(payload)
+        self._journal.write(record)
+        self._journal.flush()
+        self._sync_journal()
+        self.journal_bytes += len(record)
+        self.journal_records += 1
+        self._persisted = flat
+        self.writes += 1
+        self.bytes_written += len(record)
+        return len(record)
+
+    def _flatten_state(self, state):
+        """_flatten, reusing the leaves of shared subtrees that are the same object as last time"""
+        flat = {}
+        subtrees = {}
+        for key, value in state.items():
+            cached = self._subtrees.get(key)
+            if cached is not None and cached[0] is value:
+                leaves = cached[1]
+            else:
+                leaves = _flatten({key: value}, vectors=self.vectors)
+            if key in self.shared:
+                subtrees[key] = (value, leaves)
+            flat.update(leaves)
+        self._subtrees = subtrees
+        return flat
+
+    def _changes(self, flat):
+        """(changed, removed) key paths of a flattened state relative to the last save"""
+        changed = [list(path) for path, value in flat.items() if self._persisted.get(path, _MISSING) != value]
+        removed = [list(path) for path in self._persisted if path not in flat]
+        return changed, removed
+
+    def _clean(self, changed, removed):
+        return all(tuple(path) in self.volatile for path in changed + removed)
+
+    def compact(self, state, force=True):
+        """
+        Write a full snapshot (atomic rename) and start a new, empty journal; returns bytes written
+
+        force=False skips the write (counted in skipped) when only volatile keys
+        changed since the last save and the journal has no records to fold in.
+        """
+        if not force and self._journal is not None and self._imported is None and not self.journal_records \
+                and self._clean(*self._changes(self._flatten_state(state))):
+            self.skipped += 1
+            return 0
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        self.generation += 1
+        data = encode_state(state, self.generation)
+
+        temp_file = self.snapshot_path.with_suffix('.tmp')
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_file.replace(self.snapshot_path)
+        if self._imported is not None:
+            self._imported.replace(self._imported.with_name(self._imported.name + '.imported'))
+            self._imported = None
+
+        # New journal for the new generation (old deltas are all in the snapshot now)
+        if self._journal is not None:
+            self._journal.close()
+        header = encode_record({'generation': self.generation})
+        self._journal = open(self.journal_path, 'wb')
+        self._journal.write(header)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._last_fsync = monotonic()
+        self.journal_bytes = len(header)
+        self.journal_records = 0
+        self._persisted = self._flatten_state(state)
+        self.writes += 1
+        self.compactions += 1
+        self.bytes_written += len(data) + len(header)
+        return len(data) + len(header)
+
+    def set_aside(self, suffix='.unreadable'):
+        """Rename the snapshot files out of the way so a fresh state never overwrites them"""
+        for path in (self.snapshot_path, self.journal_path, self.import_path):
+            if path is not None and path.exists():
+                path.replace(path.with_name(path.name + suffix))
+                logging.warning(f"Moved {path} to {path.name + suffix}")
+        self._imported = None
+
+    def _sync_journal(self):
+        if self.fsync_interval is None:
+            return
+        now = monotonic()
+        if now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._journal.fileno())
+            self._last_fsync = now
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+            self._journal = None
+
+
+class StateWriter:
+    """
+    Background thread that owns a StateStore and performs all state writes
+
+    Callers submit immutable state snapshots (deep copies); filesystem latency
+    never lands on the caller. Only the latest pending snapshot is kept: a new
+    submit supersedes one that hasn't been written yet (a pending compaction
+    request is carried over, a forced one wins over a timed one). on_written(bytes,
+    compact) is called from the writer thread after each write. flush(timeout) waits until everything
+    submitted so far is on disk.
+    """
+
+    def __init__(self, store, on_written=None):
+        self.store = store
+        self.on_written = on_written
+        self.coalesced = 0
+        self._cond = threading.Condition()
+        self._pending = None    # (snapshot, compact, force)
+        self._busy = False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='state-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, snapshot, compact=False, force=True):
+        force = compact and force
+        with self._cond:
+            if self._pending is not None:
+                self.coalesced += 1
+                _, pending_compact, pending_force = self._pending
+                compact = compact or pending_compact
+                force = force or pending_force
+            self._pending = (snapshot, compact, force)
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until all submitted snapshots are written; False if timeout expired first"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def stop(self, timeout=None):
+        """Flush, stop the thread and close the journal; False if pending writes did not finish in time"""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if flushed:
+            self._thread.join(timeout)
+            self.store.close()
+        return flushed
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._stopping)
+                if self._pending is None:
+                    return
+                snapshot, compact, force = self._pending
+                self._pending = None
+                self._busy = True
+            try:
+                written = self.store.compact(snapshot, force) if compact else self.store.save(snapshot)
+                if self.on_written is not None:
+                    self.on_written(written, compact)
+            except Exception as e:
+                logging.error(f"Error saving state: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+def main(argv):
+    """Offline access to the driver state (stop the driver first when writing state.json)"""
+    if len(argv) < 2 or argv[1] != 'dump':
+        print(f"usage: {argv[0]} dump [state dir]   (print state as JSON; redirect to state.json to edit)",
+              file=sys.stderr)
+        return 2
+    state_dir = Path(argv[2] if len(argv) > 2 else '/data/dbus-tristar')
+    store = StateStore(state_dir / 'state.bin', import_path=state_dir / 'state.json')
+    state = store.load(readonly=True)
+    if state is None:
+        print(f"No state in {state_dir}", file=sys.stderr)
+        return 1
+    json.dump(state, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))